@@ -0,0 +1,212 @@
+"""
+Compact AST: an arena where the nodes are integer ids into typed arrays, instead of one instance per node
+; an alternative layout for huge programs, to keep them in memory or to serialize them.
+
+Each node has a kind (the index of its syntax class in NODE_CLASSES) and the offset of its fields in the fields array,
+one int per field of its dataclass, in the same order. A field value is tagged with what it holds:
+    NODE      id of a child node
+    CONSTANT  index in the constant pool (literal values, lexemes)
+    POSITION  index in the lines of the arena, of a source position (see positions.py)
+    LIST      offset in the fields array of the count of items, followed by their (tagged) values
+    TUPLE     same as LIST, for tuple fields
+Node ids are given in post-order, so that the nodes of a top-level statement are a range of ids ending with its own:
+decoding a statement back into syntax nodes, children first, takes a single loop over this range.
+The resolutions of the variables (their distance to the environment they're kept in) are fields of the nodes:
+they're kept along as constants.
+The decoded nodes keep the positions of the arena: its lines are their line table (see Arena.table). The arena keeps
+the names of the global slots of the statements, to give their variables the slots of the interpreter that runs them
+(see environment.GlobalSlots).
+
+    arena = Arena.encode(statements, lines, interpreter.globals.slots)
+    for stmt in arena.statements(interpreter.globals.slots):  # syntax nodes again, resolved as the statements were
+        interpreter.execute(stmt)
+"""
+from array import array
+from dataclasses import fields
+import pickle
+from typing import Any, Iterator
+
+from environment import GlobalSlots, relocate_globals
+from positions import POSITION_FIELDS, LineTable
+from syntax import (AbortLoop, Assign, Binary, Block, Call, Class, Expression, Function, Get, Grouping, If, Literal,
+                    Logical, Node, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable, While)
+
+NODE_CLASSES = (Binary, Unary, Literal, Logical, Grouping, Variable, Assign, Call, Get, Set, Super, This,
+                Expression, If, Print, Var, While, AbortLoop, Block, Function, Return, Class)
+_CLASS_INDEX = {cls: index for index, cls in enumerate(NODE_CLASSES)}
+_FIELD_NAMES = tuple(tuple(field.name for field in fields(cls)) for cls in NODE_CLASSES)
+_POSITION_FLAGS = tuple(tuple(name in POSITION_FIELDS for name in names) for names in _FIELD_NAMES)
+_FUNCTION = _CLASS_INDEX[Function]
+
+# tags of the field values, in their lowest bits
+NODE, CONSTANT, POSITION, LIST, TUPLE = range(5)
+TAG_BITS = 3
+TAG_MASK = (1 << TAG_BITS) - 1
+
+
+class Arena:
+    def __init__(self):
+        self.kinds = array("B")  # node id => index of its class in NODE_CLASSES
+        self.starts = array("I")  # node id => offset of its fields in self.fields
+        self.fields = array("I")  # tagged field values (and counts of the lists items)
+        self.lines = array("I", [0])  # position in the arena => line ; 0 for "no position", as in a LineTable
+        self.constants: list = []
+        self.roots = array("I")  # node id of each top-level statement
+        self._constant_index: dict | None = {}  # (type, value) => index of the constant
+        self._positions: dict[int, int] = {0: 0}  # position id in the added statements => position in the arena
+        self._table: LineTable | None = None
+        self.names: list[str] = []  # of the global slots the statements were resolved to
+
+    @classmethod
+    def encode(cls, statements: list[NodeStmt], lines: LineTable, slots: GlobalSlots) -> 'Arena':
+        """The arena of the statements, whose positions are in lines, and global variables resolved to slots"""
+        arena = cls()
+        arena.names = list(slots.names)
+        for stmt in statements:
+            arena.add(stmt, lines)
+        arena._constant_index = None  # only needed while adding statements (it would take a third of the memory)
+        arena._positions = {0: 0}
+        return arena
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @property
+    def table(self) -> LineTable:
+        """The line table of the positions of the decoded nodes"""
+        if self._table is None:
+            self._table = LineTable(self.lines)
+        return self._table
+
+    def add(self, statement: NodeStmt, lines: LineTable) -> int:
+        """Append a top-level statement, walking it with an explicit stack. Returns its node id."""
+        ids: dict[int, int] = {}  # id of node object => node id, for the nodes already added
+        pending: list[tuple[Node, bool]] = [(statement, False)]
+        while pending:
+            node, children_added = pending.pop()
+            if id(node) in ids:
+                continue
+            kind = _CLASS_INDEX[type(node)]
+            values = [getattr(node, name) for name in _FIELD_NAMES[kind]]
+            if not children_added:
+                pending.append((node, True))
+                for value in reversed(values):
+                    if isinstance(value, (list, tuple)):
+                        pending.extend((item, False) for item in reversed(value) if isinstance(item, Node))
+                    elif isinstance(value, Node):
+                        pending.append((value, False))
+                continue
+
+            # (lists items are stored first)
+            encoded = [self._position_value(value, lines) if is_position else self._field_value(value, ids)
+                       for value, is_position in zip(values, _POSITION_FLAGS[kind])]
+            ids[id(node)] = len(self.kinds)
+            self.kinds.append(kind)
+            self.starts.append(len(self.fields))
+            self.fields.extend(encoded)
+        self.roots.append(ids[id(statement)])
+        return ids[id(statement)]
+
+    def _field_value(self, value: Any, ids: dict[int, int]) -> int:
+        if isinstance(value, Node):
+            return ids[id(value)] << TAG_BITS | NODE
+        if isinstance(value, (list, tuple)):
+            items = [self._field_value(item, ids) for item in value]
+            offset = len(self.fields)
+            self.fields.append(len(items))
+            self.fields.extend(items)
+            return offset << TAG_BITS | (TUPLE if isinstance(value, tuple) else LIST)
+        return self._constant(value) << TAG_BITS | CONSTANT
+
+    def _position_value(self, value: int | tuple[int, ...], lines: LineTable) -> int:
+        if isinstance(value, tuple):  # (parameters positions)
+            items = [self._position_value(item, lines) for item in value]
+            offset = len(self.fields)
+            self.fields.append(len(items))
+            self.fields.extend(items)
+            return offset << TAG_BITS | TUPLE
+        position = self._positions.get(value)
+        if position is None:
+            position = self._positions[value] = len(self.lines)
+            self.lines.append(lines.line(value))
+        return position << TAG_BITS | POSITION
+
+    def _constant(self, value: Any) -> int:
+        if self._constant_index is None:
+            self._constant_index = {(type(constant), constant): index for index, constant in enumerate(self.constants)}
+        key = (type(value), value)  # 1.0 and True are equal, but are different constants
+        index = self._constant_index.get(key)
+        if index is None:
+            index = self._constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def statement(self, index: int, slots: GlobalSlots | None = None) -> NodeStmt:
+        """Decode the top-level statement at index back into syntax nodes ; slots: the global slots of the interpreter
+           to run it, if not those it was resolved to"""
+        return self._statement(index, slots.extend(self.names) if slots is not None else None)
+
+    def _statement(self, index: int, relocation: list[int] | None) -> NodeStmt:
+        first = self.roots[index - 1] + 1 if index > 0 else 0
+        root = self.roots[index]
+        kinds, starts, values, constants = self.kinds, self.starts, self.fields, self.constants
+        nodes: list[Node] = []  # the nodes decoded so far, by node id - first
+        for node_id in range(first, root + 1):
+            kind, start = kinds[node_id], starts[node_id]
+            names = _FIELD_NAMES[kind]
+            decoded = []
+            for value in values[start:start + len(names)]:
+                tag = value & TAG_MASK
+                if tag == NODE:
+                    decoded.append(nodes[(value >> TAG_BITS) - first])
+                elif tag == CONSTANT:
+                    decoded.append(constants[value >> TAG_BITS])
+                else:
+                    decoded.append(self._decode(value, nodes, first))
+            # built as unpickling does, without running __init__ (and the __setattr__ of the frozen dataclasses)
+            node = object.__new__(NODE_CLASSES[kind])
+            node.__dict__.update(zip(names, decoded))
+            if kind == _FUNCTION:
+                node.lines = self.table
+            nodes.append(node)
+        relocate_globals(nodes[-1:], relocation)
+        return nodes[-1]
+
+    def _decode(self, value: int, nodes: list[Node], first: int) -> Any:
+        tag, payload = value & TAG_MASK, value >> TAG_BITS
+        if tag == NODE:
+            return nodes[payload - first]
+        if tag == CONSTANT:
+            return self.constants[payload]
+        if tag == POSITION:
+            return payload
+        items = [self._decode(item, nodes, first) for item in self.fields[payload + 1:payload + 1 + self.fields[payload]]]
+        return tuple(items) if tag == TUPLE else items
+
+    def statements(self, slots: GlobalSlots | None = None) -> Iterator[NodeStmt]:
+        """Decode the top-level statements one at a time (see statement())"""
+        relocation = slots.extend(self.names) if slots is not None else None
+        for index in range(len(self.roots)):
+            yield self._statement(index, relocation)
+
+    def __repr__(self) -> str:
+        return f"[{', '.join(repr(stmt) for stmt in self.statements())}]"
+
+    def print_ast(self, level=0):
+        for stmt in self.statements():
+            stmt.print_ast(level)
+
+    def to_bytes(self) -> bytes:
+        return pickle.dumps(({name: getattr(self, name) for name in _ARRAYS}, self.constants, self.names),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Arena':
+        arena = cls()
+        arrays, arena.constants, arena.names = pickle.loads(data)
+        for name in _ARRAYS:
+            setattr(arena, name, arrays[name])
+        return arena
+
+
+_ARRAYS = ("kinds", "starts", "fields", "lines", "roots")
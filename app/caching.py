@@ -0,0 +1,103 @@
+"""
+On-disk cache of analyzed programs ('.loxc' files), so that unchanged scripts run again without being
+scanned, parsed and resolved. Opt-in: enabled by the --cache=DIR option or the LOX_CACHE_DIR environment variable.
+
+An entry holds the pickled statements of a program (with the resolved distances of their variables) along with the
+line table of its positions (see positions.py) and the names of its global slots (see environment.GlobalSlots),
+compressed (nodes pickle into several times the size of the source, but compress very well).
+It is named after the sha256 of the source, of the interpreter fingerprint (its own code and the Python version) and
+of the analysis options that shape the stored statements (eg. --lazy keeps the function bodies unresolved), so that
+changing any of them makes a new entry. Beyond the size budget, the least recently used entries are evicted.
+
+    cache = ProgramCache(directory, variant=("lazy",))
+    cached = cache.load(source, interpreter.globals.slots)  # the statements and their line table, None if not cached
+    ...
+    cache.store(source, statements, lines, interpreter.globals.slots)  # once resolved without errors
+"""
+from collections.abc import Iterable
+from functools import cache
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import sys
+import tempfile
+import zlib
+
+from environment import GlobalSlots, relocate_globals
+from positions import LineTable
+from syntax import NodeStmt
+
+CACHE_BUDGET = 1 << 26  # bytes of entries kept in a cache directory
+CACHE_SUFFIX = ".loxc"
+
+
+@cache
+def fingerprint() -> bytes:
+    """Digest of the interpreter code and of the Python version, that the cached entries depend on"""
+    digest = hashlib.sha256(sys.version.encode())
+    for module in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(module.name.encode())
+        digest.update(module.read_bytes())
+    return digest.digest()
+
+
+class ProgramCache:
+    def __init__(self, directory: str | Path, budget: int = CACHE_BUDGET, variant: Iterable[str] = ()):
+        self.directory = Path(directory)
+        self.budget = budget
+        self.variant = "\0".join(sorted(variant)).encode()  # the analysis options, part of the keys
+
+    def path(self, source: str) -> Path:
+        key = hashlib.sha256(fingerprint() + self.variant + b"\0" + source.encode(errors="surrogateescape")).hexdigest()
+        return self.directory / f"{key}{CACHE_SUFFIX}"
+
+    def load(self, source: str, slots: GlobalSlots) -> tuple[list[NodeStmt], LineTable] | None:
+        """The cached statements of the source, already resolved (their global variables given slots in the table
+           of the interpreter to run them), and their line table (None if not cached)"""
+        path = self.path(source)
+        try:
+            with open(path, "rb") as file:
+                statements, lines, names = pickle.loads(zlib.decompress(file.read()))
+        except FileNotFoundError:
+            return None
+        except Exception:  # unreadable entry (truncated, from an incompatible version...): analyze the source again
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # most recently used
+        relocate_globals(statements, slots.extend(names))
+        return statements, lines
+
+    def store(self, source: str, statements: list[NodeStmt], lines: LineTable, slots: GlobalSlots):
+        """Cache the resolved statements (their positions in lines, their global variables given slots in the
+           table slots), then evict the old entries.
+           The cache is only a shortcut: programs that can't be cached (eg. too deeply nested to be pickled) are not."""
+        try:
+            data = zlib.compress(pickle.dumps((statements, lines, slots.names), protocol=pickle.HIGHEST_PROTOCOL), 1)
+        except (RecursionError, pickle.PicklingError):
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # written aside then renamed, so that concurrent runs never read a partial entry
+            with tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False) as file:
+                file.write(data)
+            os.replace(file.name, self.path(source))
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the total size fits in the budget"""
+        entries = []
+        for path in self.directory.glob(f"*{CACHE_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by a concurrent run
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.budget:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -1,7 +1,6 @@
 from typing import Any, Optional
 from errors import LoxRuntimeError
 from functions import LoxCallable, LoxUserFunction
-from scanning import Token
 
 
 class LoxClass(LoxCallable):
@@ -40,16 +39,16 @@ class LoxInstance:
         self.klass = klass
         self.fields = {}
 
-    def get(self, name: Token) -> Any:
-        if name.lexeme in self.fields:  # property
-            return self.fields[name.lexeme]
-        elif method := self.klass.find_method(name.lexeme):  # method
+    def get(self, name: str, position: int) -> Any:
+        if name in self.fields:  # property
+            return self.fields[name]
+        elif method := self.klass.find_method(name):  # method
             return method.bind(self)
         else:
-            raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
+            raise LoxRuntimeError(position, f"Undefined property '{name}'.")
         
-    def set_value(self, name: Token, value: Any):
-        self.fields[name.lexeme] = value
+    def set_value(self, name: str, value: Any):
+        self.fields[name] = value
 
     def __repr__(self) -> str:
         return f"<instanceof {self.klass.name}>"
@@ -1,7 +1,11 @@
-from typing import Any, Optional
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 
 from errors import LoxRuntimeError
-from scanning import Token
+from syntax import walk
+
+REGISTER = -1  # depth of the local variables kept in the registers of the call, rather than in a Frame (see Resolver)
+CELL = -2  # depth of the captured variables kept in a Cell, in a register of the call (flat closures mode)
 
 
 class Environment:
@@ -14,38 +18,161 @@ class Environment:
         """A variable can be re-defined any number of times"""
         self.values[name] = value
 
-    def get(self, name: Token) -> Any:
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+    def get(self, name: str, position: int) -> Any:
+        """Value of the variable, read at position (reported if it's undefined)"""
+        if name in self.values:
+            return self.values[name]
 
         # recursion up the chain of enclosing scope(s) to find (more) global variables        
         if self.enclosing:
-            return self.enclosing.get(name)
+            return self.enclosing.get(name, position)
 
-        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        raise LoxRuntimeError(position, f"Undefined variable '{name}'.")
     
     def get_at(self, distance: int, name: str) -> Any:
         return self.ancestor(distance).values.get(name)
 
-    def assign(self, name: Token, value: Any) -> None:
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
+    def assign(self, name: str, position: int, value: Any) -> None:
+        if name in self.values:
+            self.values[name] = value
             return
         
         # if the variable was declared in an enclosing scope, push its assignment there
         if self.enclosing:
-            self.enclosing.assign(name, value)
+            self.enclosing.assign(name, position, value)
             return
 
-        raise LoxRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+        raise LoxRuntimeError(position, f"Undefined variable '{name}'.")
     
-    def assign_at(self, distance: int, name: Token, value: Any) -> None:
-        if name.lexeme:
-            self.ancestor(distance).values[name.lexeme] = value
+    def assign_at(self, distance: int, name: str, value: Any) -> None:
+        self.ancestor(distance).values[name] = value
 
     def ancestor(self, distance: int):
         environment = self
         for _ in range(distance):
             if environment.enclosing:
                 environment = environment.enclosing
-        return environment
\ No newline at end of file
+        return environment
+
+
+class GlobalSlots:
+    """Slots of the global variables of an interpreter (see Globals), given by name once and for all by the resolver
+       of its programs. Programs kept aside (see caching.py and arena.py) keep the names of the slots along, to get
+       them their slots in the table of the interpreter that runs them (see relocate_globals())."""
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.slots: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def slot(self, name: str) -> int:
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def extend(self, names: list[str]) -> list[int] | None:
+        """The slots in this table of the names of the slots of another one (eg. of the interpreter a program kept
+           aside was resolved for), None if they're the same"""
+        slots = [self.slot(name) for name in names]
+        return None if slots == list(range(len(slots))) else slots
+
+
+UNDEFINED = object()  # value of the global variables not defined (yet)
+
+
+def relocate_globals(statements: list, slots: list[int] | None):
+    """Give the global variables of the nodes of the statements their slots in another table (see GlobalSlots.extend())"""
+    if slots is None:
+        return
+    for node in walk(statements):
+        if getattr(node, "depth", 0) is None and node.slot is not None:
+            object.__setattr__(node, "slot", slots[node.slot])  # (the expression nodes are frozen dataclasses)
+
+
+class Globals(Environment):
+    """The global environment: the values are kept in a list, by the slots of their variables (see GlobalSlots),
+       so that a global variable resolved to its slot is read or assigned without a name lookup. The variables
+       are still reachable by name, as in any Environment, but only through its methods: the values by name are
+       a read-only view."""
+    def __init__(self) -> None:
+        self.slots = GlobalSlots()  # given by the resolver of the programs run in this environment
+        self.table: list[Any] = []  # slot => value, UNDEFINED if not defined
+        self.enclosing = None
+
+    @property
+    def values(self) -> Mapping[str, Any]:  # type: ignore
+        """The defined variables, by name (a snapshot: assigned through it, they would be lost)"""
+        return MappingProxyType({name: value for name, value in zip(self.slots.names, self.table)
+                                 if value is not UNDEFINED})
+
+    def define(self, name: str, value: Any) -> None:
+        self.define_slot(self.slots.slot(name), value)
+
+    def define_slot(self, slot: int, value: Any) -> None:
+        table = self.table
+        if slot >= len(table):  # a variable resolved since the table was last extended
+            table.extend([UNDEFINED] * (slot + 1 - len(table)))
+        table[slot] = value
+
+    def get(self, name: str, position: int) -> Any:
+        slot = self.slots.slots.get(name)
+        if slot is not None and slot < len(self.table):
+            value = self.table[slot]
+            if value is not UNDEFINED:
+                return value
+        raise LoxRuntimeError(position, f"Undefined variable '{name}'.")
+
+    def get_at(self, distance: int, name: str) -> Any:
+        slot = self.slots.slots.get(name)
+        if slot is not None and slot < len(self.table):
+            value = self.table[slot]
+            if value is not UNDEFINED:
+                return value
+        return None
+
+    def assign(self, name: str, position: int, value: Any) -> None:
+        self.assign_slot(None, name, position, value)
+
+    def assign_at(self, distance: int, name: str, value: Any) -> None:
+        self.define(name, value)  # (the global environment has no ancestor)
+
+    def assign_slot(self, slot: int | None, name: str, position: int, value: Any) -> None:
+        """Assign the variable in its slot (found by its name if not resolved)"""
+        if slot is None:
+            slot = self.slots.slots.get(name)
+        table = self.table
+        if slot is not None and slot < len(table) and table[slot] is not UNDEFINED:
+            table[slot] = value
+            return
+        raise LoxRuntimeError(position, f"Undefined variable '{name}'.")
+
+
+class Frame:
+    """Environment of a local scope, as laid out by the resolver: the variables are slots, indexes in a list
+       of values sized for the variables kept in the scope (see Resolver.finish()), so that a variable
+       resolved to (distance, slot) is read without any name lookup. Only the scopes with variables captured by
+       closures get a Frame: the other variables are in the registers of the call (see Interpreter.registers).
+       The global scope and the native functions stay in an Environment, at the end of the chain."""
+    __slots__ = ("values", "enclosing")
+
+    def __init__(self, values: list[Any], enclosing: 'Frame | Environment') -> None:
+        self.values = values
+        self.enclosing = enclosing
+
+    def ancestor(self, distance: int) -> 'Frame':
+        frame = self
+        for _ in range(distance):
+            frame = frame.enclosing
+        return frame
+
+
+class Cell:
+    """A variable captured by closures, in flat closures mode: the functions that reference it share its cell,
+       instead of keeping the whole environment of its scope (see Resolver)"""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
@@ -1,14 +1,82 @@
 import sys
 
+DIAGNOSTICS_LIMIT = 100  # default number of (merged) errors kept for a run, before giving up
+
 
 class Errors:
     had_errors = False
+    diagnostics: 'Diagnostics | None' = None  # collector of the current run ; without one, errors are printed right away
 
     @classmethod
     def report(cls, line: int, message: str, where: str = ""):
         cls.had_errors = True
-        print(f"[line {line}] Error{where}: {message}", file=sys.stderr)
+        if cls.diagnostics is None:
+            print(f"[line {line}] Error{where}: {message}", file=sys.stderr)
+        else:
+            cls.diagnostics.add(line, message, where)
+
+
+class Diagnostics:
+    """Per-run collector of the errors reported through Errors.report(), used as a context manager:
+       errors are buffered, runs of identical errors are merged into a single one spanning a range of lines,
+       and they are all printed once when leaving the context (whatever the reason, including exit()).
+       When more than limit errors are collected, TooManyErrors is raised so that the run stops early."""
+    def __init__(self, limit: int = DIAGNOSTICS_LIMIT, file=None):
+        self.limit = limit
+        self.file = file or sys.stderr
+        self.entries: list[list] = []  # [first line, last line, message, where, count]
+        self.overflow = False
+        self._previous: Diagnostics | None = None
+
+    def __enter__(self) -> 'Diagnostics':
+        self._previous, Errors.diagnostics = Errors.diagnostics, self
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        Errors.diagnostics = self._previous
+        self.flush()
+
+    def add(self, line: int, message: str, where: str = ""):
+        if self.entries:
+            last = self.entries[-1]
+            if last[2] == message and last[3] == where and last[1] <= line:
+                last[1] = line
+                last[4] += 1
+                return
+        if len(self.entries) >= self.limit:
+            self.overflow = True
+            raise TooManyErrors(self.limit)
+        self.entries.append([line, line, message, where, 1])
+
+    def flush(self):
+        """Print the collected errors, and forget them"""
+        for first, last, message, where, count in self.entries:
+            lines = f"line {first}" if first == last else f"lines {first}-{last}"
+            repeated = f" ({count} times)" if count > 1 else ""
+            print(f"[{lines}] Error{where}: {message}{repeated}", file=self.file)
+        if self.overflow:
+            print(f"Too many errors (more than {self.limit}), giving up.", file=self.file)
+        self.entries.clear()
+        self.overflow = False
+
+
+class TooManyErrors(Exception):
+    pass
 
 
 class LoxRuntimeError(RuntimeError):
+    """Raised with the position id of the faulty node (see positions.py) and the message. The id is in the line table
+       of the program of the node: the call of a function locates the errors raised in its body in the table of its
+       declaration (see LoxUserFunction.call()), as it may come from another program (a previous line of the REPL)"""
+    line: int | None = None  # once located
+
+    def locate(self, lines) -> int:
+        """The line of the error, found in the line table of its program unless already located"""
+        if self.line is None:
+            self.line = lines.line(self.args[0])
+        return self.line
+
+
+class LoxStaticError(Exception):
+    """Syntax or semantic errors found while running, in a function body parsed lazily (they have been reported)"""
     pass
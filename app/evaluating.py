@@ -1,20 +1,30 @@
+import operator
 from typing import Any
 from classes import LoxClass, LoxInstance
-from environment import Environment
+from environment import CELL, REGISTER, UNDEFINED, Cell, Frame, Globals
 from errors import LoxRuntimeError
 from functions import BreakException, LoxCallable, LoxUserFunction, ReturnException, register_native_functions
+from lexemes import TokenKind
 from output import stringify
 from syntax import (Assign, Block, AbortLoop, Call, Class, Expression, Function, Get, If, Logical, NodeExpr, NodeStmt, 
                     Literal, Grouping, Print, Return, Set, Super, This, Unary, Binary, Var, Variable, While)
 
+# the operations of the Binary nodes marked unchecked, on proven numbers (see inference.py)
+UNCHECKED_OPERATIONS = {
+    TokenKind.STAR: operator.mul, TokenKind.SLASH: operator.truediv, TokenKind.MINUS: operator.sub,
+    TokenKind.PLUS: operator.add, TokenKind.GREATER: operator.gt, TokenKind.GREATER_EQUAL: operator.ge,
+    TokenKind.LESS: operator.lt, TokenKind.LESS_EQUAL: operator.le,
+}
+
 
 class Interpreter:
     def __init__(self) -> None:
-        self.globals = Environment()  # always keep a reference to the global environment, for access to the native functions
+        self.globals = Globals()  # always keep a reference to the global environment, for access to the native functions
         register_native_functions(self.globals)
         self.environment = self.globals  # the current environment in the stack
-        # keep the result of the semantic analysis pass, ie. the number of levels between each variable reference and its storing environment
-        self._locals: dict[NodeExpr, int] = {}
+        self.registers: list[Any] = []  # the local variables of the current call that are not captured by closures
+        # the result of the semantic analysis pass, ie. the number of levels between each variable reference and
+        #  its storing environment (and its slot there), is kept in the nodes (see resolve())
 
     def execute(self, node: NodeStmt) -> None:
         """Execute a statement
@@ -32,20 +42,24 @@ class Interpreter:
                 print(stringify(value))
 
             case While() as stmt:
+                body = [stmt.body]
+                if isinstance(stmt.body, Block) and stmt.body.slots is None and stmt.body.registers is None:
+                    body = stmt.body.statements  # no environment nor registers of its own: run in place
                 while(self.is_truthy(self.evaluate(stmt.condition))):
                     try:
-                        self.execute(stmt.body)
+                        for statement in body:
+                            self.execute(statement)
                     except BreakException as breaking:
-                        toktype = breaking.args[0]
-                        if toktype == "BREAK":
+                        kind = breaking.args[0]
+                        if kind == TokenKind.BREAK:
                             break
-                        elif toktype == "CONTINUE":
+                        elif kind == TokenKind.CONTINUE:
                             pass  # let's evaluate the increment if it exists before starting the next loop
                     if stmt.increment:
                         self.evaluate(stmt.increment)
 
             case AbortLoop() as stmt:
-                raise BreakException(stmt.token.toktype)
+                raise BreakException(stmt.keyword)
         
             case Expression() as stmt:
                 # do not display the value: discard it ; the statement's side-effect is the point
@@ -55,15 +69,24 @@ class Interpreter:
                 value = None
                 if stmt.initializer is not None:
                     value = self.evaluate(stmt.initializer)
-                self.environment.define(stmt.name.lexeme, value)
+                self.declare(stmt, value)
 
             case Block() as block:
-                blockscope = Environment(enclosing=self.environment)
-                self.execute_block(block.statements, environment=blockscope)
+                if block.registers is not None:  # the outermost block of a top-level statement, run as a call
+                    blockscope = self.environment if block.slots is None else Frame([None] * block.slots, self.environment)
+                    self.execute_block(block.statements, blockscope, [None] * block.registers)
+                elif block.slots is not None:
+                    self.execute_block(block.statements, environment=Frame([None] * block.slots, self.environment))
+                else:  # it has no environment of its own: its variables (if any) are in registers
+                    for stmt in block.statements:
+                        self.execute(stmt)
 
             case Function() as declaration:
-                function = LoxUserFunction(declaration, self.environment, is_initializer=False)
-                self.environment.define(declaration.name.lexeme, function)
+                if declaration.depth == CELL:  # its cell first: the function may reference itself
+                    self.declare(declaration, None)
+                    self.registers[declaration.slot].value = self.closure(declaration)
+                else:
+                    self.declare(declaration, self.closure(declaration))
 
             case Return() as stmt:
                 value = None
@@ -76,43 +99,45 @@ class Interpreter:
                 if stmt.superclass:
                     superclass = self.evaluate(stmt.superclass)
                     if not isinstance(superclass, LoxClass):
-                        raise LoxRuntimeError(stmt.superclass.name, "Superclass must be a class.")
+                        raise LoxRuntimeError(stmt.superclass.position, "Superclass must be a class.")
                 
                 # two-steps binding so that the class name can be referenced in its body
-                self.environment.define(stmt.name.lexeme, None)
+                self.declare(stmt, None)
                 
                 if stmt.superclass:
-                    self.environment = Environment(self.environment)
-                    self.environment.define("super", superclass)
+                    self.environment = Frame([superclass], self.environment)  # "super", in slot 0
 
                 methods = {}
                 for method in stmt.methods:
-                    function = LoxUserFunction(method, self.environment,
-                                               is_initializer=(method.name.lexeme == "init"))
-                    methods[method.name.lexeme] = function
+                    methods[method.name] = self.closure(method, is_initializer=(method.name == "init"))
 
-                klass = LoxClass(stmt.name.lexeme, superclass, methods)
+                klass = LoxClass(stmt.name, superclass, methods)
                 
                 if stmt.superclass and self.environment.enclosing:
                     self.environment = self.environment.enclosing
                 
-                self.environment.assign(stmt.name, klass)
+                if stmt.depth == CELL:
+                    self.registers[stmt.slot].value = klass
+                else:
+                    self.declare(stmt, klass)
         
             case _:
                 raise NotImplementedError(node)
             
 
-    def execute_block(self, statements, environment):
-        """Execute a list of statements with a given environment/scope.
+    def execute_block(self, statements, environment, registers=None):
+        """Execute a list of statements with a given environment/scope (and the registers of a call, if given).
            Having a separated method for this allows to use it for regular blocks but also for function bodies etc."""
-        previous_scope = self.environment
+        previous_scope, previous_registers = self.environment, self.registers
         try:
             self.environment = environment
+            if registers is not None:
+                self.registers = registers
 
             for stmt in statements:
                 self.execute(stmt)
         finally:
-            self.environment = previous_scope
+            self.environment, self.registers = previous_scope, previous_registers
 
 
     def evaluate(self, node: NodeExpr) -> Any:
@@ -128,60 +153,64 @@ class Interpreter:
             
             case Unary() as unary:
                 operand = self.evaluate(unary.right)
-                match unary.operator.toktype:
-                    case "BANG":
+                if unary.unchecked:  # '-' on a proven number
+                    return -operand
+                match unary.operator:
+                    case TokenKind.BANG:
                         return not self.is_truthy(operand)
-                    case "MINUS":
-                        self.check_is_number(unary.operator, operand)
+                    case TokenKind.MINUS:
+                        self.check_is_number(unary.position, operand)
                         return -operand
                     
             case Binary() as binary:
                 left = self.evaluate(binary.left)
                 right = self.evaluate(binary.right)
-                match binary.operator.toktype:
+                if binary.unchecked:  # on proven numbers
+                    return UNCHECKED_OPERATIONS[binary.operator](left, right)
+                match binary.operator:
                     # arithmetic + string concatenation
-                    case "STAR":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.STAR:
+                        self.check_both_numbers(binary.position, left, right)
                         return left * right
-                    case "SLASH":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.SLASH:
+                        self.check_both_numbers(binary.position, left, right)
                         return left / right
-                    case "MINUS":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.MINUS:
+                        self.check_both_numbers(binary.position, left, right)
                         return left - right
-                    case "PLUS":
-                        self.check_both_numbers_or_strings(binary.operator, left, right)
+                    case TokenKind.PLUS:
+                        self.check_both_numbers_or_strings(binary.position, left, right)
                         # '+' is already overloaded to do string concatenation in Python, so we have it for free in Lox!
                         return left + right
                     # relational
-                    case "GREATER":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.GREATER:
+                        self.check_both_numbers(binary.position, left, right)
                         return left > right
-                    case "GREATER_EQUAL":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.GREATER_EQUAL:
+                        self.check_both_numbers(binary.position, left, right)
                         return left >= right
-                    case "LESS":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.LESS:
+                        self.check_both_numbers(binary.position, left, right)
                         return left < right
-                    case "LESS_EQUAL":
-                        self.check_both_numbers(binary.operator, left, right)
+                    case TokenKind.LESS_EQUAL:
+                        self.check_both_numbers(binary.position, left, right)
                         return left <= right
                     # equality
-                    case "EQUAL_EQUAL":
+                    case TokenKind.EQUAL_EQUAL:
                         # again equality (==) and non-equality (!=) operators are correctly overloaded for the various types 
                         # of left/right expressions in Python we may encounter, so life is beautiful
                         return left == right
-                    case "BANG_EQUAL":
+                    case TokenKind.BANG_EQUAL:
                         return left != right
                     
             case Logical() as logical:
                 left = self.evaluate(logical.left)
 
                 # short-circuit ?
-                if logical.operator.toktype == "OR":
+                if logical.operator == TokenKind.OR:
                     if self.is_truthy(left):
                         return left
-                elif logical.operator.toktype == "AND":
+                elif logical.operator == TokenKind.AND:
                     if not self.is_truthy(left):
                         return left
                     
@@ -189,59 +218,78 @@ class Interpreter:
                     
             case Variable() as variable:
                 # return self.environment.get(variable.name)
-                return self.lookup_variable(variable.name, variable)
+                return self.lookup_variable(variable.name, variable.position, variable)
             
             case Assign() as assignment:
                 value = self.evaluate(assignment.value)
                 # self.environment.assign(assignment.name, value)
-                distance = self._locals.get(assignment)
-                if distance is None:  # in the global environment
-                    self.globals.assign(assignment.name, value)
+                distance = assignment.depth
+                if distance == REGISTER:
+                    self.registers[assignment.slot] = value
+                elif distance == CELL:
+                    self.registers[assignment.slot].value = value
+                elif distance is None:  # in the global environment
+                    self.globals.assign_slot(assignment.slot, assignment.name, assignment.position, value)
                 else:
-                    self.environment.assign_at(distance, assignment.name, value)
+                    environment = self.environment
+                    for _ in range(distance):
+                        environment = environment.enclosing
+                    environment.values[assignment.slot] = value
                 return value
             
             case Call() as call:
                 # the callee part evaluates to the actual function to be called
                 function = self.evaluate(call.callee)
 
+                inlined = call.inlined
+                if inlined is not None and type(function) is LoxUserFunction and function.declaration is inlined:
+                    # still the function known statically (see optimizing.py): its expression evaluated in place,
+                    #  with the arguments in the registers of its parameters
+                    arguments = [self.evaluate(arg) for arg in call.arguments]
+                    previous_registers = self.registers
+                    self.registers = arguments
+                    try:
+                        return self.evaluate(inlined.inline)
+                    finally:
+                        self.registers = previous_registers
+
                 if not isinstance(function, LoxCallable):
-                    raise LoxRuntimeError(call.paren, "Can only call functions and classes.")
+                    raise LoxRuntimeError(call.position, "Can only call functions and classes.")
 
                 arguments = [self.evaluate(arg) for arg in call.arguments]
 
                 if len(arguments) != function.arity():
-                    raise LoxRuntimeError(call.paren, f"Expected {function.arity()} arguments but got {len(arguments)}.")
+                    raise LoxRuntimeError(call.position, f"Expected {function.arity()} arguments but got {len(arguments)}.")
 
                 return function.call(self, arguments)
             
             case Get() as get:
                 instance = self.evaluate(get.instance)
                 if isinstance(instance, LoxInstance):
-                    return instance.get(get.name)
+                    return instance.get(get.name, get.position)
                 else:
-                    raise LoxRuntimeError(get.name, "Only class instances have properties callable by '.'.")
+                    raise LoxRuntimeError(get.position, "Only class instances have properties callable by '.'.")
                 
             case Set() as expr:
                 instance = self.evaluate(expr.instance)
                 if not isinstance(instance, LoxInstance):
-                    raise LoxRuntimeError(expr.name, "Only class instances have fields.")
+                    raise LoxRuntimeError(expr.position, "Only class instances have fields.")
                 value = self.evaluate(expr.value)
                 instance.set_value(expr.name, value)
                 return value
             
             case Super() as expr:
-                distance = self._locals[expr]
-                superclass = self.environment.get_at(distance, "super")
-                object = self.environment.get_at(distance - 1, "this")
+                distance = expr.depth
+                superclass = self.environment.ancestor(distance).values[expr.slot]
+                object = self.environment.ancestor(distance - 1).values[0]  # "this" (see LoxUserFunction.bind())
                 
-                method = superclass.find_method(expr.method.lexeme)
+                method = superclass.find_method(expr.method)
                 if method is None:
-                    raise LoxRuntimeError(expr.method, f"Undefined property '{expr.method.lexeme}'.")
+                    raise LoxRuntimeError(expr.method_position, f"Undefined property '{expr.method}'.")
                 return method.bind(object)
             
             case This() as this:
-                return self.lookup_variable(this.token, this)
+                return self.lookup_variable("this", this.position, this)
 
             case _:
                 raise NotImplementedError(node)
@@ -254,29 +302,71 @@ class Interpreter:
             return value
         return True
 
-    def check_is_number(self, operator, value):
+    def check_is_number(self, position, value):
         if isinstance(value, float):
             return
-        raise LoxRuntimeError(operator, "Operand must be a number.")
+        raise LoxRuntimeError(position, "Operand must be a number.")
     
-    def check_both_numbers(self, operator, left, right):
+    def check_both_numbers(self, position, left, right):
         if isinstance(left, float) and isinstance(right, float):
             return
-        raise LoxRuntimeError(operator, "Operands must be numbers.")
+        raise LoxRuntimeError(position, "Operands must be numbers.")
     
-    def check_both_numbers_or_strings(self, operator, left, right):
+    def check_both_numbers_or_strings(self, position, left, right):
         if ((isinstance(left, float) and isinstance(right, float)) or
             (isinstance(left, str) and isinstance(right, str))):
             return
-        raise LoxRuntimeError(operator, "Operands must be two numbers or two strings.")
+        raise LoxRuntimeError(position, "Operands must be two numbers or two strings.")
 
-    def resolve(self, expr: NodeExpr, depth: int):
-        self._locals[expr] = depth
+    def resolve(self, node: NodeExpr | NodeStmt, depth: int, slot: int):
+        """Record the location of the variable of node (referenced or declared), ie. the distance to its environment
+           and its slot there, or REGISTER and its register, into the node itself (a lookup is then mere attribute
+           reads): it is part of the syntax tree from now on, as if it had been parsed"""
+        object.__setattr__(node, "depth", depth)  # (the expression nodes are frozen dataclasses)
+        object.__setattr__(node, "slot", slot)
 
-    def lookup_variable(self, name: 'Token', expr: NodeExpr): # type: ignore
-        distance = self._locals.get(expr)
-        if distance is None:  
-            # variables in the uppermost, "global", scope are not kept by the semantic pass
-            return self.globals.get(name)
+    def declare(self, declaration: Var | Function | Class, value: Any):
+        """Define a variable declared in the current scope, where it was located (by name for a global variable)"""
+        depth = declaration.depth
+        if depth == REGISTER:
+            self.registers[declaration.slot] = value
+        elif depth == CELL:
+            self.registers[declaration.slot] = Cell(value)
+        elif depth is None:
+            if declaration.slot is None:  # (not resolved)
+                self.environment.define(declaration.name, value)
+            else:
+                self.globals.define_slot(declaration.slot, value)
         else:
-            return self.environment.get_at(distance=distance, name=name.lexeme)
\ No newline at end of file
+            self.environment.values[declaration.slot] = value
+
+    def closure(self, declaration: Function, is_initializer: bool = False) -> LoxUserFunction:
+        """The function declared in the current scope, closing over the environment (unless it needs none of its
+           Frames) and the cells of its free variables"""
+        environment = self.environment if declaration.outer_frames else self.globals
+        cells = [self.registers[register] for register in declaration.free]
+        return LoxUserFunction(declaration, environment, is_initializer, cells)
+
+    def lookup_variable(self, name: str, position: int, expr: NodeExpr):
+        distance = expr.depth
+        if distance == REGISTER:
+            return self.registers[expr.slot]
+        if distance == CELL:
+            return self.registers[expr.slot].value
+        if distance is None:  
+            # variables in the uppermost, "global", scope are kept by the slots given by the semantic pass
+            slot = expr.slot
+            if slot is None:  # (not resolved)
+                return self.globals.get(name, position)
+            try:
+                value = self.globals.table[slot]
+            except IndexError:  # never defined since it was resolved
+                value = UNDEFINED
+            if value is UNDEFINED:
+                raise LoxRuntimeError(position, f"Undefined variable '{name}'.")
+            return value
+        environment = self.environment
+        for _ in range(distance):  # (inlined ancestor(): most variables are found close by)
+            environment = environment.enclosing
+        return environment.values[expr.slot]
+
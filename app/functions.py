@@ -2,8 +2,10 @@ from abc import ABC, abstractmethod
 import time
 from typing import Any
 
-from environment import Environment
-from syntax import Function
+from environment import Cell, Environment, Frame
+from errors import LoxRuntimeError
+from resolving import resolve_lazy_body
+from syntax import Function, LazyBody
 
 
 class LoxCallable(ABC):
@@ -20,38 +22,61 @@ class LoxCallable(ABC):
 
 class LoxUserFunction(LoxCallable):
     """Actually, this represents functions AND class methods."""
-    def __init__(self, declaration: Function, closure: Environment, is_initializer: bool) -> None:
+    def __init__(self, declaration: Function, closure: Environment | Frame, is_initializer: bool,
+                 cells: list[Cell] | None = None) -> None:
         self.declaration = declaration
         self.closure = closure
         self.is_initializer = is_initializer
+        self.cells = cells or []  # of its free variables, in flat closures mode (see Resolver)
 
     def arity(self) -> int:
         return len(self.declaration.params)
     
     def call(self, interpreter, arguments: list[Any]) -> Any:
-        environment = Environment(enclosing=self.closure)
-        for param, value in zip(self.declaration.params, arguments):
-            environment.define(param.lexeme, value)
+        declaration = self.declaration
+        if isinstance(declaration.body, LazyBody):  # first call of a function parsed in lazy mode
+            resolve_lazy_body(declaration, interpreter)
+        # the parameters in the first registers, then the variables declared in the body, then the cells
+        registers = arguments
+        if declaration.registers > len(arguments) or self.cells:
+            registers = arguments + [None] * (declaration.registers - len(arguments)) + self.cells
+        environment = self.closure
+        if declaration.slots is not None:  # some of its variables are captured by closures
+            captured = [arguments[register] for register in declaration.captured]
+            environment = Frame(captured + [None] * (declaration.slots - len(captured)), environment)
+        elif declaration.captured:  # in cells
+            for register in declaration.captured:
+                registers[register] = Cell(registers[register])
 
         try:
-            interpreter.execute_block(self.declaration.body, environment)
+            if declaration.inline is not None:  # its body only returns this expression (see optimizing.py)
+                previous_scope, previous_registers = interpreter.environment, interpreter.registers
+                interpreter.environment, interpreter.registers = environment, registers
+                try:
+                    return interpreter.evaluate(declaration.inline)
+                finally:
+                    interpreter.environment, interpreter.registers = previous_scope, previous_registers
+            interpreter.execute_block(declaration.body, environment, registers)
         except ReturnException as retex:
             if self.is_initializer:
-                return self.closure.get_at(0, "this")
+                return self.closure.values[0]  # "this"
             return retex.value
+        except LoxRuntimeError as error:  # its positions are in the line table of the program declaring it
+            if declaration.lines is not None:
+                error.locate(declaration.lines)
+            raise
         # special case: initializer methods always return 'this', the constructed instance
         if self.is_initializer:
-            return self.closure.get_at(0, "this")
+            return self.closure.values[0]
         
     def bind(self, instance: 'LoxInstance'):  # type: ignore
         """For class methods only. When a method is referenced, return it but as a copy 
            where 'this' is bound to the instance from which it was called."""
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxUserFunction(self.declaration, environment, self.is_initializer)
+        environment = Frame([instance], self.closure)  # the scope of "this", with it in slot 0
+        return LoxUserFunction(self.declaration, environment, self.is_initializer, self.cells)
 
     def __repr__(self) -> str:
-        return f"<fn {self.declaration.name.lexeme}>"
+        return f"<fn {self.declaration.name}>"
         
 
 def register_native_functions(global_environment: Environment):
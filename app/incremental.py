@@ -0,0 +1,153 @@
+"""
+Incremental front end, for sources edited again and again (under an editor or a watch loop)
+
+A Document keeps the source with its tokens (and their positions) and its top-level statements.
+After an edit, only the tokens around the edited span are scanned again, until the scan falls back
+in step with the old tokens, and only the top-level statements covering the changed tokens are parsed again:
+the tokens and statements after them are reused as they are (with their line numbers shifted if needed:
+the lines of the positions of their nodes are moved in the line table, see positions.py).
+The Document owns the line table of its statements: the positions of the statements parsed again are dropped from it,
+once they outnumber those in use (see compact()).
+
+    document = Document(source)
+    statements = document.apply_edit(start, end, "new text")  # same statements as Parser(tokenize(new source)).parse()
+"""
+from bisect import bisect_left, bisect_right
+
+from errors import Errors
+from parsing import Parser, ParserError
+from positions import LineTable, relocate
+from scanning import Token, scan
+from syntax import NodeStmt
+
+RESCAN_WINDOW = 1 << 12  # characters scanned at once after an edit, until the scan is back in step with the old tokens
+COMPACTION_RATIO = 2  # the line table is compacted once it holds that many times the positions in use
+
+
+class Document:
+    def __init__(self, source: str, lenient: bool = False):
+        self.source = source
+        self.lenient = lenient
+        self.analyze()
+
+    def analyze(self):
+        """Full scan and parse of the source, reporting the errors (the state any edit falls back to)"""
+        self.had_errors = False
+        self.tokens: list[Token] = []
+        self.positions: list[int] = []  # position in the source of each token
+        errors = []
+        scan(self.source, 0, 1, self.tokens, errors, final=True, positions=self.positions)
+        for err in errors:
+            self.report(*err)
+        self.starts: list[int] = []  # index of the first token of each top-level statement
+        self.ranges: list[range] = []  # position ids of each top-level statement
+        self.lines = LineTable()
+        self.statements: list[NodeStmt] = Parser(self.tokens, self.lenient, on_error=self.report,
+                                                 lines=self.lines).parse(self.starts, self.ranges)
+
+    def report(self, line: int, message: str, where: str = ""):
+        self.had_errors = True
+        Errors.report(line, message, where)
+
+    def apply_edit(self, start: int, end: int, text: str) -> list[NodeStmt]:
+        """Replace source[start:end] with text and return the updated top-level statements.
+           The whole source is analyzed again if it had errors, or if the edit introduces some (so that they are
+           reported just like a full analysis would). The reused statements are the same nodes (their positions keep
+           their ids, only their lines are shifted): only the statements parsed again need to be resolved."""
+        old_source = self.source
+        self.source = old_source[:start] + text + old_source[end:]
+        if self.had_errors or not self.rescan(start, end, len(text) - (end - start)):
+            self.analyze()
+        return self.statements
+
+    def rescan(self, start: int, end: int, delta: int) -> bool:
+        """Scan the source again from a couple of tokens before the edited span (they may merge with the new text,
+           eg. '12.' followed by a digit) until a new token starts where an old token after the span started,
+           then update the statements. Returns False if it can't be done incrementally."""
+        first = max(bisect_left(self.positions, start) - 2, 0)  # index of the first token to scan again
+        position, line = (self.positions[first], self.tokens[first].line) if first else (0, 1)
+        resync = bisect_left(self.positions, end)  # old tokens from this one on are candidates to get back in step
+
+        tokens, positions = [], []
+        window = end + delta - position + RESCAN_WINDOW
+        while True:
+            limit = min(position + window, len(self.source))
+            final = limit == len(self.source)
+            chunk_tokens, chunk_positions, errors = [], [], []
+            scanned, line = scan(self.source[position:limit], 0, line, chunk_tokens, errors, final, chunk_positions)
+            if errors:
+                return False
+            for token, token_position in zip(chunk_tokens, chunk_positions):
+                token_position += position
+                while resync < len(self.positions) and self.positions[resync] + delta < token_position:
+                    resync += 1
+                if resync < len(self.positions) and self.positions[resync] + delta == token_position:
+                    return self.reparse(first, resync, tokens, positions, delta, token.line - self.tokens[resync].line)
+                tokens.append(token)
+                positions.append(token_position)
+            if final:  # rescanned up to EOF
+                return self.reparse(first, len(self.tokens), tokens, positions, delta, 0)
+            position += scanned
+            window *= 2
+
+    def reparse(self, first: int, resync: int, tokens: list[Token], positions: list[int], delta: int, line_delta: int) -> bool:
+        """Replace the old tokens [first:resync] with the new ones, then parse again from the top-level statement
+           before the one holding the first changed token (its end may depend on the next token, eg. 'if' without
+           'else'), until the parser stops at the start of an old statement after the changed tokens."""
+        shift = len(tokens) - (resync - first)
+        if line_delta:  # (the tokens are frozen)
+            self.tokens[resync:] = [Token(token.kind, token.lexeme, token.literal, token.line + line_delta)
+                                    for token in self.tokens[resync:]]
+        self.tokens[first:resync] = tokens
+        self.positions[first:resync] = positions
+        if delta:
+            for idx in range(first + len(tokens), len(self.positions)):
+                self.positions[idx] += delta
+
+        statement = max(bisect_right(self.starts, first) - 2, 0)
+        end_of_new = first + len(tokens)  # new tokens are [first:end_of_new], the old ones follow
+        errors = []
+        parser = Parser(self.tokens, self.lenient, on_error=lambda *err: errors.append(err), lines=self.lines)
+        parser.current = self.starts[statement]
+        starts, ranges, statements = [], [], []
+        reused = len(self.starts)
+        while not parser.is_at_end() or parser.current == 0:  # an empty program is an error, as with parse()
+            starts.append(parser.current)
+            first = len(self.lines)
+            try:
+                statements.append(parser.top_declaration())
+            except ParserError:  # syntax error: let the full analysis report it
+                return False
+            ranges.append(range(first, len(self.lines)))
+            if errors:
+                return False
+            if parser.current >= end_of_new:
+                old_start = parser.current - shift
+                reused = bisect_left(self.starts, old_start)
+                if reused < len(self.starts) and self.starts[reused] == old_start:
+                    break
+                reused = len(self.starts)
+
+        if line_delta:
+            for positions in self.ranges[reused:]:
+                self.lines.shift(positions, line_delta)
+        self.statements[statement:reused] = statements
+        self.starts[statement:reused] = starts
+        self.ranges[statement:reused] = ranges
+        if shift:
+            for idx in range(statement + len(starts), len(self.starts)):
+                self.starts[idx] += shift
+        if len(self.lines) > COMPACTION_RATIO * (1 + sum(len(positions) for positions in self.ranges)):
+            self.compact()
+        return True
+
+    def compact(self):
+        """Drop the positions of the statements replaced by the edits from the line table: the positions in use are
+           moved down in the same order, and the nodes updated in place (the functions keep the same table)"""
+        old, lines = self.lines.lines, self.lines.lines[:1]
+        for index, (statement, positions) in enumerate(zip(self.statements, self.ranges)):
+            first = len(lines)
+            lines.extend(old[positions.start:positions.stop])
+            relocate([statement], first - positions.start)
+            self.ranges[index] = range(first, len(lines))
+        self.lines.lines = lines
@@ -0,0 +1,93 @@
+"""
+Static type inference of the numbers: which operands of the arithmetic and comparison nodes are always numbers,
+so that these nodes are evaluated without checking them (see Interpreter.evaluate()).
+
+A value is proven a number if it is a number literal, the result of an arithmetic operation (a '-', '*' or '/' that
+didn't raise an error, or a '+' with a number operand: the other one must be a number too), or a local variable only
+ever given numbers. Only the variables kept in registers are considered: all their assignments are in the body of the
+function (or top-level statement) that holds their registers, as no closure references them. Which of them are only
+given numbers is found from none, adding those whose values are all proven given the ones found so far, until there
+is none to add (eg. the counter of a loop, assigned itself plus one: a number whatever itself is).
+A variable read in its own initializer (a semantic error, but the REPL still runs the line) is never proven: it is
+read before it is given its value.
+Anything else (parameters, global or captured variables, calls, properties...) may be of any type: the nodes
+operating on them keep their checks, and raise the same errors at run time.
+
+    infer_numbers(function)  # once its variables are located (see Resolver.finish())
+"""
+from environment import REGISTER
+from lexemes import TokenKind
+from syntax import Assign, Binary, Block, Class, Function, Grouping, Literal, Logical, Node, Unary, Var, Variable, walk
+
+ARITHMETIC = (TokenKind.MINUS, TokenKind.STAR, TokenKind.SLASH)  # always give a number, when they don't raise an error
+CHECKED = (TokenKind.MINUS, TokenKind.STAR, TokenKind.SLASH, TokenKind.PLUS,
+           TokenKind.GREATER, TokenKind.GREATER_EQUAL, TokenKind.LESS, TokenKind.LESS_EQUAL)  # check their operands
+
+
+def infer_numbers(owner: Block | Function):
+    """Mark unchecked the nodes of the function (or Block of a top-level statement) whose operands are proven numbers
+       (the nested functions have registers of their own, and are inferred apart)"""
+    statements = owner.statements if isinstance(owner, Block) else owner.body
+    if not isinstance(statements, list):  # (a lazy body, inferred once parsed)
+        return
+    nodes = list(walk(statements, functions=False))[::-1]  # children before their parents
+    writes: dict[int, list] = {}  # register => the values given to its variable (None for unknown ones)
+    if isinstance(owner, Function):
+        for register in range(len(owner.params)):
+            writes[register] = [None]
+    for node in nodes:
+        match node:
+            case Var() as var if var.depth == REGISTER:
+                writes.setdefault(var.slot, []).append(var.initializer)
+                if var.initializer is not None and any(isinstance(read, Variable) and read.depth == REGISTER
+                                                       and read.slot == var.slot for read in walk([var.initializer])):
+                    writes[var.slot].append(None)  # read before it is defined
+            case Assign() as assign if assign.depth == REGISTER:
+                writes.setdefault(assign.slot, []).append(assign.value)
+            case Function() | Class() as declaration if declaration.depth == REGISTER:
+                writes.setdefault(declaration.slot, []).append(None)
+
+    candidates = {register: values for register, values in writes.items() if None not in values}
+    numbers: set[int] = set()
+    while True:
+        proven = _proven(nodes, numbers)
+        found = {register for register, values in candidates.items() if all(proven[id(value)] for value in values)}
+        if found == numbers:
+            break
+        numbers = found
+
+    for node in nodes:
+        match node:
+            case Binary(left=left, right=right, operator=operator):
+                unchecked = operator in CHECKED and proven[id(left)] and proven[id(right)]
+            case Unary(right=right, operator=operator):
+                unchecked = operator == TokenKind.MINUS and proven[id(right)]
+            case _:
+                continue
+        if node.unchecked != unchecked:  # (a node kept from an edited program may be inferred again)
+            object.__setattr__(node, "unchecked", unchecked)  # (the expression nodes are frozen dataclasses)
+
+
+def _proven(nodes: list[Node], numbers: set[int]) -> dict[int, bool]:
+    """id of each node => True if its value is proven a number, given the registers only holding numbers"""
+    proven: dict[int, bool] = {}
+    for node in nodes:  # (children first)
+        match node:
+            case Literal(value=value):
+                number = isinstance(value, float)
+            case Grouping(expr=expr):
+                number = proven[id(expr)]
+            case Unary(operator=operator):
+                number = operator == TokenKind.MINUS
+            case Binary(left=left, operator=operator, right=right):
+                number = operator in ARITHMETIC or (operator == TokenKind.PLUS and (proven[id(left)] or proven[id(right)]))
+            case Logical(left=left, right=right):
+                number = proven[id(left)] and proven[id(right)]
+            case Variable(depth=depth, slot=slot):
+                number = depth == REGISTER and slot in numbers
+            case Assign(value=value):
+                number = proven[id(value)]
+            case _:
+                number = False
+        proven[id(node)] = number
+    return proven
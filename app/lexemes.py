@@ -1,3 +1,4 @@
+from enum import IntEnum
 import string
 
 
@@ -35,11 +36,9 @@ for digit in range(0, 10):
 for letter in string.ascii_letters:
     LEXEMES[letter] = "IDENTIFIER"
 
-MAX_LEX_LENGTH = max(len(lex) for lex in LEXEMES.keys())
-# list of dicts ; the first dict is the sub-dict of lexemes whose length is the max, the second those whose length is one less, etc.
-LEXEMES_DESC_LENGTH = list(
-    reversed([{lex: toktype for lex, toktype in LEXEMES.items() if len(lex) == lexlength} for lexlength in range(1, MAX_LEX_LENGTH + 1)])
-)
+# characters allowed after the first character of a number (with '.' as separator) or an identifier
+DIGITS = frozenset(string.digits)
+IDENTIFIER_CHARS = frozenset(string.ascii_letters + string.digits + '_')
 
 STATEMENTS = ["class",
               "fun",
@@ -62,3 +61,22 @@ RESERVED_WORDS = {stmt: stmt.upper() for stmt in STATEMENTS} | {
     'super': "SUPER", 
     'nil': "NIL", 
 }
+
+# Token kinds are small integers (IntEnum members compare as plain ints), one per token type name
+TokenKind = IntEnum("TokenKind", list(dict.fromkeys([*LEXEMES.values(), *RESERVED_WORDS.values(), "EOF"])), start=0)
+TOKEN_NAMES = tuple(kind.name for kind in TokenKind)  # kind => token type name, as printed by the 'tokenize' command
+
+# dispatch table: first character => list of (lexeme, kind) starting with that character, longest lexemes first
+#  (example: '=' => [('==', EQUAL_EQUAL), ('=', EQUAL)]) so that the scanner picks the longest match
+LEXEMES_BY_FIRST_CHAR: dict[str, list[tuple[str, TokenKind]]] = {}
+for lex, toktype in sorted(LEXEMES.items(), key=lambda item: len(item[0]), reverse=True):
+    LEXEMES_BY_FIRST_CHAR.setdefault(lex[0], []).append((lex, TokenKind[toktype]))
+
+# reserved word => (kind, lexeme) ; the scanner reuses these lexeme strings instead of keeping a copy for each token
+RESERVED_KINDS = {word: (TokenKind[toktype], word) for word, toktype in RESERVED_WORDS.items()}
+
+# kind => lexeme, for the kinds that always have the same one (operators, punctuation and reserved words):
+#  the syntax nodes keep the kind of their operator, not its token
+FIXED_LEXEMES = {TokenKind[toktype]: lex for lex, toktype in LEXEMES.items()
+                 if toktype not in ("NUMBER", "IDENTIFIER", "STRING", "SPACE", "NEWLINE", "COMMENT")}
+FIXED_LEXEMES |= {TokenKind[toktype]: word for word, toktype in RESERVED_WORDS.items()}
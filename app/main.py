@@ -1,37 +1,129 @@
+import os
 import sys
 
 from output import stringify
-from errors import Errors, LoxRuntimeError
-from resolving import Resolver
-from scanning import tokenize
-from parsing import Parser
+from caching import ProgramCache
+from errors import DIAGNOSTICS_LIMIT, Diagnostics, Errors, LoxRuntimeError, LoxStaticError, TooManyErrors
+from resolving import Resolver, parse_resolved
+from scanning import available_cores, iter_tokens, tokenize, tokenize_parallel
+from parsing import Parser, parse_stream
+from positions import LineTable
 from evaluating import Interpreter
+from optimizing import Optimizer
 from syntax import Expression
 
 AVAILABLE_COMMANDS = ['tokenize', 'parse', 'ast', 'evaluate', 'run', 'repl']
+# options given as --name or --name=VALUE: name => (VALUE placeholder or None for flags, description)
+AVAILABLE_OPTIONS = {
+    'jobs': ("N", "tokenize in up to N processes, one per core (for sources of several MB)"),
+    'cache': ("DIR", "cache the analyzed programs run in DIR (default: $LOX_CACHE_DIR)"),
+    'max-errors': ("N", f"stop after N errors (default {DIAGNOSTICS_LIMIT})"),
+    'stream': (None, "run each top-level declaration as soon as it is read"),
+    'lazy': (None, "parse the function bodies when first called (their errors are only found then)"),
+    'fused': (None, "resolve the variables while parsing, instead of in a pass after"),
+    'flat-closures': (None, "keep the variables captured by closures in cells, instead of the environments of their scopes"),
+    'optimize': (None, "fold the constant expressions and prune the dead code before running"),
+}
+# options changing the analyzed statements, that are cached apart
+ANALYSIS_OPTIONS = ('lazy', 'fused', 'flat-closures')
 
 
 def usage(exitcode=0, msg=None):
     if msg:
         print(msg, file=sys.stderr)
-    print(f"Usage: ./lox.sh [{{{'|'.join(AVAILABLE_COMMANDS)}}} [<filename>]]", file=sys.stderr)
+    print(f"Usage: ./lox.sh [{{{'|'.join(AVAILABLE_COMMANDS)}}} [<options>] [<filename>]]", file=sys.stderr)
+    for option, (value, description) in AVAILABLE_OPTIONS.items():
+        print(f"  --{option + (f'={value}' if value else ''):<16}{description}", file=sys.stderr)
     exit(exitcode)
 
 
-def process(interpreter: Interpreter, command: str, source: str, exit_on_errors: bool = True):
+def parse_options(args: list[str]) -> tuple[dict[str, str | bool | int], list[str]]:
+    """Separate the --options (as a dict name => value, True if no value was given, an int for the N values)
+       from the other arguments"""
+    options, others = {}, []
+    for arg in args:
+        if arg.startswith("--"):
+            name, _, value = arg[2:].partition("=")
+            if name not in AVAILABLE_OPTIONS:
+                usage(exitcode=1, msg=f"Unknown option: {arg}")
+            if AVAILABLE_OPTIONS[name][0] == "N":
+                if not value.isdecimal() or int(value) < 1:
+                    usage(exitcode=1, msg=f"Invalid value: {arg} (expected --{name}=N, N > 0)")
+                options[name] = int(value)
+            else:
+                options[name] = value or True
+        else:
+            others.append(arg)
+    return options, others
+
+
+def process(interpreter: Interpreter, command: str, source: str, exit_on_errors: bool = True, options: dict | None = None,
+            cache: ProgramCache | None = None):
+    options = options or {}
+
+    # a cached program is run without being analyzed again
+    cached = cache.load(source, interpreter.globals.slots) if cache is not None else None
+    if cached is not None:
+        statements, lines = cached
+    else:
+        lines = LineTable()
+        statements = analyze(interpreter, command, source, exit_on_errors, options, lines)
+        if cache is not None and not Errors.had_errors:
+            cache.store(source, statements, lines, interpreter.globals.slots)
+    if "optimize" in options and not Errors.had_errors:  # (the cache keeps the statements as analyzed)
+        statements = Optimizer(interpreter).optimize(statements, whole_program=command == "run")
+
+    # evaluating/executing
+    try:
+        # feed each statement to the interpreter one by one, keeping the common state up-to-date
+        for stmt in statements:
+
+            # shortcut to quick evaluation of expressions
+            if (command in ["evaluate", "repl"]) and isinstance(stmt, Expression):
+                output = interpreter.evaluate(stmt.expr)
+                print(stringify(output))
+
+                if command == "evaluate":
+                    exit(0)
+            
+            # full execution of a statement
+            else:
+                interpreter.execute(stmt)
+
+    except LoxRuntimeError as e:
+        _, message = e.args
+        print(f"{message}\n[line {e.locate(lines)}]", file=sys.stderr)
+        if exit_on_errors:
+            exit(70)
+    except LoxStaticError:  # in a lazy function body
+        if exit_on_errors:
+            exit(65)
+
+
+def analyze(interpreter: Interpreter, command: str, source: str, exit_on_errors: bool, options: dict,
+            lines: LineTable) -> list:
+    """Scan, parse and resolve the source into the statements to execute (or print them, depending on the command),
+       their positions in lines"""
     # scanning/tokenizing
-    tokens, errs = tokenize(source)
+    if "jobs" in options:  # (more processes than cores would only compete for them)
+        tokens, errs = tokenize_parallel(source, workers=min(options["jobs"], available_cores()))
+    else:
+        tokens, errs = tokenize(source, on_error=Errors.report)  # reported as soon as found, to stop early if too many
     for line, message in errs:
         Errors.report(line, message)
     
     if command == "tokenize":
-        for tok in tokens:
-            print(tok)
-        check_errors()
-        exit(0)
+        print_tokens(tokens)
 
     # parsing (only 'run' requires semicolon at the end of expressions, ie. all others are lenient)
-    parser = Parser(tokens, lenient=(command != 'run'))
+    lazy = command == 'run' and "lazy" in options
+    flat = "flat-closures" in options
+    if command == 'run' and "fused" in options:  # parsing and semantic analysis at once
+        statements = parse_resolved(tokens, interpreter, lazy=lazy, flat=flat, lines=lines)
+        if exit_on_errors:
+            check_errors()
+        return statements
+    parser = Parser(tokens, lenient=(command != 'run'), lazy=lazy, lines=lines)
     statements = parser.parse()
 
     if command == "parse":
@@ -50,35 +142,41 @@ def process(interpreter: Interpreter, command: str, source: str, exit_on_errors:
         check_errors()
 
     # semantic analysis pass
-    resolver = Resolver(interpreter)
+    resolver = Resolver(interpreter, flat=flat, lines=lines)
     resolver.resolve_statements(statements)
 
     # exit if semantic errors before evaluating
     if exit_on_errors:
         check_errors()
 
-    # evaluating/executing
-    try:
-        # feed each statement to the interpreter one by one, keeping the common state up-to-date
-        for stmt in statements:
+    return statements
 
-            # shortcut to quick evaluation of expressions
-            if (command in ["evaluate", "repl"]) and isinstance(stmt, Expression):
-                output = interpreter.evaluate(stmt.expr)
-                print(stringify(output))
 
-                if command == "evaluate":
-                    exit(0)
-            
-            # full execution of a statement
-            else:
-                interpreter.execute(stmt)
-
-    except LoxRuntimeError as e:
-        token, message = e.args
-        print(f"{message}\n[line {token.line}]", file=sys.stderr)
-        if exit_on_errors:
+def process_stream(interpreter: Interpreter, stream, options: dict):
+    """'run' command on a file read as a stream: each top-level declaration is parsed, resolved and executed
+       in turn, so that the output starts right away and the AST of a declaration is released once executed
+       (unless a function declared in it is still reachable).
+       Unlike process(), the declarations before the first error have already been executed when it's found:
+       past it, the rest of the source is only analyzed, for its errors."""
+    lines = LineTable()
+    resolver = Resolver(interpreter, flat="flat-closures" in options, lines=lines)
+    semantic_errors = False
+    for stmt in parse_stream(iter_tokens(stream, on_error=Errors.report), lazy="lazy" in options, lines=lines):
+        if stmt is None or (Errors.had_errors and not semantic_errors):
+            continue  # past a syntax error, the rest is only parsed (as process() doesn't resolve after one)
+        resolver.resolve(stmt)
+        if Errors.had_errors:
+            semantic_errors = True
+            continue
+        try:
+            interpreter.execute(stmt)
+        except LoxRuntimeError as e:
+            _, message = e.args
+            print(f"{message}\n[line {e.locate(lines)}]", file=sys.stderr)
             exit(70)
+        except LoxStaticError:  # in a lazy function body
+            exit(65)
+    check_errors()
 
 
 def main():
@@ -87,6 +185,8 @@ def main():
         command = "repl"
     else:
         command = sys.argv[1]
+    options, args = parse_options(sys.argv[2:])
+    max_errors = options.get("max-errors", DIAGNOSTICS_LIMIT)
 
     if command in ("help", "-h"):
         usage(exitcode=0)
@@ -95,11 +195,22 @@ def main():
         usage(exitcode=1, msg=f"Unknown command: {command}")
 
     if command != "repl":
-        if len(sys.argv) < 3:
+        if len(args) < 1:
             usage(exitcode=1)
 
-        filename = sys.argv[2]
-        with open(filename) as file:
+        filename = args[0]
+
+        if command == "tokenize" and "jobs" not in options:
+            # stream the tokens, so that huge sources never have to fit in memory
+            with open(filename, errors="replace") as file:
+                diagnosed(max_errors, print_tokens, iter_tokens(file, on_error=Errors.report))
+
+        if command == "run" and "stream" in options:
+            with open(filename, errors="replace") as file:
+                diagnosed(max_errors, process_stream, Interpreter(), file, options)
+            exit(0)
+
+        with open(filename, errors="replace") as file:  # undecodable bytes become unexpected characters
             file_contents = file.read()
 
     # scanner/parser/interpreter
@@ -111,14 +222,39 @@ def main():
             while line := input(">>> "):
                 if line.strip().lower() in ('exit', 'quit'):
                     raise EOFError("quit")
-                process(interpreter, command, line.strip(), exit_on_errors=False)
+                diagnosed(max_errors, process, interpreter, command, line.strip(), exit_on_errors=False, options=options)
         except EOFError as eof:
             if not eof.args:
                 print()
             print("Bye.")
             sys.exit(0)
     else:
-        process(interpreter, command, file_contents)
+        cache_dir = options.get("cache", os.environ.get("LOX_CACHE_DIR"))
+        if cache_dir is True:
+            usage(exitcode=1, msg="Missing directory: --cache=DIR")
+        cache = (ProgramCache(cache_dir, variant=(option for option in ANALYSIS_OPTIONS if option in options))
+                 if cache_dir and command == "run" else None)
+        diagnosed(max_errors, process, interpreter, command, file_contents, options=options, cache=cache)
+
+
+def diagnosed(max_errors: int, action, *args, **kwargs):
+    """Run the action while collecting its errors, printed all at once at the end (see errors.Diagnostics).
+       Past the --max-errors limit, the action is stopped, and so is the whole program unless in the REPL.
+       Each run only sees its own errors: a line of the REPL isn't held back by those of the previous ones."""
+    Errors.had_errors = False
+    try:
+        with Diagnostics(limit=max_errors):
+            action(*args, **kwargs)
+    except TooManyErrors:
+        if kwargs.get("exit_on_errors", True):
+            exit(65)
+
+
+def print_tokens(tokens):
+    for tok in tokens:
+        print(tok)
+    check_errors()
+    exit(0)
 
 
 def check_errors():
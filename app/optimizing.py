@@ -0,0 +1,193 @@
+"""
+Optimizer: an optional stage between the semantic analysis and the execution (--optimize), that simplifies the
+resolved statements without changing what they print nor the runtime errors they raise:
+    - the constant expressions are folded into literals (operations on literals, and so the concatenation of
+      literal strings, logical operators with a literal left operand, and groupings, that only matter to the parser)
+      ; an operation that would raise an error is kept as it is, to raise it when it is run,
+    - the branches of an If with a literal condition that can't be taken are pruned, and so are the loops with a
+      literal false condition and the statements that follow a return, break or continue in a block,
+    - in a whole program, the global declarations that are never referenced (and whose value can't raise an error)
+      are dropped,
+    - the functions (and methods) whose body only returns an expression are run by evaluating it, without executing
+      their body (see LoxUserFunction.call()) ; and the calls of such a global function are inlined, unless it is
+      recursive: its expression is evaluated in place, with the arguments in registers of their own (as its parameters
+      are resolved in the body), so that its variables can't clash with those of the caller. As the name may be given
+      another value at run time, the call checks that it is still this function first (or is run as any other).
+It runs after the resolution, so that the code it prunes still has its semantic errors reported, and keeps the
+resolutions of the nodes. The trees are rewritten from the leaves up, walked with an explicit stack (see walk()):
+the expression nodes are replaced (they are frozen), the statements are updated in place.
+
+    statements = Optimizer(interpreter).optimize(statements, whole_program=True)
+"""
+from dataclasses import replace
+
+from environment import REGISTER
+from errors import LoxRuntimeError
+from inference import infer_numbers
+from lexemes import TokenKind
+from syntax import (AbortLoop, Assign, Binary, Block, Call, Class, Expression, Function, Get, Grouping, If, LazyBody,
+                    Literal, Logical, Node, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable,
+                    While, walk)
+
+
+class Optimizer:
+    def __init__(self, interpreter) -> None:
+        self.interpreter = interpreter  # to fold the constant expressions as they would be evaluated
+
+    def optimize(self, statements: list[NodeStmt], whole_program: bool = False) -> list[NodeStmt]:
+        """The statements simplified ; whole_program: nothing else will reference their global variables
+           (unlike the next lines of the REPL)"""
+        replaced: dict[int, Node | None] = {}  # id of a node => its simplified node (None for a pruned statement)
+        for node in reversed(list(walk(statements))):  # children first
+            simplified = self._simplified(node, replaced)
+            if simplified is not node:
+                replaced[id(node)] = simplified
+        statements = self._statements(statements, replaced)
+        if whole_program:
+            statements = self._used(statements)
+        self._inline(statements)
+        for node in walk(statements):  # the variables given a value in the pruned code may be proven numbers now
+            if isinstance(node, Function) or (isinstance(node, Block) and node.registers is not None):
+                infer_numbers(node)
+        return statements
+
+    def _simplified(self, node: Node, replaced: dict) -> Node | None:
+        """The node simplified, its children already simplified in replaced"""
+        def new(child):
+            return replaced.get(id(child), child)
+
+        match node:
+            case Grouping(expr=expr):
+                return new(expr)
+            case Unary(right=right):
+                return self._folded(replace(node, right=new(right)) if id(right) in replaced else node)
+            case Binary(left=left, right=right):
+                if id(left) in replaced or id(right) in replaced:
+                    node = replace(node, left=new(left), right=new(right))
+                return self._folded(node)
+            case Logical(left=left, operator=operator, right=right):
+                left, right = new(left), new(right)
+                if isinstance(left, Literal):  # short-circuited, or not, already
+                    truthy = self.interpreter.is_truthy(left.value)
+                    return left if truthy == (operator == TokenKind.OR) else right
+                if left is not node.left or right is not node.right:
+                    return replace(node, left=left, right=right)
+                return node
+            case Assign(value=value):
+                return replace(node, value=new(value)) if id(value) in replaced else node
+            case Get(instance=instance):
+                return replace(node, instance=new(instance)) if id(instance) in replaced else node
+            case Set(instance=instance, value=value):
+                if id(instance) in replaced or id(value) in replaced:
+                    return replace(node, instance=new(instance), value=new(value))
+                return node
+            case Call(callee=callee, arguments=arguments):
+                if id(callee) in replaced or any(id(arg) in replaced for arg in arguments):
+                    return replace(node, callee=new(callee), arguments=tuple(new(arg) for arg in arguments))
+                return node
+
+            case Expression() | Print():
+                node.expr = new(node.expr)
+            case Var() as var if var.initializer is not None:
+                var.initializer = new(var.initializer)
+            case Return() as stmt if stmt.value is not None:
+                stmt.value = new(stmt.value)
+            case If() as stmt:
+                condition = new(stmt.condition)
+                if isinstance(condition, Literal):  # only one branch can be taken
+                    return new(stmt.then_stmt) if self.interpreter.is_truthy(condition.value) else new(stmt.else_stmt)
+                stmt.condition = condition
+                stmt.then_stmt = new(stmt.then_stmt) or Block([])  # (a statement is expected)
+                stmt.else_stmt = new(stmt.else_stmt)
+            case While() as stmt:
+                condition = new(stmt.condition)
+                if isinstance(condition, Literal) and not self.interpreter.is_truthy(condition.value):
+                    return None  # never run
+                stmt.condition = condition
+                stmt.body = new(stmt.body) or Block([])
+                if stmt.increment is not None:
+                    stmt.increment = new(stmt.increment)
+            case Block() as block:
+                block.statements = self._statements(block.statements, replaced)
+            case Function(body=list() as body) as function:
+                function.body = self._statements(body, replaced)
+        return node
+
+    def _folded(self, operation: Unary | Binary) -> Unary | Binary | Literal:
+        """The literal of the value of the operation on literals, unless it raises an error"""
+        operands = (operation.right,) if isinstance(operation, Unary) else (operation.left, operation.right)
+        if not all(isinstance(operand, Literal) for operand in operands):
+            return operation
+        try:
+            return Literal(self.interpreter.evaluate(operation))
+        except (LoxRuntimeError, ArithmeticError):
+            return operation
+
+    def _statements(self, statements: list[NodeStmt], replaced: dict) -> list[NodeStmt]:
+        """The statements of a block simplified, without the pruned ones nor those that can't be reached"""
+        kept = []
+        for stmt in statements:
+            stmt = replaced.get(id(stmt), stmt)
+            if stmt is None:
+                continue
+            kept.append(stmt)
+            if isinstance(stmt, (Return, AbortLoop)):
+                break
+        return kept
+
+    def _used(self, statements: list[NodeStmt]) -> list[NodeStmt]:
+        """The statements without the declarations of the global variables that are never referenced"""
+        used = set()
+        for node in walk(statements):
+            match node:
+                case Variable(name=name, depth=None) | Assign(name=name, depth=None):
+                    used.add(name)
+                case Function(body=LazyBody(tokens=tokens)):  # (its references aren't known yet)
+                    used.update(token.lexeme for token in tokens if token.kind == TokenKind.IDENTIFIER)
+        return [stmt for stmt in statements if not self._unused(stmt, used)]
+
+    def _unused(self, stmt: NodeStmt, used: set[str]) -> bool:
+        """True for the declaration of a global variable never referenced, whose value can't raise an error"""
+        match stmt:
+            case Var(initializer=None | Literal()) | Function() | Class(superclass=None):
+                return stmt.depth is None and stmt.name not in used
+        return False
+
+    def _inline(self, statements: list[NodeStmt]):
+        """Give their expression to the functions that only return one, and their declaration to the calls of the
+           global ones that can be inlined"""
+        inlined: dict[str, Function | None] = {}  # name of a global function => its declaration (None if declared again)
+        initializers = set()  # (they return "this")
+        for node in walk(statements):  # (a class before its methods)
+            match node:
+                case Class(methods=methods):
+                    initializers.update(id(method) for method in methods if method.name == "init")
+                case Function(body=[Return(value=value)], slots=None) if value is not None:
+                    if id(node) not in initializers:
+                        node.inline = value
+        for stmt in statements:
+            match stmt:
+                case Var(name=name, depth=None) | Class(name=name, depth=None):
+                    inlined[name] = None
+                case Function(name=name, depth=None) as function:
+                    inlined[name] = None if name in inlined or not self._inlinable(function) else function
+        for node in walk(statements):
+            match node:
+                case Call(callee=Variable(name=name, depth=None), arguments=arguments) if inlined.get(name):
+                    if len(arguments) == len(inlined[name].params):  # (else an error, raised by the call)
+                        object.__setattr__(node, "inlined", inlined[name])  # (the expression nodes are frozen dataclasses)
+
+    def _inlinable(self, function: Function) -> bool:
+        """True if the expression of the function only references its parameters and global variables (it is then
+           evaluated the same anywhere), but not the function itself"""
+        if function.inline is None or function.registers != len(function.params):
+            return False
+        for node in walk([function.inline]):
+            match node:
+                case Variable(name=name, depth=None) if name == function.name:
+                    return False
+                case Variable(depth=depth) | Assign(depth=depth) if depth not in (REGISTER, None):
+                    return False
+                case This() | Super():
+                    return False
+        return True
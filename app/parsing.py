@@ -1,25 +1,94 @@
+from enum import IntEnum
+from itertools import islice
+from typing import Iterator
+
 from errors import Errors
-from lexemes import STATEMENTS
+from lexemes import STATEMENTS, TokenKind
+from positions import LineTable
+from scanning import Token
 from syntax import (Assign, Binary, Block, AbortLoop, Call, Class, Expression, Function, Get, Grouping, 
-                    If, Literal, Logical, NodeExpr, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable, While)
+                    If, LazyBody, Literal, Logical, NodeExpr, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable, While)
+
+
+class Precedence(IntEnum):
+    """Precedence levels of the operators, from the loosest to the tightest binding"""
+    OR = 1
+    AND = 2
+    EQUALITY = 3
+    COMPARISON = 4
+    TERM = 5
+    FACTOR = 6
+    UNARY = 7
+    CALL = 8
+
+
+class Frame(IntEnum):
+    """What's left to do once the expression being parsed by Parser.operation() is complete"""
+    OPERATOR = 1  # apply a binary (or logical) operator with it as right operand
+    UNARY = 2  # apply a unary operator to it
+    EXPRESSION = 3  # it is a whole expression: see if it's the target of an assignment, then pass it on
+    ASSIGNMENT = 4  # assign it to the target on the left of '='
+    GROUPING = 5  # close the parentheses around it
+    CALL = 6  # add it to the arguments of a call
+
+
+# token kind => (precedence, node class) of the infix operators ; calls and property accesses are the tightest ones
+INFIX_OPERATORS = {
+    TokenKind.OR: (Precedence.OR, Logical),
+    TokenKind.AND: (Precedence.AND, Logical),
+    TokenKind.EQUAL_EQUAL: (Precedence.EQUALITY, Binary),
+    TokenKind.BANG_EQUAL: (Precedence.EQUALITY, Binary),
+    TokenKind.GREATER: (Precedence.COMPARISON, Binary),
+    TokenKind.GREATER_EQUAL: (Precedence.COMPARISON, Binary),
+    TokenKind.LESS: (Precedence.COMPARISON, Binary),
+    TokenKind.LESS_EQUAL: (Precedence.COMPARISON, Binary),
+    TokenKind.PLUS: (Precedence.TERM, Binary),
+    TokenKind.MINUS: (Precedence.TERM, Binary),
+    TokenKind.STAR: (Precedence.FACTOR, Binary),
+    TokenKind.SLASH: (Precedence.FACTOR, Binary),
+    TokenKind.LEFT_PAREN: (Precedence.CALL, Call),
+    TokenKind.DOT: (Precedence.CALL, Get),
+}
+
+KEYWORD_LITERALS = {TokenKind.FALSE: False, TokenKind.TRUE: True, TokenKind.NIL: None}
+
+STREAM_LOOKAHEAD = 1 << 10  # tokens read ahead by parse_stream(), doubled while a declaration doesn't fit
 
 
 class Parser:
-    def __init__(self, tokens, lenient=False):
+    def __init__(self, tokens, lenient=False, on_error=None, lazy=False, resolver=None, lines=None):
         self.tokens = tokens
         self.current = 0
         # lenient mode allows expressions without ending ';' to compile and returns their value
         #  ...it's the magic that allow commands 'parse' and 'evaluate' to still work
         self.lenient = lenient
-
-    def parse(self) -> list[NodeStmt]:
+        # lazy mode only skips the function bodies up to their matching '}', to parse them when first called
+        self.lazy = lazy
+        # called as on_error(line, message, where) for each syntax error (reported right away by default)
+        self.on_error = on_error or Errors.report
+        # resolver mode runs the steps of this Resolver as the nodes are built (see resolving.parse_resolved())
+        self.resolver = resolver
+        # line table of the positions of the nodes (see positions.py): a new one for a new program
+        self.lines: LineTable = lines if lines is not None else LineTable()
+        self.line_positions: dict[int, int] = {}  # line => its position id, for the current top-level statement
+
+    def parse(self, starts: list[int] | None = None, ranges: list[range] | None = None) -> list[NodeStmt]:
+        """Parse the whole program. If a starts list is given, the index of the first token
+           of each top-level statement is appended to it ; if a ranges list is given, the range
+           of the position ids of each top-level statement (see top_declaration())."""
         statements = []
         while True:
+            if starts is not None:
+                starts.append(self.current)
+            first = len(self.lines)
             try:
-                statements.append(self.declaration())
+                statements.append(self.top_declaration())
             except ParserError as pex:
-                Errors.report(*pex.args[0])
+                self.on_error(*pex.args[0])
                 break
+            finally:
+                if ranges is not None:
+                    ranges.append(range(first, len(self.lines)))
             if self.is_at_end():
                 break
 
@@ -88,58 +157,95 @@ class Parser:
     arguments      → expression ( "," expression )* ;
     """
 
+    # Statement parsing: the statements that may nest other statements are parsed by generators (see run())
+
+    def run(self, steps):
+        """Run a generator parsing (nested) statements, such as declaration(), and return the parsed statement.
+           Instead of calling each other recursively, these generators yield the generator parsing the nested
+           statement and get its result back: they are run here on an explicit stack, so that the nesting depth
+           of the program is only limited by memory. A ParserError goes up the stack as if they were calls."""
+        stack = [steps]
+        result, error = None, None
+        while stack:
+            try:
+                nested = stack[-1].send(result) if error is None else stack[-1].throw(error)
+            except StopIteration as done:
+                stack.pop()
+                result, error = done.value, None
+            except ParserError as pex:
+                stack.pop()
+                result, error = None, pex
+            else:
+                stack.append(nested)
+                result, error = None, None
+        if error is not None:
+            raise error
+        return result
+
+    def top_declaration(self) -> NodeStmt | None:
+        """Parse a top-level declaration: its nodes get positions of their own (see position()),
+           the position ids taken from len(self.lines) on"""
+        self.line_positions = {}
+        return self.run(self.declaration())
+
     def declaration(self):
         """ declaration    → classDecl | funDecl | varDecl | statement ; """
+        state = self.resolver.state() if self.resolver is not None else None
         try:
-            if self.match("CLASS"):
-                return self.class_declaration()
-            if self.match("FUN"):
-                return self.function(kind="function")
-            if self.match("VAR"):
+            if self.match(TokenKind.CLASS):
+                return (yield self.class_declaration())
+            if self.match(TokenKind.FUN):
+                return (yield self.function(kind="function"))
+            if self.match(TokenKind.VAR):
                 return self.var_declaration_statement()
         except ParserError as pex:
-            Errors.report(*pex.args[0])
+            self.on_error(*pex.args[0])
             self.synchronize_post_error()
+            if state is not None:
+                self.resolver.restore(state)
             return
         
-        return self.statement()
+        return (yield self.statement())
 
     def statement(self):
         """ statement      → exprStmt | ifStmt | printStmt | returnStmt | whileStmt | abortLoopStmt | block ; """
-        if self.match("IF"):
-            return self.if_statement()
-        if self.match("PRINT"):
+        if self.match(TokenKind.IF):
+            return (yield self.if_statement())
+        if self.match(TokenKind.PRINT):
             return self.print_statement()
-        if self.match("RETURN"):
+        if self.match(TokenKind.RETURN):
             return self.return_statement()
-        if self.match("FOR"):
-            return self.for_statement()
-        if self.match("WHILE"):
-            return self.while_statement()
-        if self.match(["BREAK", "CONTINUE"]):
+        if self.match(TokenKind.FOR):
+            return (yield self.for_statement())
+        if self.match(TokenKind.WHILE):
+            return (yield self.while_statement())
+        if self.match(TokenKind.BREAK, TokenKind.CONTINUE):
             return self.abort_loop_statement()
-        if self.match("LEFT_BRACE"):
-            return Block(self.block())
+        if self.match(TokenKind.LEFT_BRACE):
+            if self.resolver is None:
+                return Block((yield self.block()))
+            self.resolver.begin_scope()
+            block = Block((yield self.block()))
+            self.resolver.end_scope(block)
+            return block
         
         # If it's not a statement, it MUST be an expression
         return self.expression_statement()
-        
-    # Statement parsing
 
     def if_statement(self):
         """ ifStmt         → "if" "(" expression ")" statement
                              ( "else" statement )? ; """
         currtok = self.previous_token()  # IF token
-        if not self.match("LEFT_PAREN"):
+        if not self.match(TokenKind.LEFT_PAREN):
             raise self.error(currtok, "Expected '(' after 'if'.")
         condition = self.expression()
-        if not self.match("RIGHT_PAREN"):
+        if not self.match(TokenKind.RIGHT_PAREN):
             raise self.error(currtok, "Expected ')' after if condition.")
         
-        then_stmt = self.statement()
+        then_stmt = yield self.statement()
         else_stmt = None
-        if self.match("ELSE"):
-            else_stmt = self.statement()
+        if self.match(TokenKind.ELSE):
+            else_stmt = yield self.statement()
         
         return If(condition, then_stmt, else_stmt)
 
@@ -147,7 +253,7 @@ class Parser:
         """ printStmt      → "print" expression ";" ; """
         currtok = self.previous_token()  # PRINT token
         value = self.expression()
-        if not (self.match("SEMICOLON") or self.lenient):
+        if not (self.match(TokenKind.SEMICOLON) or self.lenient):
             raise self.error(currtok, "Expected ';' after value.")
         return Print(value)
     
@@ -155,29 +261,40 @@ class Parser:
         """ returnStmt     → "return" expression? ";" ; """
         currtok = self.previous_token()  # RETURN token
         value = None
-        if self.is_at_end() or self.peek().toktype != "SEMICOLON":
+        has_value = self.is_at_end() or self.peek().kind != TokenKind.SEMICOLON
+        position = self.position(currtok)
+        if self.resolver is not None:
+            self.resolver.check_return(position, has_value)
+        if has_value:
             value = self.expression()
-        if not (self.match("SEMICOLON") or self.lenient):
+        if not (self.match(TokenKind.SEMICOLON) or self.lenient):
             raise self.error(currtok, "Expected ';' after return value.")
-        return Return(currtok, value)
+        return Return(value, position)
 
     def while_statement(self):
         """ whileStmt      → "while" "(" expression ")" statement ; """
         currtok = self.previous_token()  # WHILE token
-        if not self.match("LEFT_PAREN"):
+        if not self.match(TokenKind.LEFT_PAREN):
             raise self.error(currtok, "Expected '(' after 'while'.")
+        if self.resolver is not None:
+            enclosing_flow = self.resolver.begin_loop()
         condition = self.expression()
-        if not self.match("RIGHT_PAREN"):
+        if not self.match(TokenKind.RIGHT_PAREN):
             raise self.error(currtok, "Expected ')' after condition.")
-        body = self.statement()
+        body = yield self.statement()
+        if self.resolver is not None:
+            self.resolver.end_loop(enclosing_flow)
         return While(condition, body, increment=None)
     
     def abort_loop_statement(self):
         """ abortLoopStmt  → ("break" | "continue") ";" ; """
         currtok = self.previous_token()  # BREAK or CONTINUE token
-        if not (self.match("SEMICOLON") or self.lenient):
+        position = self.position(currtok)
+        if self.resolver is not None:
+            self.resolver.check_abort_loop(currtok.kind, position)
+        if not (self.match(TokenKind.SEMICOLON) or self.lenient):
             raise self.error(currtok, f"Expected ';' after '{currtok.lexeme}'.")
-        return AbortLoop(currtok)
+        return AbortLoop(currtok.kind, position)
     
     def for_statement(self):
         """ forStmt        → "for" "(" ( varDecl | exprStmt | ";" )
@@ -187,29 +304,35 @@ class Parser:
                   allow everything the "for" needs
         """
         currtok = self.previous_token()  # FOR token
-        if not self.match("LEFT_PAREN"):
+        if not self.match(TokenKind.LEFT_PAREN):
             raise self.error(currtok, "Expected '(' after 'for'.")
         
-        if self.match("SEMICOLON"):
+        resolver = self.resolver
+        if self.match(TokenKind.SEMICOLON):
             # no initializer
             initializer = None
-        elif self.match("VAR"):
-            # initializer is a "var <name> [= <value>]" statement
-            initializer = self.var_declaration_statement()
         else:
-            # initializer must be an expression statement (eg. "a = 0" with "a" already declared previously)
-            initializer = self.expression_statement()
+            if resolver is not None:  # the scope of the block of the desugared loop
+                resolver.begin_scope()
+            if self.match(TokenKind.VAR):
+                # initializer is a "var <name> [= <value>]" statement
+                initializer = self.var_declaration_statement()
+            else:
+                # initializer must be an expression statement (eg. "a = 0" with "a" already declared previously)
+                initializer = self.expression_statement()
+        if resolver is not None:
+            enclosing_flow = resolver.begin_loop()
 
         condition = Literal(True)  # by default, with no condition we always execute the body
-        if not self.peek().toktype == "SEMICOLON":
+        if not self.peek().kind == TokenKind.SEMICOLON:
             condition = self.expression()
-        if not self.match("SEMICOLON"):
+        if not self.match(TokenKind.SEMICOLON):
             raise self.error(currtok, "Expected ';' after loop condition.")
         
         increment = None
-        if not self.peek().toktype == "RIGHT_PAREN":
+        if not self.peek().kind == TokenKind.RIGHT_PAREN:
             increment = self.expression()
-        if not self.match("RIGHT_PAREN"):
+        if not self.match(TokenKind.RIGHT_PAREN):
             raise self.error(currtok, "Expected ')' after for clauses.")
         
         # desugaring >>
@@ -223,12 +346,17 @@ class Parser:
         #    }
         #  }
 
-        body = self.statement()
+        body = yield self.statement()
 
         body = While(condition, body, increment)
 
+        if resolver is not None:
+            resolver.end_loop(enclosing_flow)
+
         if initializer:
             body = Block([initializer, body])
+            if resolver is not None:
+                resolver.end_scope(body)
 
         return body
 
@@ -237,34 +365,42 @@ class Parser:
         # Expressions with side effect
         currtok = self.peek()
         value = self.expression()
-        if not (self.match("SEMICOLON") or self.lenient):
+        if not (self.match(TokenKind.SEMICOLON) or self.lenient):
             raise self.error(currtok, "Expected ';' after expression.")
         return Expression(value)
     
     def var_declaration_statement(self):
         """ varDecl        → "var" IDENTIFIER ( "=" expression )? ";" ; """
         currtok = self.peek()  # 'var'
-        if not self.match("IDENTIFIER"):
+        if not self.match(TokenKind.IDENTIFIER):
             raise self.error(currtok, "Expected variable name.")
         name = self.previous_token()
+        position = self.position(name)
+        if self.resolver is not None:
+            local = self.resolver.declare(name.lexeme, position)
 
         initializer = None
-        if self.match("EQUAL"):
+        if self.match(TokenKind.EQUAL):
             initializer = self.expression()
+        if self.resolver is not None:
+            self.resolver.define(name.lexeme)
 
-        if not (self.match("SEMICOLON") or self.lenient):
+        if not (self.match(TokenKind.SEMICOLON) or self.lenient):
             raise self.error(currtok, "Expected ';' after variable declaration.")
-        return Var(name, initializer=initializer)
+        var = Var(name.lexeme, initializer, position)
+        if self.resolver is not None:
+            self.resolver.locate(var, local)
+        return var
     
     def block(self):
         """ block          → "{" declaration* "}" ; """
         currtok = self.previous_token()  # '{'
         statements = []
 
-        while not self.is_at_end() and self.peek().toktype != "RIGHT_BRACE":
-            statements.append(self.declaration())
+        while not self.is_at_end() and self.peek().kind != TokenKind.RIGHT_BRACE:
+            statements.append((yield self.declaration()))
 
-        if not self.match("RIGHT_BRACE"):
+        if not self.match(TokenKind.RIGHT_BRACE):
             raise self.error(currtok, "Expected '}' after block.")
         
         return statements
@@ -275,224 +411,312 @@ class Parser:
             parameters     → IDENTIFIER ( "," IDENTIFIER )* ; """
         currtok = self.peek()  # the FUN token
 
-        if not self.match("IDENTIFIER"):
+        if not self.match(TokenKind.IDENTIFIER):
             raise self.error(currtok, f"Expected {kind} name.")
         name = self.previous_token()
+        position = self.position(name)
+        resolver = self.resolver
+        local = None
+        if resolver is not None and kind == "function":  # bind and record the function name (methods are in the class)
+            local = resolver.declare(name.lexeme, position)
+            resolver.define(name.lexeme)
         
-        if not self.match("LEFT_PAREN"):
+        if not self.match(TokenKind.LEFT_PAREN):
             raise self.error(name, f"Expected '(' after {kind} name.")
         
         parameters = []
-        if self.peek().toktype != "RIGHT_PAREN":
+        if self.peek().kind != TokenKind.RIGHT_PAREN:
             while True:
                 if len(parameters) >= 255:
-                    Errors.report(self.peek().line, "Can't have more than 255 arguments.", f" at '{self.peek().lexeme}'")
-                if not self.match("IDENTIFIER"):
+                    self.on_error(self.peek().line, "Can't have more than 255 arguments.", f" at '{self.peek().lexeme}'")
+                if not self.match(TokenKind.IDENTIFIER):
                     raise self.error(name, "Expected parameter name.")
                 parameters.append(self.previous_token())
-                if not self.match("COMMA"):
+                if not self.match(TokenKind.COMMA):
                     break
         
-        if not self.match("RIGHT_PAREN"):
+        if not self.match(TokenKind.RIGHT_PAREN):
             raise self.error(name, "Expected ')' after parameters.")
 
-        if not self.match("LEFT_BRACE"):
+        if not self.match(TokenKind.LEFT_BRACE):
             raise self.error(name, f"Expected '{{' before {kind} body.")
         
-        body = self.block()
-
-        return Function(name, parameters, body)
+        params = [param.lexeme for param in parameters]
+        param_positions = tuple(self.position(param) for param in parameters)
+        if self.lazy:
+            function = Function(name.lexeme, params, self.lazy_body(), position, param_positions)
+            function.lines = self.lines
+            if resolver is not None:
+                if kind == "function":
+                    resolver.locate(function, local)
+                resolver.defer_function(function, resolver.function_type(name.lexeme, kind))
+            return function
+        if resolver is not None:
+            enclosing_flow = resolver.begin_function(params, param_positions, resolver.function_type(name.lexeme, kind))
+        function = Function(name.lexeme, params, (yield self.block()), position, param_positions)
+        function.lines = self.lines
+        if resolver is not None:
+            if kind == "function":
+                resolver.locate(function, local)
+            resolver.end_function(enclosing_flow, function)
+        return function
+
+    def lazy_body(self) -> LazyBody:
+        """Skip a function body up to its matching '}' (the only syntax error found is a missing one),
+           keeping its tokens to parse it later with parse_lazy_body()"""
+        tokens = self.tokens
+        start = self.current - 1  # '{'
+        depth = 1
+        while depth:
+            kind = tokens[self.current].kind
+            if kind is TokenKind.EOF:
+                raise self.error(tokens[start], "Expected '}' after block.")
+            if kind is TokenKind.LEFT_BRACE:
+                depth += 1
+            elif kind is TokenKind.RIGHT_BRACE:
+                depth -= 1
+            self.current += 1
+        end_of_body = Token(TokenKind.EOF, None, None, tokens[self.current - 1].line)
+        return LazyBody(tokens[start:self.current] + [end_of_body], self.lenient)
     
     def class_declaration(self):
         """ classDecl      → "class" IDENTIFIER ( "<" IDENTIFIER )? "{" function* "}" ; """
         currtok = self.peek()  # the CLASS token
 
-        if not self.match("IDENTIFIER"):
+        if not self.match(TokenKind.IDENTIFIER):
             raise self.error(currtok, "Expected class name.")
         name = self.previous_token()
+        position = self.position(name)
         
         superclass = None
-        if self.match("LESS"):
-            if not self.match("IDENTIFIER"):
+        if self.match(TokenKind.LESS):
+            if not self.match(TokenKind.IDENTIFIER):
                 raise self.error(currtok, "Expected superclass name.")
-            superclass = Variable(self.previous_token())
+            superclass = Variable(self.previous_token().lexeme, self.position(self.previous_token()))
+        if self.resolver is not None:
+            local = self.resolver.declare(name.lexeme, position)
+            self.resolver.define(name.lexeme)
+            enclosing_classtype = self.resolver.begin_class(name.lexeme, superclass)
 
-        if not self.match("LEFT_BRACE"):
+        if not self.match(TokenKind.LEFT_BRACE):
             raise self.error(name, "Expected '{' before class body.")
         
         methods = []
-        while not self.is_at_end() and not self.peek().toktype == 'RIGHT_BRACE':
-            methods.append(self.function("method"))
+        while not self.is_at_end() and not self.peek().kind == TokenKind.RIGHT_BRACE:
+            methods.append((yield self.function("method")))
         
-        if not self.match("RIGHT_BRACE"):
+        if not self.match(TokenKind.RIGHT_BRACE):
             raise self.error(name, "Expected '}' after class body.")
-        
-        return Class(name, superclass, methods)
+        klass = Class(name.lexeme, superclass, methods, position)
+        if self.resolver is not None:
+            self.resolver.locate(klass, local)
+            self.resolver.end_class(superclass, enclosing_classtype)
+        return klass
+
+    def parse_lazy_body(self) -> list[NodeStmt]:
+        """Parse the statements of a lazy body, given as the tokens of the parser (see lazy_body())"""
+        self.current = 1  # after '{'
+        try:
+            return self.run(self.block())
+        except ParserError as pex:
+            self.on_error(*pex.args[0])
+            return []
 
     # Expression parsing
+    # The whole expression grammar is parsed by a single loop, operation(): operands are parsed by primary(),
+    #  the operators are looked up by token kind in the INFIX_OPERATORS table (each grammar rule from logic_or
+    #  to call being a precedence level) and what's left to do once an operand is complete is kept on an explicit
+    #  stack of frames, not in recursive calls, so that the nesting depth is only limited by memory.
 
     def expression(self):
         """ expression     → assignment ; """
-        return self.assignment()
-    
-    def assignment(self):
-        """ assignment     → ( call "." )? IDENTIFIER "=" assignment | logic_or ; """
+        return self.operation(Precedence.OR, assignment=True)
+
+    def operation(self, precedence: int, expr: NodeExpr | None = None, assignment: bool = False):
+        """Parse an expression made of operators binding at least as tightly as the given precedence (or a whole
+           expression, assignments included, if assignment is True), starting with the operand expr if given.
+           Pratt parser: after each operand, as long as the next token is an infix operator of high enough precedence,
+           it is applied to the expression so far ; the operators waiting for their right operand (and the groupings,
+           calls and assignments waiting for their inner expression) are frames pushed on a stack."""
+        tokens, infix_operators = self.tokens, INFIX_OPERATORS
+        stack = [(Frame.EXPRESSION,)] if assignment else []
+        while True:
+            if expr is None:  # parse an operand, possibly after prefix operators
+                token = tokens[self.current]
+                kind = token.kind
+                if kind is TokenKind.BANG or kind is TokenKind.MINUS:
+                    self.current += 1
+                    stack.append((Frame.UNARY, token, precedence))
+                    precedence = Precedence.UNARY
+                    continue
+                if kind is TokenKind.LEFT_PAREN:
+                    self.current += 1
+                    stack.append((Frame.GROUPING, token, precedence))
+                    stack.append((Frame.EXPRESSION,))
+                    precedence = Precedence.OR
+                    continue
+                expr = self.primary()
+
+            # apply the infix operators binding tightly enough
+            operator = tokens[self.current]
+            infix = infix_operators.get(operator.kind)
+            if infix is not None and infix[0] >= precedence:
+                self.current += 1
+                operator_precedence, node = infix
+                if node is Get:
+                    if not self.match(TokenKind.IDENTIFIER):
+                        raise self.error(operator, "Expected property name after '.'.")
+                    name = self.previous_token()
+                    expr = Get(expr, name.lexeme, self.position(name))
+                elif node is Call:
+                    if self.match(TokenKind.RIGHT_PAREN):
+                        expr = Call(expr, (), self.position(self.previous_token()))
+                    else:
+                        stack.append((Frame.CALL, expr, operator, [], precedence))
+                        stack.append((Frame.EXPRESSION,))
+                        precedence = Precedence.OR
+                        expr = None
+                else:  # binary or logical operator: its right operand only takes the operators binding tighter
+                    stack.append((Frame.OPERATOR, expr, operator, node, precedence))  # so that a-b-c is (a-b)-c
+                    precedence = operator_precedence + 1
+                    expr = None
+                continue
+
+            # no more operator for this precedence: the expression is complete, give it to the last frame
+            if not stack:
+                return expr
+            frame = stack.pop()
+            if frame[0] is Frame.OPERATOR:
+                _, left, operator, node, precedence = frame
+                expr = node(left, operator.kind, expr, self.position(operator))
+                continue
+            if frame[0] is Frame.UNARY:
+                _, operator, precedence = frame
+                expr = Unary(operator.kind, expr, self.position(operator))
+                continue
+
+            # Frame.EXPRESSION: the expression might be the target of an assignment
+            if self.match(TokenKind.EQUAL):
+                if self.resolver is not None and not isinstance(expr, (Variable, Get)):
+                    self.resolve_invalid_target(expr)
+                stack.append((Frame.ASSIGNMENT, expr, self.previous_token()))
+                stack.append((Frame.EXPRESSION,))  # a = b = 1 is allowed
+                expr = None
+                continue
+            while stack and stack[-1][0] is Frame.ASSIGNMENT:
+                _, target, equal = stack.pop()
+                expr = self.assignment_target(target, equal, expr)
+            if not stack:
+                return expr
+            frame = stack.pop()
+            if frame[0] is Frame.GROUPING:
+                _, currtok, precedence = frame
+                if not self.match(TokenKind.RIGHT_PAREN):
+                    raise self.error(currtok, "Expected ')' after expression.")
+                expr = Grouping(expr)
+                continue
+
+            # Frame.CALL: expr is one of its arguments
+            _, callee, currtok, arguments, precedence = frame
+            arguments.append(expr)
+            expr = None
+            if self.match(TokenKind.COMMA):
+                if len(arguments) >= 255:
+                    self.on_error(currtok.line, "Can't have more than 255 arguments.", " at '('")
+                stack.append(frame)
+                stack.append((Frame.EXPRESSION,))
+                precedence = Precedence.OR
+            elif not self.match(TokenKind.RIGHT_PAREN):
+                raise self.error(currtok, "Expected ')' after arguments.")
+            else:
+                expr = Call(callee, tuple(arguments), self.position(self.previous_token()))
+
+    def assignment_target(self, expr: NodeExpr, equal, value: NodeExpr) -> NodeExpr:
+        """The assignment of value to expr, found on the left of the equal sign"""
         # Assignments (like "a = 3") are tricky because they start as a normal expression
         #  (here "a" could mean we want the value of the variable) but the parser can only
         #  understand it is an assignment later, when it encounters the '=' token.
-        # So we will parse the first tokens as an expression, and convert that to the left-hand
+        # So we parse the first tokens as an expression, and convert that to the left-hand
         #  side of an assignment, ie. a token, only if we meet an equal sign afterwards.
-        # Otherwise we will return the expression... as an expression.
-        expr = self.logic_or()
-
-        if self.match("EQUAL"):  # it's an assignment, not a right-side expression
-            currtok = self.previous_token()  # '=' token
-            value = self.assignment()  # a = b = 1 is allowed
-
-            if isinstance(expr, Variable):
-                name = expr.name
-                return Assign(name, value)
-            elif isinstance(expr, Get):
-                # In the case of an assignment to an instance property, the last part of the
-                #  left side expression has been parsed as a Get ("---.property") but meeting
-                #  and equal sign means it should actually be a Set ("---.property = 0")
-                # We transform and return it. 
-                return Set(expr.instance, expr.name, value)
-            else:
-                self.error(currtok, "Invalid assignment target.")
-
-        # It wasn't an assignment, go on parsing it as an expression
-        return expr
-
-    def logic_or(self):
-        """ logic_or       → logic_and ( "or" logic_and )* ; """
-        expr = self.logic_and()
-
-        while self.match("OR"):
-            operator = self.previous_token()
-            right = self.logic_and()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def logic_and(self):
-        """ logic_and      → equality ( "and" equality )* ; """
-        expr = self.equality()
-
-        while self.match("AND"):
-            operator = self.previous_token()
-            right = self.equality()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def equality(self):
-        """ equality       → comparison ( ( "!=" | "==" ) comparison )* ; """
-        expr = self.comparison()
-
-        while self.match(["EQUAL_EQUAL", "BANG_EQUAL"]):
-            operator = self.previous_token() # '!=' or '=='
-            right = self.comparison()
-            expr = Binary(expr, operator, right)
-
-        return expr
-    
-    def comparison(self):
-        """ comparison     → term ( ( ">" | ">=" | "<" | "<=" ) term )* ; """
-        expr = self.term()
-
-        while self.match(["GREATER", "GREATER_EQUAL", "LESS", "LESS_EQUAL"]):
-            operator = self.previous_token()  # '>' / '>=' / '<' / '<='
-            right = self.term()
-            expr = Binary(expr, operator, right)
-
-        return expr
-    
-    def term(self):
-        """ term           → factor ( ( "-" | "+" ) factor )* ; """
-        expr = self.factor()
-
-        while self.match(["PLUS", "MINUS"]):
-            operator = self.previous_token()  # '+' or '-'
-            right = self.factor()
-            expr = Binary(expr, operator, right)
-
-        return expr
-    
-    def factor(self):
-        """ factor         → unary ( ( "/" | "*" ) unary )* ; """
-        expr = self.unary()
-
-        while self.match(["STAR", "SLASH"]):
-            operator = self.previous_token()  # '*' or '/'
-            right = self.unary()
-            expr = Binary(expr, operator, right)
+        if isinstance(expr, Variable):
+            assign = Assign(expr.name, value, expr.position)
+            if self.resolver is not None:
+                self.resolver.resolve_local(assign, expr.name)
+            return assign
+        elif isinstance(expr, Get):
+            # In the case of an assignment to an instance property, the last part of the
+            #  left side expression has been parsed as a Get ("---.property") but meeting
+            #  and equal sign means it should actually be a Set ("---.property = 0")
+            # We transform and return it. 
+            return Set(expr.instance, expr.name, value, expr.position)
+        else:
+            self.error(equal, "Invalid assignment target.")
+            if self.resolver is not None:
+                self.resolver.muted -= 1
+            return expr
+
+    def resolve_invalid_target(self, expr: NodeExpr):
+        """In resolver mode, an expression that can't be assigned to is met before '=': it is kept, but the value
+           after '=' is dropped (see assignment_target()). The variable read just before '=' is resolved now (see
+           primary()), and the resolver is muted while the dropped value is parsed."""
+        while isinstance(expr, (Binary, Logical, Unary)):
+            expr = expr.right
+        if isinstance(expr, Variable):
+            self.resolver.resolve_expression(expr)
+        self.resolver.muted += 1
 
-        return expr
-    
-    def unary(self):
-        """ unary          → ( "!" | "-" ) unary | call ; """
-        if self.match(["BANG", "MINUS"]):
-            operator = self.previous_token()  # '!' or '-'
-            right = self.unary()
-            return Unary(operator, right)
-        return self.call()
-    
-    def call(self):
-        """ call           → primary ( "(" arguments? ")" | "." IDENTIFIER )* ; """
-        expr = self.primary()
-        while True:
-            if expr and self.match("LEFT_PAREN"):
-                expr = self.finish_call(expr)
-            elif expr and self.match("DOT"):
-                currtok = self.previous_token()
-                if not self.match("IDENTIFIER"):
-                    raise self.error(currtok, "Expected property name after '.'.")
-                expr = Get(instance=expr, name=self.previous_token())
-            else:
-                break
-        return expr
-    
     def primary(self):
         """
         primary        → NUMBER | STRING | "true" | "false" | "nil" | "this"
                         | IDENTIFIER | "super" "." IDENTIFIER;
                         | "(" expression ")" ;
         """
-        if self.match("FALSE"):
-            return Literal(False)
-        if self.match("TRUE"):
-            return Literal(True)
-        if self.match("NIL"):
-            return Literal(None)
+        currtok = self.tokens[self.current]
+        kind = currtok.kind
+        if kind is TokenKind.IDENTIFIER:
+            self.current += 1
+            variable = Variable(currtok.lexeme, self.position(currtok))
+            # in resolver mode, resolve the variable read, unless it's the target of an assignment (see assignment_target())
+            if self.resolver is not None and self.tokens[self.current].kind is not TokenKind.EQUAL:
+                self.resolver.resolve_expression(variable)
+            return variable
         
-        if self.match(["NUMBER", "STRING"]):
-            return Literal(self.previous_token().literal)
+        if kind is TokenKind.NUMBER or kind is TokenKind.STRING:
+            self.current += 1
+            return Literal(currtok.literal)
+        
+        if kind in KEYWORD_LITERALS:
+            self.current += 1
+            return Literal(KEYWORD_LITERALS[kind])
         
-        if self.match("LEFT_PAREN"):
-            currtok = self.previous_token()  # the '(' token
+        if kind == TokenKind.LEFT_PAREN:
+            self.current += 1
             content = self.expression()  # "recursively" parse the content of the parentheses
-            if not self.match("RIGHT_PAREN"):
+            if not self.match(TokenKind.RIGHT_PAREN):
                 raise self.error(currtok, "Expected ')' after expression.")
             return Grouping(content)
         
-        if self.match("THIS"):
-            return This(self.previous_token())
-        
-        if self.match("IDENTIFIER"):
-            return Variable(self.previous_token())
+        if kind is TokenKind.THIS:
+            self.current += 1
+            this = This(self.position(currtok))
+            if self.resolver is not None:
+                self.resolver.resolve_expression(this)
+            return this
         
-        if self.match("SUPER"):
-            currtok = self.previous_token()  # the "SUPER" token
-            if not self.match("DOT"):
+        if kind is TokenKind.SUPER:
+            self.current += 1
+            if not self.match(TokenKind.DOT):
                 raise self.error(currtok, "Expected '.' after 'super'.")
-            if not self.match("IDENTIFIER"):
+            if not self.match(TokenKind.IDENTIFIER):
                 raise self.error(currtok, "Expected superclass method name.")
             method = self.previous_token()
-            return Super(currtok, method)
+            expr = Super(method.lexeme, self.position(currtok), self.position(method))
+            if self.resolver is not None:
+                self.resolver.resolve_expression(expr)
+            return expr
         
         # Nothing matched
-        raise self.error(self.peek(), "Expected expression.")
+        raise self.error(currtok, "Expected expression.")
 
     # ## UTILITIES ##
 
@@ -509,39 +733,25 @@ class Parser:
             self.current += 1
     
     def is_at_end(self):
-        return self.peek().toktype == "EOF"
+        return self.peek().kind == TokenKind.EOF
     
-    def match(self, toktypes: str | list[str]):
+    def match(self, *kinds: TokenKind):
         """Beware: if match() returns True, it increments self.current !"""
-        if isinstance(toktypes, str):
-            toktypes = [toktypes]
-        if not self.is_at_end() and self.peek().toktype in toktypes:
-            self.advance()
+        kind = self.peek().kind
+        if kind in kinds and kind != TokenKind.EOF:
+            self.current += 1
             return True
         return False
     
-    def finish_call(self, callee: NodeExpr):
-        """Prepare the AST node representing the call to a function, parsing the arguments.
-            arguments      → expression ( "," expression )* ;
-        """
-        currtok = self.previous_token()  # LEFT_PAREN token
+    def position(self, token: Token) -> int:
+        """Position id of the line of token (see positions.py), shared by the nodes of the top-level statement on that line"""
+        position = self.line_positions.get(token.line)
+        if position is None:
+            position = self.line_positions[token.line] = self.lines.position(token.line)
+        return position
 
-        arguments = []
-        if self.peek().toktype != "RIGHT_PAREN":
-            while True:
-                if len(arguments) >= 255:
-                    Errors.report(currtok.line, "Can't have more than 255 arguments.", " at '('")
-                arguments.append(self.expression())
-                if not self.match("COMMA"):
-                    break
-        
-        if not self.match("RIGHT_PAREN"):
-            raise self.error(currtok, "Expected ')' after arguments.")
-        
-        return Call(callee, self.previous_token(), tuple(arguments))
-    
     def error(self, token, message):
-        if token.toktype == "EOF":
+        if token.kind == TokenKind.EOF:
             return ParserError((token.line, message, " at end"))
         else:
             return ParserError((token.line, message, f" at '{token.lexeme}'"))
@@ -553,7 +763,7 @@ class Parser:
            after the error..."""
         while not self.is_at_end():
             self.advance()
-            if self.peek().toktype == "SEMICOLON":
+            if self.peek().kind == TokenKind.SEMICOLON:
                 self.advance()
                 return
             elif self.peek().lexeme in STATEMENTS:
@@ -561,4 +771,60 @@ class Parser:
 
 
 class ParserError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+def parse_stream(tokens: Iterator[Token], lenient: bool = False, on_error=None, lazy: bool = False,
+                 lines: LineTable | None = None) -> Iterator[NodeStmt | None]:
+    """Parse the top-level declarations of a stream of tokens (see scanning.iter_tokens()), yielding each one
+       as soon as it is complete and forgetting its tokens: same declarations and errors as Parser.parse().
+       The parser works on a window of the tokens that ends with a stand-in EOF until the real one is read.
+       As it never looks past the token at its current position, a declaration parsed without reaching
+       the stand-in is parsed just as with the whole program ; otherwise it is parsed again with more tokens
+       (the positions of the first attempt are dropped from the line table)."""
+    report = on_error or Errors.report
+    window: list[Token] = []
+    errors: list[tuple] = []  # errors of the current declaration, reported once it's known to be complete
+    parser = Parser(window, lenient, on_error=lambda *err: errors.append(err), lazy=lazy, lines=lines)
+    lookahead = STREAM_LOOKAHEAD
+    complete = False  # whether the real EOF is in the window
+
+    def read_ahead():
+        nonlocal complete
+        if window:
+            window.pop()  # the stand-in
+        kept = len(window)
+        window.extend(islice(tokens, lookahead))
+        complete = len(window) == kept or window[-1].kind == TokenKind.EOF  # (the stand-in ends a stream without EOF)
+        if not (window and window[-1].kind == TokenKind.EOF):
+            window.append(Token(TokenKind.EOF, None, None, window[-1].line if window else 1))
+
+    read_ahead()
+    while True:  # at least one declaration: an empty program is an error, as with Parser.parse()
+        errors.clear()
+        parser.current = 0
+        first = len(parser.lines)
+        try:
+            statement, failure = parser.top_declaration(), None
+        except ParserError as pex:
+            statement, failure = None, pex
+        if not complete and parser.current == len(window) - 1:  # the stand-in was reached
+            parser.lines.truncate(first)
+            read_ahead()
+            lookahead *= 2
+            continue
+
+        for err in errors:
+            report(*err)
+        if failure is not None:
+            report(*failure.args[0])
+            return
+        del window[:parser.current]
+        lookahead = STREAM_LOOKAHEAD
+        yield statement
+
+        parser.current = 0
+        if not complete and len(window) <= 1:
+            read_ahead()
+        if parser.is_at_end():
+            return
@@ -0,0 +1,73 @@
+"""
+Source positions of the syntax nodes: instead of whole tokens, the nodes keep small position ids, indexes in a table
+of source lines (a compact array, 4 bytes per position) ; only the lines are reported by the errors.
+Each program has a table of its own, given by the Parser to its functions (Function.lines), so that an error raised
+in a function declared by another program (a previous line of the REPL) is still reported at its line (see
+LoxRuntimeError) ; the table goes along with the statements, and is released with them.
+
+The Parser gives a position to each line of a top-level statement, shared by the nodes of the statement on that line
+(see Parser.position()): a statement moved by an edit keeps its nodes, and only its positions get a new line
+(see incremental.Document). Programs kept aside (see caching.py and arena.py) keep their table along.
+
+    position = lines.position(token.line)
+    ...
+    lines.line(position)  # the line of the token
+"""
+from array import array
+
+from syntax import walk
+
+POSITION_FIELDS = ("position", "method_position", "param_positions")  # fields of the syntax nodes holding position ids
+
+
+class LineTable:
+    def __init__(self, lines: array | None = None):
+        # position id => line ; 0 for "no position" (nodes built by hand)
+        self.lines = lines if lines is not None else array("I", [0])
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def position(self, line: int) -> int:
+        """A new position id on the line"""
+        self.lines.append(line)
+        return len(self.lines) - 1
+
+    def line(self, position: int) -> int:
+        return self.lines[position]
+
+    def shift(self, positions: range, delta: int):
+        """Move the positions by delta lines"""
+        lines = self.lines
+        for position in positions:
+            lines[position] += delta
+
+    def truncate(self, length: int):
+        """Forget the positions from length on (those of nodes that have been dropped)"""
+        del self.lines[length:]
+
+
+def relocate(statements: list, offset: int):
+    """Add offset to the positions of the nodes of the statements (when their lines are moved in the table)"""
+    if not offset:
+        return
+    for node in walk(statements):
+        for name in POSITION_FIELDS:
+            value = getattr(node, name, None)
+            if isinstance(value, tuple):
+                object.__setattr__(node, name, tuple(position + offset for position in value))
+            elif value is not None:
+                object.__setattr__(node, name, value + offset)  # (the expression nodes are frozen dataclasses)
+
+
+def lines(statements: list, table: LineTable) -> list[int]:
+    """The lines of the positions of the nodes of the statements in their table, in the order of walk()"""
+    found = []
+    for node in walk(statements):
+        for name in POSITION_FIELDS:
+            value = getattr(node, name, None)
+            if isinstance(value, tuple):
+                found.extend(table.line(position) for position in value)
+            elif value is not None:
+                found.append(table.line(value))
+    return found
@@ -1,11 +1,18 @@
 
 from collections import deque
 from enum import Enum
-
-from errors import Errors
+from itertools import islice, repeat
+from typing import Iterator
+
+from environment import CELL, REGISTER
+from errors import Errors, LoxStaticError
+from inference import infer_numbers
+from lexemes import FIXED_LEXEMES, TokenKind
+from parsing import Parser
+from positions import LineTable
 from scanning import Token
-from syntax import (AbortLoop, Assign, Binary, Block, Call, Class, Expression, Function, Get, Grouping, If, Literal, Logical, 
-                    NodeExpr, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable, While)
+from syntax import (AbortLoop, Assign, Binary, Block, Call, Class, Expression, Function, Get, Grouping, If, LazyBody, Literal, Logical, 
+                    Node, NodeExpr, NodeStmt, Print, Return, Set, Super, This, Unary, Var, Variable, While)
 
 
 class FlowType(Enum):
@@ -21,218 +28,487 @@ class ClassType(Enum):
     SUBCLASS = 1
 
 
+_DONE = object()  # end of the steps of a node, see Resolver._walk()
+
+
+class Local:
+    """A variable declared in a local scope: its register in the call (see Interpreter.registers) or, once found
+       captured by a closure, its slot in the environment of the scope (see environment.Frame) or its Cell"""
+    __slots__ = ("register", "slot", "captured", "defined")
+
+    def __init__(self, register: int) -> None:
+        self.register = register
+        self.slot: int | None = None  # given by Resolver.finish(), if captured in a Frame
+        self.captured = False  # True once referenced from a function nested in the one it is declared in
+        self.defined = False  # False while its initializer is resolved
+
+
+class Scope:
+    """A local scope being resolved: its variables by name, and the node laid out from it (a Block or a Function)"""
+    __slots__ = ("names", "function", "registers", "framed", "outer_frames", "free", "cells", "node")
+
+    def __init__(self, enclosing: 'Scope | None', is_function: bool) -> None:
+        self.names: dict[str, Local] = {}
+        # the scope holding the registers of its variables: that of the function, or the outermost one of a
+        #  top-level statement (run as a call of its own)
+        self.function: Scope = self if is_function or enclosing is None else enclosing.function
+        self.registers = 0  # of the variables of the scopes of self.function, if it's this scope
+        self.framed = False  # True: run in a Frame, even without captured variables (set by Resolver.finish())
+        self.outer_frames = False  # for a function scope: True if it references variables in the Frames around it
+        # for a function scope, in flat closures mode: the index of each of its free variables in its cells, and
+        #  the registers of the enclosing call that hold these cells (see Resolver.finish())
+        self.free: dict[Local, int] = {}
+        self.cells: list[int] = []
+        self.node: Node | None = None
+
+    def copy(self) -> 'Scope':
+        """The scope as it is now, kept with a Frame (see Resolver.defer_function())"""
+        scope = Scope(None, is_function=True)
+        scope.names = dict(self.names)
+        scope.framed = True
+        return scope
+
+
 class Resolver:
     """This resolver does a static semantic analysis pass between parsing and evaluating steps.
        It will pre-evaluate each variable before the actual interpreting, and keep a reference 
        to the distance of the scope where the value of the variable is stored. "Distance" meaning
        the number of environments upwards it is present.
+       Escape analysis: a local variable that is never referenced from a nested function (or method) can't outlive
+       the call it is declared in, so it is kept in a register of the call (a list of values, see Interpreter.registers)
+       and resolved to (REGISTER, register). Only the scopes with captured variables get an environment at run time,
+       a Frame where these variables are given slots in the order of their declarations: the distance of a captured
+       variable counts these frames only.
+       Whether a variable is captured is only known once its scope is resolved (a closure may be declared after
+       the variable is used), so the variables are given their location when the outermost scope ends (see finish()).
+       In flat closures mode, a captured variable is kept in a Cell instead, in its register, resolved to (CELL, register):
+       each function gets the cells of its free variables when it is declared, in the registers after its own
+       variables, and keeps no Frame but those of "this" and "super".
     """
-    def __init__(self, interpreter) -> None:
+    def __init__(self, interpreter, on_error=None, flat: bool = False, lines: LineTable | None = None) -> None:
         self.interpreter = interpreter
-        self.scopes: deque[dict[str, bool]] = deque()  # Stack
+        self.global_slots = interpreter.globals.slots  # of the global variables, in the environment that runs them
+        self.flat = flat  # flat closures mode
+        self.lines = lines if lines is not None else LineTable()  # of the positions of the nodes, to report the errors
+        self.scopes: deque[Scope] = deque()  # Stack
         self.current_flow = FlowType.NONE  # to detect return statements at top level, break outside loops, etc.
         self.current_classtype = ClassType.NONE  # to detect 'this' outside of class methods 
+        # called as on_error(line, message, where) for each semantic error (reported right away by default)
+        self.on_error = on_error or Errors.report
+        self.muted = 0  # while positive, errors are dropped (they're in code that the Parser drops)
+        self.had_errors = False  # no inference of the types once an error is found (see finish())
+        # the variables to locate once their scopes are laid out, as (node, Local, scopes crossed from the node), 
+        #  and the scopes to lay out
+        self.pending: list[tuple[Node, Local, tuple[Scope, ...]]] = []
+        self.ended: list[Scope] = []
 
     def resolve(self, node: NodeStmt) -> None:
         """Perform the semantic analysis and keep the record of the found variables.
            Walk the AST and for each variable found, record its distance from where it is kept in scope/environment."""
+        self._walk(self._statement_steps(node))
+
+    def resolve_statements(self, statements: list[NodeStmt]):
+        for stmt in statements:
+            self.resolve(stmt)
+
+    def resolve_function(self, function: Function, functype: FlowType):
+        self._walk(self._function_steps(function, functype))
+
+    def _walk(self, steps: Iterator):
+        """Run the steps of the analysis of a statement. They are generators that, instead of calling each other
+           recursively for the nested statements and expressions, yield them: the steps for each yielded statement
+           are run here on an explicit stack, so that the nesting depth of the program is only limited by memory."""
+        stack = [steps]
+        while stack:
+            node = next(stack[-1], _DONE)
+            if node is _DONE:
+                stack.pop()
+            elif isinstance(node, NodeStmt):
+                stack.append(self._statement_steps(node))
+            else:
+                self.resolve_expression(node)
+
+    def _statement_steps(self, node: NodeStmt) -> Iterator:
         match node:
             case Block() as block:
-                self._begin_scope()
-                self.resolve_statements(block.statements)
-                self._end_scope()                
+                self.begin_scope()
+                yield from block.statements
+                self.end_scope(block)
 
             case Var() as var_declaration:
-                self._declare(var_declaration.name)
+                local = self.declare(var_declaration.name, var_declaration.position)
                 if var_declaration.initializer:
-                    self.resolve_expression(var_declaration.initializer)
-                self._define(var_declaration.name)
+                    yield var_declaration.initializer
+                self.define(var_declaration.name)
+                self.locate(var_declaration, local)
 
             case Function() as function:
                 # bind and record the function name
-                self._declare(function.name)
-                self._define(function.name)
+                self.locate(function, self.declare(function.name, function.position))
+                self.define(function.name)
                 # bind the function's parameters to the inner function scope
-                self.resolve_function(function, FlowType.FUNCTION)
+                yield from self._function_steps(function, FlowType.FUNCTION)
 
             case Class() as stmt:
-                enclosing_classtype = self.current_classtype
-                self.current_classtype = ClassType.CLASS
-
-                self._declare(stmt.name)
-                self._define(stmt.name)
-                
-                if stmt.superclass:
-                    if stmt.name.lexeme == stmt.superclass.name.lexeme:
-                        self._error(stmt.superclass.name, "A class can't inherit from itself.")
-                    self.current_classtype = ClassType.SUBCLASS
-                    self.resolve_expression(stmt.superclass)
-                    
-                    self._begin_scope()  # for "super"
-                    self._innerscope["super"] = True
-
-                self._begin_scope()  # for "this" and the methods
-                self._innerscope["this"] = True
+                self.locate(stmt, self.declare(stmt.name, stmt.position))
+                self.define(stmt.name)
+                enclosing_classtype = self.begin_class(stmt.name, stmt.superclass)
                 for method in stmt.methods:
-                    if method.name.lexeme == "init":
-                        declaration = FlowType.INITIALIZER
-                    else:
-                        declaration = FlowType.METHOD
-                    self.resolve_function(method, declaration)
-                self._end_scope()  # for "this" and the methods
-                
-                if stmt.superclass:
-                    self._end_scope()  # for "super"
-
-                self.current_classtype = enclosing_classtype
+                    yield from self._function_steps(method, self.function_type(method.name, "method"))
+                self.end_class(stmt.superclass, enclosing_classtype)
 
             case Expression() as stmt:
-                self.resolve_expression(stmt.expr)
+                yield stmt.expr
 
             case If() as stmt:
                 """This is a sematic pass, so we resolve both branches then/else if they exists. We need to resolve all the code."""
-                self.resolve_expression(stmt.condition)
-                self.resolve(stmt.then_stmt)
+                yield stmt.condition
+                yield stmt.then_stmt
                 if stmt.else_stmt:
-                    self.resolve(stmt.else_stmt)
+                    yield stmt.else_stmt
 
             case Print() as stmt:
-                self.resolve_expression(stmt.expr)
+                yield stmt.expr
 
             case Return() as stmt:
-                if self.current_flow == FlowType.NONE:
-                    self._error(stmt.token, "Can't use 'return' in top-level code.")
+                self.check_return(stmt.position, stmt.value is not None)
                 if stmt.value:
-                    if self.current_flow == FlowType.INITIALIZER:
-                        self._error(stmt.token, "Can't return a value from an initializer.")
-                    self.resolve_expression(stmt.value)
+                    yield stmt.value
 
             case While() as stmt:
                 """This is a semantic pass, so we don't loop. We resolve each part once and only once."""
-                enclosing_flow = self.current_flow
-                self.current_flow = FlowType.LOOP
-                self.resolve_expression(stmt.condition)
+                enclosing_flow = self.begin_loop()
+                yield stmt.condition
                 if stmt.increment:
-                    self.resolve_expression(stmt.increment)
-                self.resolve(stmt.body)
-                self.current_flow = enclosing_flow
+                    yield stmt.increment
+                yield stmt.body
+                self.end_loop(enclosing_flow)
 
             case AbortLoop() as stmt:
-                if self.current_flow != FlowType.LOOP:
-                    self._error(stmt.token, f"Can't use '{stmt.token.lexeme}' outside of loop.")
+                self.check_abort_loop(stmt.keyword, stmt.position)
 
             case _:
                 raise NotImplementedError(node)
             
-    def resolve_statements(self, statements: list[NodeStmt]):
-        for stmt in statements:
-            self.resolve(stmt)
-
     def resolve_expression(self, node: NodeExpr):
-        match node:
-            case Variable() as variable:  # reading a variable
-                if self._innerscope.get(variable.name.lexeme) is False:
-                    self._error(variable.name, "Can't read local variable in its own initializer.")
-                self.resolve_local(variable, variable.name)
-
-            case Assign() as assign:  # setting the value of a variable
-                self.resolve_expression(assign.value)
-                self.resolve_local(assign, assign.name)
-
-            case Binary() as binary:
-                self.resolve_expression(binary.left)
-                self.resolve_expression(binary.right)
-
-            case Call() as call:
-                 # the thing being called is an expression (that shoud evaluate to a function) so we need to resolve it
-                 self.resolve_expression(call.callee)
-                 for arg in call.arguments:
-                     self.resolve_expression(arg)
-
-            case Get() as get:
-                self.resolve_expression(get.instance)
-
-            case Set() as expr:
-                self.resolve_expression(expr.instance)
-                self.resolve_expression(expr.value)
-                
-            case Super() as expr:
-                if self.current_classtype == ClassType.NONE:
-                    self._error(expr.token, "Can't use 'super' outside of a class.")
-                elif self.current_classtype == ClassType.CLASS:
-                    self._error(expr.token, "Can't use 'super' in a class with no superclass.")
-                self.resolve_local(expr, expr.token)
-
-            case This() as this:
-                if self.current_classtype == ClassType.NONE:
-                    self._error(this.token, "Can't use 'this' outside of a class.")
-                self.resolve_local(this, this.token)
-
-            case Grouping() as grouping:
-                self.resolve_expression(grouping.expr)
-
-            case Literal() as literal:
-                pass  # no variables or subexpression inside literals
-
-            case Logical() as logical:
-                """Semantic pass, so no short-circuitry, as we need to resolve each operand once."""
-                self.resolve_expression(logical.left)
-                self.resolve_expression(logical.right)
-
-            case Unary() as unary:
-                self.resolve_expression(unary.right)
-
-            case _:
-                raise NotImplementedError(node)
+        """Expressions don't change the scopes: their tree is simply walked with an explicit stack of the
+           expressions left to resolve, each one before its sub-expressions (pushed in reverse order so that
+           they are resolved, and errors reported, from left to right)."""
+        pending = [node]
+        while pending:
+            match pending.pop():
+                case Variable() as variable:  # reading a variable
+                    local = self._innerscope.get(variable.name)
+                    if local is not None and not local.defined:
+                        self._error(variable.name, variable.position, "Can't read local variable in its own initializer.")
+                    self.resolve_local(variable, variable.name)
+
+                case Assign() as assign:  # setting the value of a variable
+                    self.resolve_local(assign, assign.name)
+                    pending.append(assign.value)
+
+                case Binary() as binary:
+                    pending.append(binary.right)
+                    pending.append(binary.left)
+
+                case Call() as call:
+                    # the thing being called is an expression (that shoud evaluate to a function) so we need to resolve it
+                    pending.extend(reversed(call.arguments))
+                    pending.append(call.callee)
+
+                case Get() as get:
+                    pending.append(get.instance)
+
+                case Set() as expr:
+                    pending.append(expr.value)
+                    pending.append(expr.instance)
+                    
+                case Super() as expr:
+                    if self.current_classtype == ClassType.NONE:
+                        self._error("super", expr.position, "Can't use 'super' outside of a class.")
+                    elif self.current_classtype == ClassType.CLASS:
+                        self._error("super", expr.position, "Can't use 'super' in a class with no superclass.")
+                    self.resolve_local(expr, "super")
+
+                case This() as this:
+                    if self.current_classtype == ClassType.NONE:
+                        self._error("this", this.position, "Can't use 'this' outside of a class.")
+                    self.resolve_local(this, "this")
+
+                case Grouping() as grouping:
+                    pending.append(grouping.expr)
+
+                case Literal() as literal:
+                    pass  # no variables or subexpression inside literals
+
+                case Logical() as logical:
+                    """Semantic pass, so no short-circuitry, as we need to resolve each operand once."""
+                    pending.append(logical.right)
+                    pending.append(logical.left)
+
+                case Unary() as unary:
+                    pending.append(unary.right)
+
+                case node:
+                    raise NotImplementedError(node)
             
-    def resolve_local(self, expr: NodeExpr, name: Token):
-        for distance, scope in enumerate(reversed(self.scopes)):  # reverse walk the scopes, innermost to outermost
-            if name.lexeme in scope:
-                # Number of scopes between the current innermost scope and the one where the variable was found
-                #  for example, if the variable was found in the current scope, distance == 1 ; if it's the
-                #  immediately enclosing scope, distance == 1 ; etc.
-                # If the variable is unresolved (ie. we never reach this 'if' block), we can assume it's global
-                #  and thus not tracked in the resolver.
-                self.interpreter.resolve(expr, distance)
+    def resolve_local(self, expr: NodeExpr, name: str):
+        scopes = self.scopes
+        for index in range(len(scopes) - 1, -1, -1):  # reverse walk the scopes, innermost to outermost
+            scope = scopes[index]
+            local = scope.names.get(name)
+            if local is not None:
+                # The scopes between the current innermost scope and the one where the variable was found: its
+                #  distance is the number of those with a Frame, known once they're laid out (see finish()).
+                if scopes[-1].function is not scope.function:  # referenced from a closure
+                    local.captured = True
+                self.pending.append((expr, local, tuple(islice(scopes, index + 1, None))))
                 return
-
-    def resolve_function(self, function: Function, functype: FlowType):
+        # If the variable is unresolved (ie. we never reach the 'if' block above), we can assume it's global: it is
+        #  given the slot of its name in the global environment (defined or not, as the error is found at run time)
+        self.interpreter.resolve(expr, None, self.global_slots.slot(name))
+
+    def _function_steps(self, function: Function, functype: FlowType) -> Iterator:
+        if isinstance(function.body, LazyBody):  # resolved from this state when first called, see resolve_lazy_body()
+            self.defer_function(function, functype)
+            return
+        enclosing_flow = self.begin_function(function.params, function.param_positions, functype)
+        yield from function.body
+        self.end_function(enclosing_flow, function)
+
+    # The steps of the analysis shared with the fused resolution, where the Parser calls them
+    #  as it builds the nodes (see Parser resolver mode and parse_resolved())
+
+    def begin_class(self, name: str, superclass: Variable | None) -> ClassType:
+        """Enter the body of a class, its name declared: returns the enclosing class type, to give back to end_class()
+           ("super" and "this" are always kept in a Frame, see LoxUserFunction.bind())"""
+        enclosing_classtype = self.current_classtype
+        self.current_classtype = ClassType.CLASS
+
+        if superclass:
+            if name == superclass.name:
+                self._error(superclass.name, superclass.position, "A class can't inherit from itself.")
+            self.current_classtype = ClassType.SUBCLASS
+            self.resolve_expression(superclass)
+
+            self.begin_scope()  # for "super"
+            self.scopes[-1].framed = True
+            self.declare("super", 0).captured = True
+            self.define("super")
+
+        self.begin_scope()  # for "this" and the methods (in slot 0, see LoxUserFunction.bind())
+        self.scopes[-1].framed = True
+        self.declare("this", 0).captured = True
+        self.define("this")
+        return enclosing_classtype
+
+    def end_class(self, superclass: Variable | None, enclosing_classtype: ClassType):
+        self.end_scope()  # for "this" and the methods
+        if superclass:
+            self.end_scope()  # for "super"
+        self.current_classtype = enclosing_classtype
+
+    def function_type(self, name: str, kind: str) -> FlowType:
+        """Flow type of the body of a "function" or "method" (as the kinds named by the Parser)"""
+        if kind == "function":
+            return FlowType.FUNCTION
+        return FlowType.INITIALIZER if name == "init" else FlowType.METHOD
+
+    def begin_function(self, params: list[str], positions: tuple[int, ...], functype: FlowType) -> FlowType:
+        """Enter the body of a function, its parameters bound: returns the enclosing flow, to give back to end_function()"""
         enclosing_flow = self.current_flow
         self.current_flow = functype
-        self._begin_scope()
-        for param in function.params:
-            self._declare(param)
-            self._define(param)
-        self.resolve_statements(function.body)
-        self._end_scope()
+        self.begin_scope(is_function=True)
+        for param, position in zip(params, positions or repeat(0)):
+            self.declare(param, position)
+            self.define(param)
+        return enclosing_flow
+
+    def end_function(self, enclosing_flow: FlowType, function: Function):
+        """Leave the body of the function"""
         self.current_flow = enclosing_flow
-    
-    def _begin_scope(self):
-        self.scopes.append(dict())
-
-    def _end_scope(self):
+        self.end_scope(function)
+
+    def defer_function(self, function: Function, functype: FlowType):
+        """Keep the state of the analysis in the lazy body of the function, to resolve it from there when first
+           called. Which variables it captures isn't known yet: all those it may reference are kept in Frames.
+           Its parameters are parsed already: they're checked right away."""
+        self.begin_scope(is_function=True)
+        for param, position in zip(function.params, function.param_positions or repeat(0)):
+            self.declare(param, position)
         self.scopes.pop()
+        body = function.body
+        for scope in self.scopes:
+            scope.framed = True
+            scope.function.outer_frames = True  # (the references of the lazy body aren't known yet)
+            for local in scope.names.values():
+                local.captured = True
+        body.scopes = [scope.copy() for scope in self.scopes]
+        body.flat = self.flat
+        body.classtype = self.current_classtype
+        body.functype = functype
+
+    def begin_loop(self) -> FlowType:
+        """Enter a loop: returns the enclosing flow, to give back to end_loop()"""
+        enclosing_flow = self.current_flow
+        self.current_flow = FlowType.LOOP
+        return enclosing_flow
 
-    def _declare(self, name: Token):
-        if name.lexeme:
-            if name.lexeme in self._innerscope:
-                self._error(name, "A variable with the same name is already present in the same scope.")
-
-            self._innerscope[name.lexeme] = False  # False mean "resolving not finished yet"
+    def end_loop(self, enclosing_flow: FlowType):
+        self.current_flow = enclosing_flow
 
-    def _define(self, name: Token):
-        if name.lexeme:
-            self._innerscope[name.lexeme] = True  # variable is ready
+    def check_return(self, position: int, has_value: bool):
+        if self.current_flow == FlowType.NONE:
+            self._error("return", position, "Can't use 'return' in top-level code.")
+        if has_value and self.current_flow == FlowType.INITIALIZER:
+            self._error("return", position, "Can't return a value from an initializer.")
+
+    def check_abort_loop(self, keyword: TokenKind, position: int):
+        if self.current_flow != FlowType.LOOP:
+            lexeme = FIXED_LEXEMES[keyword]
+            self._error(lexeme, position, f"Can't use '{lexeme}' outside of loop.")
+
+    def state(self) -> tuple:
+        """Snapshot of the analysis state, to restore() it when the Parser recovers from a syntax error
+           (the nodes being parsed are dropped, in the middle of their steps)"""
+        return len(self.scopes), self.current_flow, self.current_classtype, self.muted, len(self.pending), len(self.ended)
+
+    def restore(self, state: tuple):
+        depth, self.current_flow, self.current_classtype, self.muted, pending, ended = state
+        while len(self.scopes) > depth:
+            self.scopes.pop()
+        del self.pending[pending:], self.ended[ended:]  # (of the dropped nodes)
+
+    def begin_scope(self, is_function: bool = False):
+        self.scopes.append(Scope(self.scopes[-1] if self.scopes else None, is_function))
+
+    def end_scope(self, node: Block | Function | None = None):
+        """Leave a scope, laid out for the node (none for the scopes of a class): once the outermost scope ends,
+           the variables are located (see finish())"""
+        scope = self.scopes.pop()
+        scope.node = node
+        self.ended.append(scope)
+        if not self.scopes:
+            self.finish()
+
+    def declare(self, name: str, position: int) -> Local | None:
+        """Declare the variable in the innermost scope: returns it (None for a global variable)"""
+        if not self.scopes:
+            return None
+        scope = self.scopes[-1]
+        local = scope.names.get(name)
+        if local is None:
+            function = scope.function
+            local = scope.names[name] = Local(function.registers)
+            function.registers += 1
+        else:  # declared again: the same variable (as a global variable is declared again in place)
+            self._error(name, position, "A variable with the same name is already present in the same scope.")
+            local.defined = False  # "resolving not finished yet"
+        return local
+
+    def define(self, name: str):
+        if self.scopes:
+            self.scopes[-1].names[name].defined = True  # variable is ready
+
+    def locate(self, declaration: Var | Function | Class, local: Local | None):
+        """Record the declaration of the local variable, to give it its location (right away for a global variable)"""
+        if local is None:
+            self.interpreter.resolve(declaration, None, self.global_slots.slot(declaration.name))
+        else:
+            self.pending.append((declaration, local, ()))
+
+    def finish(self):
+        """Lay out the scopes that ended, and locate their variables: a captured variable in a slot of the Frame of its
+           scope, at the distance of the Frames between (or in its Cell, in flat closures mode), the others in their
+           registers"""
+        for scope in self.ended:
+            slots = 0
+            if scope.framed or not self.flat:
+                for local in scope.names.values():  # in the order of their declarations (the parameters first)
+                    if local.captured:
+                        local.slot = slots
+                        slots += 1
+            scope.framed = scope.framed or slots > 0
+            match scope.node:
+                case Block() as block:
+                    block.slots = slots if scope.framed else None
+                    # (none to hold if nothing is declared in the block of the top-level statement)
+                    block.registers = scope.registers if scope.function is scope and scope.registers else None
+                case Function() as function:
+                    function.slots = slots if scope.framed else None
+                    function.registers = scope.registers
+                    params = islice(scope.names.values(), len(function.params))
+                    function.captured = tuple(local.register for local in params if local.captured)
+        for node, local, crossed in self.pending:
+            if not local.captured:
+                self.interpreter.resolve(node, REGISTER, local.register)
+            elif local.slot is not None:
+                for scope in crossed:
+                    if scope.function is scope:
+                        scope.outer_frames = True
+                self.interpreter.resolve(node, sum(scope.framed for scope in crossed), local.slot)
+            else:
+                self.interpreter.resolve(node, CELL, self._cell(local, crossed))
+        for scope in self.ended:
+            if isinstance(scope.node, Function):
+                scope.node.free = tuple(scope.cells)
+                scope.node.outer_frames = scope.outer_frames
+            if scope.function is scope and scope.node is not None and not self.had_errors:
+                infer_numbers(scope.node)  # its variables located: their types are inferred (if it may be run as is)
+        self.pending.clear()
+        self.ended.clear()
+
+    def _cell(self, local: Local, crossed: tuple[Scope, ...]) -> int:
+        """The register of the cell of the variable in the innermost of the scopes crossed from a reference to it:
+           each function between gets it as a free variable, from the call around it"""
+        register = local.register
+        for scope in crossed:
+            if scope.function is scope:
+                index = scope.free.get(local)
+                if index is None:
+                    index = scope.free[local] = len(scope.free)
+                    scope.cells.append(register)
+                register = scope.registers + index
+        return register
 
     @property
     def _innerscope(self) -> dict:
         if len(self.scopes) > 0:
-            return self.scopes[-1]
+            return self.scopes[-1].names
         return {}
     
-    def _error(self, token: Token, message: str):
-        if token.toktype == "EOF":
-            Errors.report(token.line, message, "at end")
-        else:
-            Errors.report(token.line, message, f" at '{token.lexeme}'")
-        
\ No newline at end of file
+    def _error(self, lexeme: str, position: int, message: str):
+        """Report an error at the name or keyword found at position"""
+        if not self.muted:
+            self.had_errors = True
+            self.on_error(self.lines.line(position), message, f" at '{lexeme}'")
+
+
+def parse_resolved(tokens: list[Token], interpreter, lenient: bool = False, lazy: bool = False,
+                   flat: bool = False, lines: LineTable | None = None) -> list[NodeStmt]:
+    """Parse the program with its variables resolved along, the Parser calling the steps of a Resolver as it builds
+       the nodes, instead of a separate pass over the statements: same resolutions and errors. As with a pass after
+       the parsing, the semantic errors are only reported if there was no syntax error."""
+    lines = lines if lines is not None else LineTable()
+    semantic_errors: list[tuple] = []
+    resolver = Resolver(interpreter, on_error=lambda *err: semantic_errors.append(err), flat=flat, lines=lines)
+    statements = Parser(tokens, lenient, lazy=lazy, resolver=resolver, lines=lines).parse()
+    if not Errors.had_errors:
+        for err in semantic_errors:
+            Errors.report(*err)
+    return statements
+
+
+def resolve_lazy_body(function: Function, interpreter) -> None:
+    """Parse and resolve the lazy body of a function (see Parser lazy mode) when it's first called, as it would
+       have been with the rest of the program. Its errors are only found now: LoxStaticError is raised once reported."""
+    lazy = function.body
+    function.body = Parser(lazy.tokens, lazy.lenient, lazy=True, lines=function.lines).parse_lazy_body()
+    if not Errors.had_errors:
+        resolver = Resolver(interpreter, flat=lazy.flat, lines=function.lines)
+        resolver.scopes = deque(lazy.scopes)
+        resolver.current_classtype = lazy.classtype
+        resolver.resolve_function(function, lazy.functype)
+        resolver.finish()
+    if Errors.had_errors:
+        raise LoxStaticError(function.name)
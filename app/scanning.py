@@ -1,100 +1,275 @@
+from array import array
+import codecs
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-import string
-from typing import Any
+import os
+import re
+import sys
+from typing import Any, Iterator
 
-from lexemes import LEXEMES_DESC_LENGTH, RESERVED_WORDS
+from lexemes import DIGITS, IDENTIFIER_CHARS, LEXEMES_BY_FIRST_CHAR, RESERVED_KINDS, TOKEN_NAMES, TokenKind
 
+CHUNK_SIZE = 1 << 16  # characters (or bytes) read at once by iter_tokens()
+PARALLEL_MIN_CHUNK_SIZE = 1 << 18  # tokenize_parallel() doesn't split the source in chunks smaller than this
+PARALLEL_CHUNKS_PER_WORKER = 4  # chunks sent to each worker, so that the parent rebuilds the tokens of the first ones
+                                #  while the workers scan the next ones
 
-@dataclass(frozen=True)
+# string literals (possibly unterminated) and comments: newlines inside a string are not safe chunk boundaries
+_STRINGS_AND_COMMENTS = re.compile(r'"[^"]*(?:"|\Z)|//[^\n]*')
+KINDS = tuple(TokenKind)  # int => kind, to rebuild the tokens sent back by tokenize_parallel() workers
+
+
+@dataclass(frozen=True, slots=True, init=False)
 class Token:
-    toktype: str
+    """Compact token: no instance dict, the kind is a small int and identifier/keyword lexemes are interned,
+       so that millions of tokens stay cheap. Can also be built from the token type name, eg. Token("STAR", "*", None, 1).
+       Frozen, as tokens are hashed as part of the AST nodes: __init__ sets the slots through their descriptors,
+       several times faster than the object.__setattr__() calls of the __init__ generated for a frozen dataclass."""
+    kind: TokenKind
     lexeme: str | None
     literal: Any
     line: int
 
+    def __init__(self, kind: TokenKind | str, lexeme: str | None, literal: Any, line: int):
+        _set_kind(self, TokenKind[kind] if kind.__class__ is str else kind)
+        _set_lexeme(self, lexeme)
+        _set_literal(self, literal)
+        _set_line(self, line)
+
+    @property
+    def toktype(self) -> str:
+        return TOKEN_NAMES[self.kind]
+
     def __repr__(self) -> str:
         """The formatted output for this token"""
         return f"{self.toktype} {self.lexeme if self.lexeme else ''} {self.literal if self.literal is not None else 'null'}"
 
 
-def lookahead_capture(remaining, valid_chars, valid_sep=None):
-    """Capture a whole token one character at a time, until the next character is detected as not valid.
+_set_kind, _set_lexeme, _set_literal, _set_line = (Token.__dict__[name].__set__ for name in ("kind", "lexeme", "literal", "line"))
+
+
+def capture_end(source, start, valid_chars, valid_sep=None) -> int:
+    """Capture a whole token one character at a time from source[start], until the next character is detected as not valid.
     If a valid_sep is given, such a character is valid only if the character after it is also valid
     (example: '12.3' is captured as '12.3' but '12.' is captured as '12' and the dot is excluded from the capture).
+    Works on positions in the original source, without copying it: any indexable sequence will do (str, but also
+    bytes, memoryview or mmap as long as valid_chars and valid_sep hold the same kind of items).
+    Returns the index just after the last captured character."""
+    end = start + 1
+    length = len(source)
+    while end < length:
+        lookahead = source[end]
+        if lookahead in valid_chars:
+            end += 1
+        elif valid_sep is not None and lookahead == valid_sep and end + 1 < length and source[end + 1] in valid_chars:
+            end += 1
+        else:
+            break  # the next character is not valid: we've reached the end of the capture
+    return end
+
+
+def lookahead_capture(remaining, valid_chars, valid_sep=None):
+    """Same as capture_end() but on the remaining part of the source, starting at its first character.
     Returns a tuple (captured string, index of the last captured character)."""
-    next_char = 1
-    while True:
-        try:
-            lookahead = remaining[next_char]
-            if lookahead in valid_chars:
-                next_char += 1
-            elif valid_sep and lookahead == valid_sep and remaining[next_char + 1] in valid_chars:
-                next_char += 1
+    end = capture_end(remaining, 0, valid_chars, valid_sep)
+    return remaining[:end], end - 1
+
+
+def tokenize(source: str, on_error=None) -> tuple[list[Token], list[tuple]]:
+    """Scan the whole source at once and return the list of tokens (ending with EOF) and the list of errors.
+       If on_error is given, it is called as on_error(line, message) as soon as each error is found instead
+       (it may raise to stop the scan), and the returned list of errors is empty."""
+    tokens, errors = [], _ErrorCallback(on_error) if on_error else []
+    scan(source, 0, 1, tokens, errors, final=True)
+    return tokens, [] if on_error else errors
+
+
+class _ErrorCallback(list):
+    """Stands for the list of errors given to scan(), passing each one to a callback instead of keeping it"""
+    def __init__(self, on_error):
+        super().__init__()
+        self.on_error = on_error
+
+    def append(self, error: tuple):
+        self.on_error(*error)
+
+
+def tokenize_parallel(source: str, workers: int | None = None,
+                      min_chunk_size: int = PARALLEL_MIN_CHUNK_SIZE) -> tuple[list[Token], list[tuple]]:
+    """Same result as tokenize(), but the source is split in chunks at newlines outside of string literals,
+       and the chunks are scanned in a pool of worker processes (by default, one per available core).
+       Each chunk is scanned starting from its own line number, so that the tokens and errors of all chunks
+       only have to be concatenated, in order.
+       The tokens of each chunk are rebuilt in this process as soon as it's scanned, while the workers scan the
+       next ones: rebuilding them costs about half as much as scanning them, so that the parallel scan takes
+       at best half the time of tokenize(), with 3 cores or more, and only pays off for sources of several MB."""
+    workers = workers or available_cores()
+    count = min(workers * PARALLEL_CHUNKS_PER_WORKER, len(source) // min_chunk_size)
+    boundaries = safe_boundaries(source, count) if workers > 1 else []
+    if not boundaries:
+        return tokenize(source)
+
+    chunks = []
+    start, line = 0, 1
+    for end in boundaries + [len(source)]:
+        chunks.append((source[start:end], line))
+        line += source.count("\n", start, end)
+        start = end
+
+    tokens, errors = [], []
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        for kinds, lexemes, literals, lines, chunk_errors, line in pool.map(_tokenize_chunk, chunks):
+            line_numbers = array("I")
+            line_numbers.frombytes(lines)
+            tokens.extend(map(Token, map(KINDS.__getitem__, kinds), lexemes, literals, line_numbers))
+            errors.extend(chunk_errors)
+    tokens.append(Token(TokenKind.EOF, None, None, line))  # with the line where the last chunk stopped
+    return tokens, errors
+
+
+def available_cores() -> int:
+    """Number of cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def safe_boundaries(source: str, count: int) -> list[int]:
+    """Return up to count - 1 positions that split the source in chunks of roughly equal size, each position being
+       just after a newline which is not inside a string literal, ie. where the scanner starts in a fresh state."""
+    boundaries = []
+    spans = _STRINGS_AND_COMMENTS.finditer(source)
+    span = next(spans, None)
+    for chunk in range(1, count):
+        position = source.find("\n", max(len(source) * chunk // count, boundaries[-1] if boundaries else 0))
+        while position != -1:
+            while span and span.end() <= position:
+                span = next(spans, None)
+            if span and span.start() < position:  # inside a multi-line string: try after its end
+                position = source.find("\n", span.end())
             else:
-                break  # the next character is not valid: we've reached the end of the capture
-        except IndexError:
-            break  # we've reached the end of source, and thus the capture stops here
-    return remaining[:next_char], next_char - 1
+                break
+        if position == -1:
+            break
+        boundaries.append(position + 1)
+    return boundaries
 
 
-def tokenize(source: str) -> tuple[list[Token], list[tuple]]:
+def _tokenize_chunk(chunk: tuple[str, int]):
+    """Worker side of tokenize_parallel(). The tokens are sent back as parallel arrays, which are much faster
+       to transfer than pickled Token instances. The EOF token is left out, only its line is returned."""
+    source, line = chunk
     tokens, errors = [], []
-    current = 0
+    scan(source, 0, line, tokens, errors, final=True)
+    eof = tokens.pop()
+    return (bytes(tok.kind for tok in tokens), [tok.lexeme for tok in tokens], [tok.literal for tok in tokens],
+            array("I", (tok.line for tok in tokens)).tobytes(), errors, eof.line)
+
+
+def iter_tokens(stream, on_error=None, chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+    """Scan a file object (text or binary) or a mmap chunk by chunk, yielding the tokens as they are found
+       and calling on_error(line, message) for each lexical error.
+       Only the current chunk and the token that straddles its end are kept in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
     line = 1
-    while current < len(source):
-        for lexemes in LEXEMES_DESC_LENGTH:
-            if len(lexemes) == 0:
-                continue
-            lexlength = len(list(lexemes.keys())[0])
-            end = current + lexlength
-
-            # skip lexemes of size N if there is not at least N characters remaining to scan
-            if end > len(source):
-                continue
-            
-            chars = source[current:end]
-            if chars in lexemes:
-                toktype = lexemes[chars]
-                match toktype:
-                    case "COMMENT":  # ignore the rest of the line
-                        if (end := source.find("\n", end) + 1) == 0:
-                            end = len(source)  # if the comment was on the last line, set end so that the 'while' loop stops
-                        line += 1  # don't forget to increment since we passed a newline
-                    case "STRING":  # capture the whole string literal until the closing quotes
-                        if (end := source.find('"', end) + 1) == 0:
-                            errors.append((line, "Unterminated string."))  # no closing quotes
-                            current = len(source)
-                            break  # 'for' loop
-                        chars = source[current:end]
-                        literal = chars.strip('"')
-                        tokens.append(Token(toktype, chars, literal, line))
-                        line += literal.count("\n")  # don't forget to increment line when faced with multi-line strings
-                    case "NUMBER":  # capture the whole number literal, including optional dot (but not at the end)
-                        chars, offset = lookahead_capture(source[current:], valid_chars=string.digits, valid_sep='.')
-                        end += offset
-                        literal = float(chars)
-                        tokens.append(Token(toktype, chars, literal, line))
-                    case "IDENTIFIER":  # capture the identifier (digits are allowed inside an indentifier, after the first char)
-                        chars, offset = lookahead_capture(source[current:], valid_chars=string.ascii_letters +
-                                                                                        string.digits + '_')
-                        end += offset
-                        # Reserved words are detected and their toktype is specific (not IDENTIFIER)
-                        if chars in RESERVED_WORDS:
-                            tokens.append(Token(RESERVED_WORDS[chars], chars, None, line))
-                        else:
-                            tokens.append(Token(toktype, chars, None, line))
-                    case "SPACE":  # ignore
-                        pass
-                    case "NEWLINE":  # ignore but count the line increment
-                        line += 1
-                    case _:  # regular lexeme: record it
-                        tokens.append(Token(toktype, chars, None, line))
-                current = end
-                break  # 'for' loop
-        else:  # 'for' loop ended by finding no matching lexeme
-            errors.append((line, f"Unexpected character: {chars}"))
+    read_size = chunk_size
+    while True:
+        chunk = stream.read(read_size)
+        final = not chunk
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = decoder.decode(chunk, final=final)
+        buffer += chunk
+
+        tokens, errors = [], []
+        current, line = scan(buffer, 0, line, tokens, errors, final=final)
+        if on_error:
+            for err in errors:
+                on_error(*err)
+        yield from tokens
+        if final:
+            return
+
+        # keep the incomplete token at the end of the buffer for the next round ; if it filled the whole buffer
+        #  (a huge string literal or comment), read bigger chunks so that it is not re-scanned too many times
+        read_size = chunk_size if current > 0 else read_size * 2
+        buffer = buffer[current:]
+
+
+def scan(source: str, current: int, line: int, tokens: list[Token], errors: list[tuple], final: bool,
+         positions: list[int] | None = None) -> tuple[int, int]:
+    """Scan the source in a single pass: the character at the current position selects the candidate lexemes
+       in LEXEMES_BY_FIRST_CHAR (longest first), so that each position is examined only once.
+       Found tokens and errors are appended to the given lists.
+       If final is False, the source is only a part of a bigger one, and the scan stops before the first token that
+       may continue past the end of source ; if final is True, the EOF token is appended at the end.
+       If a positions list is given, the position in source of each token is appended to it.
+       Returns the position and line where the scan stopped."""
+    length = len(source)
+    while current < length:
+        char = source[current]
+        candidates = LEXEMES_BY_FIRST_CHAR.get(char)
+        if candidates is None:
+            errors.append((line, f"Unexpected character: {char}"))
             current += 1
-    
-    tokens.append(Token("EOF", None, None, line))
+            continue
 
-    return tokens, errors
+        if not final and current + len(candidates[0][0]) > length:
+            return current, line  # may be the first character of a longer lexeme
+
+        # the one-character lexeme is always the last candidate, so there is always a match
+        for chars, kind in candidates:
+            if source.startswith(chars, current):
+                break
+        end = current + len(chars)
+
+        match kind:
+            case TokenKind.SPACE:  # ignore
+                pass
+            case TokenKind.NEWLINE:  # ignore but count the line increment
+                line += 1
+            case TokenKind.IDENTIFIER:  # capture the identifier (digits are allowed inside an indentifier, after the first char)
+                end = capture_end(source, current, valid_chars=IDENTIFIER_CHARS)
+                if not final and end >= length:
+                    return current, line
+                chars = source[current:end]
+                # Reserved words are detected and their kind is specific (not IDENTIFIER)
+                if reserved := RESERVED_KINDS.get(chars):
+                    tokens.append(Token(*reserved, None, line))
+                else:
+                    tokens.append(Token(kind, sys.intern(chars), None, line))
+            case TokenKind.NUMBER:  # capture the whole number literal, including optional dot (but not at the end)
+                end = capture_end(source, current, valid_chars=DIGITS, valid_sep='.')
+                if not final and end + 1 >= length:
+                    return current, line  # the number may go on, possibly after a dot
+                chars = source[current:end]
+                literal = float(chars)
+                tokens.append(Token(kind, chars, literal, line))
+            case TokenKind.COMMENT:  # ignore the rest of the line
+                if (end := source.find("\n", end) + 1) == 0:
+                    if not final:
+                        return current, line
+                    end = length  # if the comment was on the last line, set end so that the 'while' loop stops
+                line += 1  # don't forget to increment since we passed a newline
+            case TokenKind.STRING:  # capture the whole string literal until the closing quotes
+                if (end := source.find('"', end) + 1) == 0:
+                    if not final:
+                        return current, line
+                    errors.append((line, "Unterminated string."))  # no closing quotes
+                    current = length
+                    break  # 'while' loop: nothing more to scan
+                chars = source[current:end]
+                literal = chars.strip('"')
+                tokens.append(Token(kind, chars, literal, line))
+                line += literal.count("\n")  # don't forget to increment line when faced with multi-line strings
+            case _:  # regular lexeme: record it
+                tokens.append(Token(kind, chars, None, line))
+        if positions is not None and len(positions) < len(tokens):
+            positions.append(current)
+        current = end
+
+    if final:
+        if positions is not None:
+            positions.append(current)
+        tokens.append(Token(TokenKind.EOF, None, None, line))
+    return current, line
@@ -1,345 +1,488 @@
 """
 Nodes and leaves for the Abstract Syntax Tree (AST)
 
-Display the tree by calling repr(root) or print(root)
+Display the tree by calling repr(root) or print(root), or root.print_ast()
+
+Each node only describes its own display, as a list of parts in which its children appear as nodes
+(see _repr_parts() and _ast_lines()) ; the whole tree is then displayed by walking it with an explicit stack,
+so that deeply nested programs don't hit the recursion limit.
+
+Nodes don't keep the tokens they're parsed from: only the names (interned strings), the kinds of the operators,
+and the position ids of the source lines reported by the errors (see positions.py ; 0 for nodes built by hand),
+which don't take part in the comparison of the nodes.
+The nodes also keep their resolution, set once by the semantic pass (see Interpreter.resolve()): the variables
+(Variable, Assign, Super, This) and the local declarations (Var, Function, Class) the location of their variable,
+as the distance to its environment and its slot there, or REGISTER (or CELL) and its register in the call (None for
+global variables) ; the local scopes (Block, Function) the number of slots of their environment (None: they have none)
+and the number of registers of the calls (for the Block of a top-level statement that holds them).
+The arithmetic and comparison nodes (Binary, Unary) whose operands are proven numbers by the static type inference
+(see inference.py) are marked unchecked: they're evaluated without checking their operands.
+The optimizer (see optimizing.py) may give the functions whose body only returns an expression this expression
+(Function.inline), and the calls of such a function known statically its declaration (Call.inlined): these refer to
+nodes elsewhere in the tree, so they're attributes that walk() doesn't follow rather than fields ; and so is the line
+table of the positions of a function (Function.lines, see positions.py).
 """
 
-from dataclasses import dataclass
-from typing import Any, Optional
+from dataclasses import dataclass, field, fields
+from functools import cache
+from typing import Any, Iterator, Optional
 
-# Nodes for Expression statements (frozen in order to be hashable, and thus valid dict keys in Interpreter._locals)
+from lexemes import FIXED_LEXEMES, TokenKind
+
+
+class Node:
+    def __repr__(self) -> str:
+        return _render(self)
 
-class NodeExpr:
-    # Only for type hints
     def print_ast(self, level=0):
-        pass  # override this
+        _print_tree(self, level)
+
+    def _repr_parts(self) -> list:
+        """Parts of the repr, concatenated: strings, and nodes for the repr of the children"""
+        raise NotImplementedError  # override this
+
+    def _ast_lines(self, level: int) -> list[tuple[int, Any]]:
+        """Lines printed by print_ast(), as (level, text) or (level, child node to print at this level)"""
+        raise NotImplementedError  # override this
 
 
-@dataclass(frozen=True)
+# Nodes for Expression statements (frozen: they must not change once parsed, but for their resolution)
+
+class NodeExpr(Node):
+    # Only for type hints
+    pass
+
+
+@dataclass(frozen=True, repr=False)
 class Binary(NodeExpr):
     left: NodeExpr  # expr
-    operator: 'Token'  # type: ignore
+    operator: TokenKind
     right: NodeExpr  # expr
+    position: int = field(default=0, compare=False)  # of the operator
+    unchecked: bool = field(default=False, compare=False)  # True: its operands are proven numbers
 
-    def __repr__(self) -> str:
-        return f"({self.operator.lexeme} {self.left} {self.right})"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Binary: {self.operator.lexeme}")
-        self.left.print_ast(level + 1)
-        self.right.print_ast(level + 1)
+    def _repr_parts(self) -> list:
+        return ["(", FIXED_LEXEMES[self.operator], " ", self.left, " ", self.right, ")"]
 
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Binary: {FIXED_LEXEMES[self.operator]}"), (level + 1, self.left), (level + 1, self.right)]
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class Unary(NodeExpr):
-    operator: 'Token'  # type: ignore
+    operator: TokenKind
     right: NodeExpr  # expr
+    position: int = field(default=0, compare=False)  # of the operator
+    unchecked: bool = field(default=False, compare=False)  # True: its operand is a proven number
 
-    def __repr__(self) -> str:
-        return f"({self.operator.lexeme} {self.right})"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Unary: {self.operator.lexeme}")
-        self.right.print_ast(level + 1)
+    def _repr_parts(self) -> list:
+        return ["(", FIXED_LEXEMES[self.operator], " ", self.right, ")"]
 
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Unary: {FIXED_LEXEMES[self.operator]}"), (level + 1, self.right)]
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class Literal(NodeExpr):
     value: Any
 
-    def __repr__(self) -> str:
+    def _repr_parts(self) -> list:
         if self.value is None:
-            return "nil"
-        return str(self.value).lower()
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Literal: {self.value}")
-    
+            return ["nil"]
+        return [str(self.value).lower()]
 
-@dataclass(frozen=True)
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Literal: {self.value}")]
+
+
+@dataclass(frozen=True, repr=False)
 class Logical(NodeExpr):
     left: NodeExpr
-    operator: 'Token'  # type: ignore
+    operator: TokenKind
     right: NodeExpr
+    position: int = field(default=0, compare=False)  # of the operator
 
-    def __repr__(self) -> str:
-        return f"{self.left} {self.operator.lexeme} {self.right}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Logical: {self.operator.lexeme}")
-        self.left.print_ast(level + 1)
-        self.right.print_ast(level + 1)
-    
+    def _repr_parts(self) -> list:
+        return [self.left, " ", FIXED_LEXEMES[self.operator], " ", self.right]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Logical: {FIXED_LEXEMES[self.operator]}"), (level + 1, self.left), (level + 1, self.right)]
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class Grouping(NodeExpr):
     expr: NodeExpr
 
-    def __repr__(self) -> str:
-        return f"(group {self.expr})"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Grouping:")
-        self.expr.print_ast(level + 1)
-    
+    def _repr_parts(self) -> list:
+        return ["(group ", self.expr, ")"]
 
-@dataclass(frozen=True)
+    def _ast_lines(self, level):
+        return [(level, "[Expr] Grouping:"), (level + 1, self.expr)]
+
+
+@dataclass(frozen=True, repr=False)
 class Variable(NodeExpr):
     """Expression for getting a variable value"""
-    name: 'Token' # type: ignore
+    name: str
+    position: int = field(default=0, compare=False)
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return self.name.lexeme
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Variable (getting): {self.name.lexeme}")
+    def _repr_parts(self) -> list:
+        return [self.name]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Variable (getting): {self.name}")]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, repr=False)
 class Assign(NodeExpr):
-    name: 'Token' # type: ignore
+    name: str
     value: NodeExpr
+    position: int = field(default=0, compare=False)  # of the name
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return f"{self.name.lexeme} = {self.value}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Assign (variable): {self.name.lexeme}")
-        self.value.print_ast(level + 1)
-    
+    def _repr_parts(self) -> list:
+        return [self.name, " = ", self.value]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Assign (variable): {self.name}"), (level + 1, self.value)]
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class Call(NodeExpr):
     callee: NodeExpr  # the left expression that evaluates to the function to call
-    paren: 'Token'  # type: ignore  # the token for the opening parenthese, for error reporting
     arguments: tuple[NodeExpr]
+    position: int = field(default=0, compare=False)  # of the closing parenthese, for error reporting
+    inlined = None  # the declaration of the function called, if known statically (see optimizing.py)
 
-    def __repr__(self) -> str:
-        return f"{self.callee}({', '.join(repr(arg) for arg in self.arguments)})"
-    
-    def print_ast(self, level=0):
-        _print_level(level, "[Expr] Call...")
-        self.callee.print_ast(level + 1)
-        _print_level(level, f"...with {len(self.arguments)} arguments{':' if self.arguments else ''}")
+    def _repr_parts(self) -> list:
+        return [self.callee, "(", *_joined(self.arguments, ", "), ")"]
+
+    def _ast_lines(self, level):
+        lines = [(level, "[Expr] Call..."), (level + 1, self.callee),
+                 (level, f"...with {len(self.arguments)} arguments{':' if self.arguments else ''}")]
         for idx_arg, arg in enumerate(self.arguments):
-            arg.print_ast(level + 1)
+            lines.append((level + 1, arg))
             if idx_arg < len(self.arguments) - 1:
-                _print_level(level + 1, ", -----")
-    
+                lines.append((level + 1, ", -----"))
+        return lines
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, repr=False)
 class Get(NodeExpr):
     """ Fetching a value from an instance with instance.property is the 'Get' expression """
     instance: NodeExpr
-    name: 'Token'  # type: ignore  # the property
+    name: str  # the property
+    position: int = field(default=0, compare=False)  # of the property name
+
+    def _repr_parts(self) -> list:
+        return [self.instance, ".", self.name]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Get (property) {self.name} from:"), (level + 1, self.instance)]
 
-    def __repr__(self) -> str:
-        return f"{repr(self.instance)}.{self.name.lexeme}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Get (property) {self.name.lexeme} from:")
-        self.instance.print_ast(level + 1)
-    
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, repr=False)
 class Set(NodeExpr):
     """ Setting an instance property with instance.property = <value> is the 'Set' expression """
     instance: NodeExpr
-    name: 'Token'  # type: ignore  # the property
+    name: str  # the property
     value: NodeExpr
+    position: int = field(default=0, compare=False)  # of the property name
 
-    def __repr__(self) -> str:
-        return f"{repr(self.instance)}.{self.name.lexeme} = {repr(self.value)}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Set (property) {self.name.lexeme} from:")
-        self.instance.print_ast(level + 1)
-        _print_level(level, "...with value:")
-        self.value.print_ast(level + 1)
-        
+    def _repr_parts(self) -> list:
+        return [self.instance, ".", self.name, " = ", self.value]
 
-@dataclass(frozen=True)
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Set (property) {self.name} from:"), (level + 1, self.instance),
+                (level, "...with value:"), (level + 1, self.value)]
+
+
+@dataclass(frozen=True, repr=False)
 class Super(NodeExpr):
-    token: 'Token'  # type: ignore
-    method: 'Token'  # type: ignore
-    
-    def __repr__(self) -> str:
-        return f"super.{self.method.lexeme}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] Super, calling method {self.method.lexeme}() from superclass")
-    
+    method: str
+    position: int = field(default=0, compare=False)  # of 'super'
+    method_position: int = field(default=0, compare=False)  # of the method name
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
+
+    def _repr_parts(self) -> list:
+        return [f"super.{self.method}"]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Expr] Super, calling method {self.method}() from superclass")]
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class This(NodeExpr):
-    token: 'Token'  # type: ignore
+    position: int = field(default=0, compare=False)
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return self.token.lexeme
+    def _repr_parts(self) -> list:
+        return ["this"]
 
-    def print_ast(self, level=0):
-        _print_level(level, f"[Expr] This")
+    def _ast_lines(self, level):
+        return [(level, "[Expr] This")]
 
 # Nodes for other statements
 
-class NodeStmt:
+class NodeStmt(Node):
     # Only for type hints
-    def print_ast(self, level=0):
-        pass  # override this
+    pass
 
 
-@dataclass
+@dataclass(repr=False)
 class Expression(NodeStmt):
     expr: NodeExpr
 
-    def __repr__(self) -> str:
-        return repr(self.expr)
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Expression")
-        self.expr.print_ast(level + 1)
-        
+    def _repr_parts(self) -> list:
+        return [self.expr]
 
-@dataclass
+    def _ast_lines(self, level):
+        return [(level, "[Stmt] Expression"), (level + 1, self.expr)]
+
+
+@dataclass(repr=False)
 class If(NodeStmt):
     condition: NodeExpr
     then_stmt: NodeStmt
     else_stmt: Optional[NodeStmt]
 
-    def __repr__(self) -> str:
-        return (f"if ({self.condition}) then {repr(self.then_stmt)}" +
-                (f" else {self.else_stmt}" if self.else_stmt is not None else ""))
-    
+    def _repr_parts(self) -> list:
+        return (["if (", self.condition, ") then ", self.then_stmt] +
+                ([" else ", self.else_stmt] if self.else_stmt is not None else []))
 
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] If...")
-        self.condition.print_ast(level + 1)
-        _print_level(level, f"[Stmt] ...Then...")
-        self.then_stmt.print_ast(level + 1)
+
+    def _ast_lines(self, level):
+        lines = [(level, "[Stmt] If..."), (level + 1, self.condition), (level, "[Stmt] ...Then..."), (level + 1, self.then_stmt)]
         if self.else_stmt:
-            _print_level(level, f"[Stmt] ...Else...")
-            self.else_stmt.print_ast(level + 1)
-    
+            lines += [(level, "[Stmt] ...Else..."), (level + 1, self.else_stmt)]
+        return lines
+
 
-@dataclass
+@dataclass(repr=False)
 class Print(NodeStmt):
     expr: NodeExpr
 
-    def __repr__(self) -> str:
-        return f"print {self.expr};"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Print")
-        self.expr.print_ast(level + 1)
+    def _repr_parts(self) -> list:
+        return ["print ", self.expr, ";"]
+
+    def _ast_lines(self, level):
+        return [(level, "[Stmt] Print"), (level + 1, self.expr)]
 
 
-@dataclass 
+@dataclass(repr=False)
 class Var(NodeStmt):
     """Statement for declaring a variable (with optional setting)"""
-    name: 'Token' # type: ignore
+    name: str
     initializer: Optional[NodeExpr]
+    position: int = field(default=0, compare=False)  # of the name
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return f"var {self.name.lexeme}{" = " + repr(self.initializer) if self.initializer else ''};"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Var (declaration): {self.name.lexeme}")
+    def _repr_parts(self) -> list:
+        return ["var ", self.name, *([" = ", self.initializer] if self.initializer else []), ";"]
+
+    def _ast_lines(self, level):
+        lines = [(level, f"[Stmt] Var (declaration): {self.name}")]
         if self.initializer:
-            _print_level(level, "...with initialization:")
-            self.initializer.print_ast(level + 1)
+            lines += [(level, "...with initialization:"), (level + 1, self.initializer)]
+        return lines
 
 
-@dataclass
+@dataclass(repr=False)
 class While(NodeStmt):
     condition: NodeExpr
     body: NodeStmt
     increment: Optional[NodeExpr]  # must be kept here for 'continue' to work in 'for' statements with increment
 
-    def __repr__(self) -> str:
-        return f"while ({self.condition}) {self.body}"
+    def _repr_parts(self) -> list:
+        return ["while (", self.condition, ") ", self.body]
 
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] While...")
-        self.condition.print_ast(level + 1)
-        _print_level(level, "...Do...")
-        self.body.print_ast(level + 1)
+    def _ast_lines(self, level):
+        lines = [(level, "[Stmt] While..."), (level + 1, self.condition), (level, "...Do..."), (level + 1, self.body)]
         if self.increment:
-            self.increment.print_ast(level + 1)
+            lines.append((level + 1, self.increment))
+        return lines
 
 
-@dataclass
+@dataclass(repr=False)
 class AbortLoop(NodeStmt):
-    token: 'Token' # type: ignore
+    keyword: TokenKind  # BREAK or CONTINUE
+    position: int = field(default=0, compare=False)
 
-    def __repr__(self) -> str:
-        return f"{self.token.lexeme};"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] AbortLoop: {self.token.lexeme}")
-        
+    def _repr_parts(self) -> list:
+        return [f"{FIXED_LEXEMES[self.keyword]};"]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Stmt] AbortLoop: {FIXED_LEXEMES[self.keyword]}")]
 
-@dataclass
+
+@dataclass(repr=False)
 class Block(NodeStmt):
     statements: list[NodeStmt]
+    slots: Optional[int] = field(default=None, compare=False)
+    registers: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return "{" + "\n".join(repr(stmt) for stmt in self.statements) + "}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Block")
-        for stmt in self.statements:
-            stmt.print_ast(level + 1)
-    
+    def _repr_parts(self) -> list:
+        return ["{", *_joined(self.statements, "\n"), "}"]
 
-@dataclass
-class Function(NodeStmt):
-    name: 'Token'  # type: ignore
-    params: 'list[Token]'  # type: ignore
-    body: list[NodeStmt]
+    def _ast_lines(self, level):
+        return [(level, "[Stmt] Block")] + [(level + 1, stmt) for stmt in self.statements]
 
-    def __repr__(self) -> str:
-        return f"fun {self.name.lexeme}({', '.join(p.lexeme for p in self.params)}) {{ {repr(self.body)} }}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Function (declaration): {self.name.lexeme}...")
-        _print_level(level, f"...with params ({', '.join(p.lexeme for p in self.params)}):")
-        for stmt in self.body:
-            stmt.print_ast(level + 1)
-    
 
-@dataclass
+@dataclass(repr=False)
+class Function(NodeStmt):
+    name: str
+    params: list[str]
+    body: 'list[NodeStmt] | LazyBody'  # replaced by the parsed statements when a lazy body is first called
+    position: int = field(default=0, compare=False)  # of the name
+    param_positions: tuple[int, ...] = field(default=(), compare=False)  # of each parameter (none for nodes built by hand)
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
+    slots: Optional[int] = field(default=None, compare=False)  # of the captured parameters, then variables of the body
+    registers: Optional[int] = field(default=None, compare=False)  # of the parameters, then the variables of the body
+    captured: tuple[int, ...] = field(default=(), compare=False)  # registers of the parameters captured by closures
+    free: tuple[int, ...] = field(default=(), compare=False)  # registers of the cells it closes over, where declared
+    outer_frames: bool = field(default=True, compare=False)  # False: its closure needs none of the enclosing Frames
+    inline = None  # the expression returned by its body, if that's all the body does (see optimizing.py)
+    lines = None  # the line table of its positions (see positions.py), given by the Parser
+
+    def _repr_parts(self) -> list:
+        body = _listed(self.body) if isinstance(self.body, list) else [self.body]
+        return [f"fun {self.name}({', '.join(self.params)}) {{ ", *body, " }"]
+
+    def _ast_lines(self, level):
+        body = self.body if isinstance(self.body, list) else [self.body]
+        return ([(level, f"[Stmt] Function (declaration): {self.name}..."),
+                 (level, f"...with params ({', '.join(self.params)}):")] +
+                [(level + 1, stmt) for stmt in body])
+
+
+@dataclass(repr=False)
+class LazyBody(Node):
+    """Body of a function that is parsed the first time the function is called (see Parser lazy mode):
+       its tokens from '{' to '}' followed by EOF, and the state of the resolver where the function is declared
+       (set by the resolver) to resolve it just as if it had been parsed with the rest of the program."""
+    tokens: 'list[Token]'  # type: ignore
+    lenient: bool
+    scopes: 'list[Scope] | None' = None  # type: ignore
+    classtype: Any = None
+    functype: Any = None
+    flat: bool = False
+
+    def _repr_parts(self) -> list:
+        return ["[...]"]
+
+    def _ast_lines(self, level):
+        return [(level, f"[Stmt] (body not parsed yet, {len(self.tokens) - 1} tokens)")]
+
+
+@dataclass(repr=False)
 class Return(NodeStmt):
-    token: 'Token'  # type: ignore
     value: Optional[NodeExpr]
+    position: int = field(default=0, compare=False)  # of 'return'
 
-    def __repr__(self) -> str:
-        return f"return{f' {repr(self.value)}' if self.value else ''};"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Return{' value:' if self.value else ''}")
+    def _repr_parts(self) -> list:
+        return ["return", *([" ", self.value] if self.value else []), ";"]
+
+    def _ast_lines(self, level):
+        lines = [(level, f"[Stmt] Return{' value:' if self.value else ''}")]
         if self.value:
-            self.value.print_ast(level + 1)
-    
+            lines.append((level + 1, self.value))
+        return lines
+
 
-@dataclass
+@dataclass(repr=False)
 class Class(NodeStmt):
-    name: 'Token'  # type: ignore
+    name: str
     superclass: Optional[Variable]
     methods: list[Function]
+    position: int = field(default=0, compare=False)  # of the name
+    depth: Optional[int] = field(default=None, compare=False)
+    slot: Optional[int] = field(default=None, compare=False)
 
-    def __repr__(self) -> str:
-        return f"class {self.name.lexeme}{f' < {self.superclass}' if self.superclass else ''} {{ {self.methods} }}"
-    
-    def print_ast(self, level=0):
-        _print_level(level, f"[Stmt] Class (declaration): {self.name.lexeme}")
+    def _repr_parts(self) -> list:
+        return ["class ", self.name, *([" < ", self.superclass] if self.superclass else []),
+                " { ", *_listed(self.methods), " }"]
+
+    def _ast_lines(self, level):
+        lines = [(level, f"[Stmt] Class (declaration): {self.name}")]
         if self.superclass:
-            _print_level(level, f"... inheriting from superclass {self.superclass}")
-        _print_level(level, f"{'... with methods:' if self.methods else ''}")
-        for method in self.methods:
-            method.print_ast(level + 1)
+            lines.append((level, f"... inheriting from superclass {self.superclass}"))
+        lines.append((level, f"{'... with methods:' if self.methods else ''}"))
+        return lines + [(level + 1, method) for method in self.methods]
 
 
 # --
 
+def walk(statements: list, functions: bool = True) -> Iterator[Node]:
+    """The nodes of the statements, parents before their children, with an explicit stack (programs may be deeply nested)
+       ; without the nodes of the nested functions (but for their declarations) unless functions is True"""
+    pending: list = list(statements)[::-1]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (list, tuple)):
+            pending.extend(reversed(node))
+        elif isinstance(node, Node) and not isinstance(node, LazyBody):
+            yield node
+            if not functions and isinstance(node, Function):
+                continue
+            pending.extend(reversed([getattr(node, name) for name in _field_names(type(node))]))
+
+
+def resolutions(statements: list) -> list[tuple[NodeExpr, int]]:
+    """The (expression, depth) pairs of the resolved variables of the statements (see Interpreter.resolve())"""
+    return [(node, node.depth) for node in walk(statements)
+            if isinstance(node, NodeExpr) and getattr(node, "depth", None) is not None]
+
+
+@cache
+def _field_names(cls) -> tuple[str, ...]:
+    return tuple(field.name for field in fields(cls))
+
+
+def _joined(items, separator: str) -> list:
+    """Parts for the items separated by separator"""
+    parts = []
+    for item in items:
+        parts += (separator, item)
+    return parts[1:]
+
+
+def _listed(items) -> list:
+    """Parts for the repr of a list of items (as repr(list) would do)"""
+    return ["[", *_joined(items, ", "), "]"]
+
+
+def _render(root: Node) -> str:
+    """repr() of the tree, walked with an explicit stack of the parts left to render"""
+    output = []
+    pending = [root]
+    while pending:
+        part = pending.pop()
+        if isinstance(part, str):
+            output.append(part)
+        elif isinstance(part, Node):
+            pending.extend(reversed(part._repr_parts()))
+        else:  # eg. None for a statement that failed to parse
+            output.append(repr(part))
+    return "".join(output)
+
+
+def _print_tree(root: Node, level: int):
+    """print_ast() of the tree, walked with an explicit stack of the lines left to print"""
+    pending = [(level, root)]
+    while pending:
+        level, line = pending.pop()
+        if isinstance(line, str):
+            _print_level(level, line)
+        else:
+            pending.extend(reversed(line._ast_lines(level)))
+
+
 def _print_level(level, node):
-    print(f"{' '*level*2}{node}")
\ No newline at end of file
+    print(f"{' '*level*2}{node}")
@@ -0,0 +1,116 @@
+"""
+Front-end benchmark: tokenize, Parser.parse and Resolver.resolve_statements on a synthetic program
+(see corpus.py), reporting as JSON the time, throughput and peak memory of each phase.
+Running it for growing sizes shows how each phase scales (a linear phase keeps the same throughput).
+
+$ PYTHONPATH=app python3 bench/bench_frontend.py --shape mixed --size 1024 --size 4096
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from arena import Arena  # type: ignore
+from corpus import SHAPES, generate
+from environment import GlobalSlots  # type: ignore
+from evaluating import Interpreter  # type: ignore
+from parsing import Parser  # type: ignore
+from resolving import Resolver  # type: ignore
+from scanning import tokenize  # type: ignore
+
+
+def run_phases(source: str) -> dict[str, tuple[float, object]]:
+    """Run the front-end phases in turn, returning phase name => (duration in seconds, result)"""
+    timings = {}
+
+    start = time.perf_counter()
+    tokens, _ = tokenize(source)
+    timings["tokenize"] = time.perf_counter() - start, tokens
+
+    start = time.perf_counter()
+    statements = Parser(tokens).parse()
+    timings["parse"] = time.perf_counter() - start, statements
+
+    start = time.perf_counter()
+    Resolver(Interpreter()).resolve_statements(statements)
+    timings["resolve"] = time.perf_counter() - start, None
+    return timings
+
+
+def peak_memory(source: str) -> dict[str, int]:
+    """Peak memory allocated during each phase, in bytes (measured apart from the timings: tracing slows things down)"""
+    peaks = {}
+    tracemalloc.start()
+    tokens, _ = tokenize(source)
+    peaks["tokenize"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    statements = Parser(tokens).parse()
+    peaks["parse"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    Resolver(Interpreter()).resolve_statements(statements)
+    peaks["resolve"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peaks
+
+
+def ast_memory(source: str) -> dict[str, int]:
+    """Memory held by the AST (with its positions) as syntax nodes, and as an arena (see arena.py), in bytes"""
+    sizes = {}
+    gc.collect()
+    tracemalloc.start()
+    parser = Parser(tokenize(source)[0])
+    statements = parser.parse()  # the tokens not in the AST are released
+    gc.collect()
+    sizes["nodes"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracemalloc.start()
+    arena = Arena.encode(statements, parser.lines, GlobalSlots())  # (not resolved)
+    sizes["arena"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del arena
+    return sizes
+
+
+def bench(shape: str, size: int, repeat: int, **shape_options) -> dict:
+    source = generate(shape, size, **shape_options)
+    best: dict[str, float] = {}
+    for _ in range(repeat):
+        gc.collect()
+        for phase, (duration, _) in run_phases(source).items():
+            best[phase] = min(best.get(phase, duration), duration)
+    tokens, _ = tokenize(source)
+    peaks = peak_memory(source)
+    ast_sizes = ast_memory(source)
+
+    megabytes = len(source) / 1_000_000
+    return {
+        "shape": shape,
+        "source_bytes": len(source),
+        "tokens": len(tokens),
+        "phases": {
+            phase: {
+                "seconds": round(duration, 4),
+                "mb_per_s": round(megabytes / duration, 3) if duration else None,
+                "ktokens_per_s": round(len(tokens) / duration / 1000, 1) if duration else None,
+                "peak_memory_mb": round(peaks[phase] / 1_000_000, 2),
+            } for phase, duration in best.items()
+        },
+        "total_seconds": round(sum(best.values()), 4),
+        "ast_memory_mb": {layout: round(size / 1_000_000, 2) for layout, size in ast_sizes.items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--shape", choices=SHAPES, action="append", help="program shape (repeatable, default: all)")
+    parser.add_argument("--size", type=int, action="append", help="program size in KB (repeatable, default: 256)")
+    parser.add_argument("--repeat", type=int, default=3, help="keep the best time out of this many runs")
+    parser.add_argument("--depth", type=int, default=40, help="nesting depth for the 'nesting' shape")
+    parser.add_argument("--terms", type=int, default=200, help="terms per expression for the 'expressions' shape")
+    parser.add_argument("--string-length", type=int, default=65536, help="string literal length for the 'strings' shape")
+    args = parser.parse_args()
+
+    results = [bench(shape, size * 1024, args.repeat, depth=args.depth, terms=args.terms, string_length=args.string_length)
+               for shape in (args.shape or SHAPES) for size in (args.size or [256])]
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,57 @@
+"""
+Scanner throughput benchmark: tokenize a synthetic Lox source and report MB/s,
+then the same for a source ten times larger (a linear scanner keeps the same MB/s).
+Then the larger source is tokenized in parallel (by default, with one worker per available core): the speedup over
+tokenize(), and the CPU time of the parent process (that rebuilds the tokens) as a share of the time of tokenize(),
+which bounds the speedup whatever the number of cores.
+
+$ PYTHONPATH=app python3 bench/bench_scanning.py [size_in_kb [workers]]
+"""
+import sys
+import time
+
+from scanning import available_cores, tokenize, tokenize_parallel  # type: ignore
+
+SNIPPET = """
+// compute some values
+var counter_1 = 0;
+fun add(a, b) { return a + b; }
+while (counter_1 <= 100.5) {
+    counter_1 = add(counter_1, 1);
+    if (counter_1 != 42 and !false) print "counter is " + "still running";
+}
+class Shape < Base { area() { return this.width * this.height / 2; } }
+"""
+
+
+def make_source(size: int) -> str:
+    return SNIPPET * (size // len(SNIPPET) + 1)
+
+
+def bench(source: str, repeat: int = 3, scan=tokenize) -> float:
+    """Return the best throughput, in MB/s, over several runs"""
+    return len(source) / timed(source, repeat, scan)[0] / 1_000_000
+
+
+def timed(source: str, repeat: int, scan) -> tuple[float, float]:
+    """Return the best elapsed time and the best CPU time of this process, in seconds, over several runs"""
+    best, best_cpu = float("inf"), float("inf")
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        scan(source)
+        best, best_cpu = min(best, time.perf_counter() - start), min(best_cpu, time.process_time() - start_cpu)
+    return best, best_cpu
+
+
+if __name__ == "__main__":
+    size_kb = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    for size in (size_kb * 1024, size_kb * 1024 * 10):
+        source = make_source(size)
+        print(f"tokenize: {len(source) / 1_000_000:.2f} MB at {bench(source):.2f} MB/s")
+
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else available_cores()
+    sequential, _ = timed(source, 3, tokenize)
+    parallel, parent = timed(source, 3, lambda source: tokenize_parallel(source, workers=workers))
+    print(f"tokenize_parallel: {workers} workers on {available_cores()} cores "
+          f"at {len(source) / parallel / 1_000_000:.2f} MB/s, {sequential / parallel:.2f}x faster, "
+          f"parent busy {parent / sequential:.0%} of the time of tokenize()")
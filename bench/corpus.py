@@ -0,0 +1,100 @@
+"""
+Generator of synthetic (but valid) Lox programs for the benchmarks, in several shapes:
+
+- nesting: deeply nested blocks, 'if' and 'while' statements
+- expressions: long arithmetic/logical expressions
+- functions: many small functions, and calls to them
+- strings: huge string literals
+- classes: many classes, inheriting from one another
+- mixed: all of the above, in turn
+
+$ PYTHONPATH=app python3 bench/corpus.py <shape> <size_in_kb> > program.lox
+"""
+import sys
+
+SHAPES = ['nesting', 'expressions', 'functions', 'strings', 'classes', 'mixed']
+
+
+def generate(shape: str, size: int, depth: int = 40, terms: int = 200, string_length: int = 65536) -> str:
+    """Return a program of the given shape, of at least size characters.
+       depth, terms and string_length tune the nesting depth, the number of terms in each expression
+       and the length of each string literal."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape: {shape} (expected one of {', '.join(SHAPES)})")
+    makers = {
+        'nesting': lambda n: nesting(n, depth),
+        'expressions': lambda n: expression(n, terms),
+        'functions': functions,
+        'strings': lambda n: string(n, string_length),
+        'classes': classes,
+    }
+    if shape != 'mixed':
+        makers = {shape: makers[shape]}
+
+    parts, length, n = [], 0, 0
+    while length < size:
+        for make in makers.values():
+            part = make(n)
+            parts.append(part)
+            length += len(part)
+        n += 1
+    return "".join(parts)
+
+
+def nesting(n: int, depth: int) -> str:
+    """Blocks nested depth times, alternating plain blocks, 'if/else' and 'while' loops that run once"""
+    opening, closing = [], []
+    for level in range(depth):
+        indent = "  " * level
+        match level % 3:
+            case 0:
+                opening.append(f"{indent}{{\n{indent}  var n{n}_{level} = {level};\n")
+                closing.append(f"{indent}}}\n")
+            case 1:
+                opening.append(f"{indent}if (n{n}_{level - 1} >= 0) {{\n")
+                closing.append(f"{indent}}} else {{\n{indent}  print \"unreachable\";\n{indent}}}\n")
+            case 2:
+                opening.append(f"{indent}var w{n}_{level} = true;\n{indent}while (w{n}_{level}) {{\n"
+                               f"{indent}  w{n}_{level} = false;\n")
+                closing.append(f"{indent}}}\n")
+    return "".join(opening) + "  " * depth + f"print n{n}_0;\n" + "".join(reversed(closing))
+
+
+def expression(n: int, terms: int) -> str:
+    """One variable initialized with a long expression mixing every binary operator, and a condition using it"""
+    operators = ["+", "-", "*", "/"]
+    expr = " ".join(f"{i + 1}.5 {operators[i % 4]}" for i in range(terms)) + " 1"
+    return (f"var e{n} = ({expr}) * (e{n - 1} - -1);\n" if n else f"var e{n} = {expr};\n") + \
+           f"if (e{n} > 0 and e{n} <= 1000000 or !(e{n} == nil) and e{n} != e{n}) print e{n};\n"
+
+
+def functions(n: int) -> str:
+    """A small function, and a call to it from the previous one's result"""
+    return (f"fun f{n}(a, b) {{\n  var c = a * {n} + b;\n  if (c > {n}) return c - b;\n  return c;\n}}\n"
+            f"var r{n} = f{n}({'r' + str(n - 1) if n else 0}, {n});\n")
+
+
+def string(n: int, length: int) -> str:
+    """A huge string literal spanning several lines, with some concatenations"""
+    line = ("lorem ipsum dolor sit amet " * 4)[:79] + "\n"
+    text = (line * (length // len(line) + 1))[:length]
+    return f'var s{n} = "{text}" + "{n}";\nprint s{n};\n'
+
+
+def classes(n: int) -> str:
+    """A class with an initializer and a few methods, inheriting from the previous one (in chains of 10 classes)"""
+    superclass = f" < C{n - 1}" if n % 10 else ""
+    supercall = "super.total() + " if n % 10 else ""
+    return (f"class C{n}{superclass} {{\n"
+            f"  init(x) {{\n    this.x = x;\n    this.y{n} = x * 2;\n  }}\n"
+            f"  total() {{\n    return {supercall}this.x;\n  }}\n"
+            f"  scaled(factor) {{\n    return this.total() * factor;\n  }}\n"
+            f"}}\n"
+            f"print C{n}({n}).scaled(2);\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().split("\n")[-1], file=sys.stderr)
+        exit(1)
+    print(generate(sys.argv[1], int(sys.argv[2]) * 1024), end="")
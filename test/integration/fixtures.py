@@ -4,11 +4,11 @@ from pytest import fixture
 
 @fixture
 def run_lox(tmp_path):
-    def _run_lox(command, lox_source):
+    def _run_lox(command, lox_source, options=()):
         with open(tmp_path / "integration.lox", "w") as sf:
             sf.writelines(lox_source)
 
-        cmd = ["python3", "-m", "app.main", command, str(tmp_path / "integration.lox")]
+        cmd = ["python3", "-m", "app.main", command, *options, str(tmp_path / "integration.lox")]
         process = subprocess.run(cmd, text=True, capture_output=True, timeout=1)
         if process.returncode not in (0, 65, 70):
             raise RuntimeError(process.stderr.rstrip())
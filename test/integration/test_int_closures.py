@@ -55,3 +55,36 @@ fun bad() {
     assert status == 65
     assert output == ""
     assert stderr == "[line 3] Error at 'a': A variable with the same name is already present in the same scope."
+
+
+def test_flat_closures(run_lox):
+    source = """
+fun makeCounter(start) {
+  fun count() {
+    fun next() { start = start + 1; return start; }  // free in count, through next
+    return next();
+  }
+  return count;
+}
+var counter = makeCounter(10);
+counter();
+print counter();
+
+var first;
+for (var i = 0; i < 3; i = i + 1) {
+  var j = i;
+  fun show() { print i + j; }  // the same i for every iteration, a new j for each one
+  if (j == 0) first = show;
+}
+first();
+
+class Greeter {
+  init(greeting) { this.greeting = greeting; }
+  greeter(name) { fun greet() { return this.greeting + " " + name; } return greet; }
+}
+print Greeter("hello").greeter("you")();
+""".strip()
+
+    for options in ([], ["--flat-closures"], ["--flat-closures", "--lazy"], ["--flat-closures", "--fused"]):
+        status, output, _ = run_lox(command="run", lox_source=source, options=options)
+        assert (status, output) == (0, "12\n3\nhello you")
@@ -106,6 +106,10 @@ print baz;
 
     assert output == "0\n1\n2\nhello"
 
+    # same variable names on the same line, in different scopes
+    _, output, _ = run_lox(command="run", lox_source="var i = \"out\"; for (var i = 0; i < 3; i = i + 1) { print i; } print i;")
+    assert output == "0\n1\n2\nout"
+
     # -- syntax error --
     status, output, stderr = run_lox(command="run", lox_source="for ({}; a < 2; a = a + 1) {}")
     assert status == 65
@@ -144,4 +144,21 @@ Operands must be numbers.
     assert stderr.split("\n") == """
 Operands must be numbers.
 [line 1]
-""".strip().split("\n")
\ No newline at end of file
+""".strip().split("\n")
+
+def test_runtime_errors_next_to_proven_numbers(run_lox):
+    source = """
+fun f(x) {
+  var n = 0;
+  for (var i = 0; i < 3; i = i + 1) n = n + i * 2;
+  print n;
+  return n - x;
+}
+print f(1);
+print f("one");
+""".strip()
+    for options in ((), ("--flat-closures",), ("--lazy", "--fused")):
+        status, output, stderr = run_lox(command="run", lox_source=source, options=options)
+        assert status == 70
+        assert output == "6\n5\n6"
+        assert stderr == "Operands must be numbers.\n[line 5]"
@@ -136,3 +136,41 @@ sayHello("Bob");
     _, output, _ = run_lox(command="run", lox_source=source)
 
     assert output == "Hello Bob"
+
+
+def test_lazy_functions(run_lox):
+    source = """
+var a = "global";
+{
+  var a = "outer";
+  fun show() { print a; }
+  var b = "later";
+  class Greeter { greet(name) { fun twice() { return name + name; } return this.prefix + twice(); } }
+  var greeter = Greeter();
+  greeter.prefix = "hi ";
+  show();
+  print greeter.greet("yo");
+}
+"""
+    for options in ([], ["--lazy"], ["--lazy", "--stream"]):
+        status, output, _ = run_lox(command="run", lox_source=source, options=options)
+        assert status == 0
+        assert output == "outer\nhi yoyo"
+
+    # -- errors in a lazy body are only found when it is first called --
+    source = 'fun unused() { print ; }\nfun used() { return x y; }\nprint "start";\nused();'
+    status, output, stderr = run_lox(command="run", lox_source=source, options=["--lazy"])
+    assert status == 65
+    assert output == "start"
+    assert stderr == "[line 2] Error at 'return': Expected ';' after return value."
+
+    # -- but the parameters are checked with the declaration --
+    source = 'fun f(a, a) {}\nclass C { m(b, b) {} }\nprint "start";'
+    for options in (["--lazy"], ["--lazy", "--fused"]):
+        status, output, stderr = run_lox(command="run", lox_source=source, options=options)
+        assert status == 65
+        assert output == ""
+        assert stderr.split("\n") == [
+            "[line 1] Error at 'a': A variable with the same name is already present in the same scope.",
+            "[line 2] Error at 'b': A variable with the same name is already present in the same scope.",
+        ]
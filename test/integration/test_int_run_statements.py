@@ -178,3 +178,112 @@ print hello;
 
     assert status == 70
     assert stderr == "Undefined variable 'hello'.\n[line 9]"
+
+
+def test_run_stream(run_lox):
+    source = """
+var a = "global";
+fun show(x) { var y = x; fun inner() { return y + "!"; } return inner; }
+var closure = show(a);
+{ var a = "local"; print a; }
+if (true) print closure(); else print "no";
+""".strip()
+    status, output, _ = run_lox(command="run", lox_source=source, options=["--stream"])
+    assert status == 0
+    assert output == "local\nglobal!"
+
+    # -- errors: the declarations before the first one have already run --
+    status, output, stderr = run_lox(command="run", lox_source='print "ran";\nvar = 1;\nreturn 2;\nprint 3',
+                                     options=["--stream"])
+    assert status == 65
+    assert output == "ran"
+    assert stderr == "[line 2] Error at '=': Expected variable name.\n[line 4] Error at 'print': Expected ';' after value."
+
+    status, output, stderr = run_lox(command="run", lox_source='print "ran";\n49 + "baz";\nprint "not ran";',
+                                     options=["--stream"])
+    assert status == 70
+    assert output == "ran"
+    assert stderr == "Operands must be two numbers or two strings.\n[line 2]"
+
+
+def test_run_fused(run_lox):
+    source = """
+var a = "global";
+fun show(x) { var y = x; fun inner() { return y + "!"; } return inner; }
+class A { init(v) { this.v = v; } }
+class B < A { init() { super.init("super"); } }
+{ var a = "local"; for (var i = 0; i < 2; i = i + 1) { a = a + "!"; } print a; }
+print show(a)();
+print B().v;
+""".strip()
+    for options in (["--fused"], ["--fused", "--lazy"]):
+        status, output, _ = run_lox(command="run", lox_source=source, options=options)
+        assert status == 0
+        assert output == "local!!\nglobal!\nsuper"
+
+    # -- same semantic errors as the resolver pass, only if there's no syntax error --
+    source = "{ var a = a; }\nreturn 1;"
+    status, _, stderr = run_lox(command="run", lox_source=source, options=["--fused"])
+    assert status == 65
+    assert stderr == "[line 1] Error at 'a': Can't read local variable in its own initializer.\n" \
+                     "[line 2] Error at 'return': Can't use 'return' in top-level code."
+    status, _, stderr = run_lox(command="run", lox_source=source + "\nprint", options=["--fused"])
+    assert status == 65
+    assert stderr == "[line 3] Error at end: Expected expression."
+
+
+def test_run_cached(run_lox, tmp_path):
+    source = 'var a = 1; { var b = a + 1; print b; }'
+    for _ in range(2):  # analyzed then cached, then run from the cache
+        status, output, _ = run_lox(command="run", lox_source=source, options=[f"--cache={tmp_path / 'cache'}"])
+        assert status == 0
+        assert output == "2"
+    assert len(list((tmp_path / "cache").glob("*.loxc"))) == 1
+
+    # programs with errors are not cached
+    status, _, _ = run_lox(command="run", lox_source="print a", options=[f"--cache={tmp_path / 'cache'}"])
+    assert status == 65
+    assert len(list((tmp_path / "cache").glob("*.loxc"))) == 1
+
+    # the programs analyzed with other options are cached apart (--lazy leaves the errors of the bodies unreported)
+    source = 'fun bad() { return this; } print "ok";'
+    status, output, _ = run_lox(command="run", lox_source=source, options=[f"--cache={tmp_path / 'cache'}", "--lazy"])
+    assert (status, output) == (0, "ok")
+    status, _, stderr = run_lox(command="run", lox_source=source, options=[f"--cache={tmp_path / 'cache'}"])
+    assert status == 65
+    assert stderr == "[line 1] Error at 'this': Can't use 'this' outside of a class."
+
+
+def test_run_optimized(run_lox):
+    source = """
+var unused = "never read";
+fun f(n) { if (1 < 2) return n * (2 + 3); print "dead"; }
+for (var i = 0; i < 3; i = i + 1) { if (false) print "no"; else print f(i); }
+while (nil) print "never";
+print "post" + "rock" + "!";
+print 1 + "a";
+""".strip()
+    for options in (["--optimize"], ["--optimize", "--lazy"]):
+        status, output, stderr = run_lox(command="run", lox_source=source, options=options)
+        assert status == 70
+        assert output == "0\n5\n10\npostrock!"
+        assert stderr == "Operands must be two numbers or two strings.\n[line 6]"
+
+    # -- the dead code still has its semantic errors reported --
+    status, _, stderr = run_lox(command="run", lox_source="if (false) { var a = a; }", options=["--optimize"])
+    assert status == 65
+    assert stderr == "[line 1] Error at 'a': Can't read local variable in its own initializer."
+
+    # -- inlined functions and methods, until their name is given another value --
+    source = """
+fun sq(x) { return x * x; }
+fun cube(x) { return x * x * x; }
+class P { init(v) { this.v = v; } get() { return this.v; } }
+var p = P(2);
+for (var i = 0; i < 3; i = i + 1) { if (i == 2) sq = cube; print sq(i + 1) + p.get(); }
+print sq("a");
+""".strip()
+    status, output, stderr = run_lox(command="run", lox_source=source, options=["--optimize"])
+    assert status == 70
+    assert output == "3\n6\n29"
+    assert stderr == "Operands must be numbers.\n[line 2]"
@@ -1,3 +1,5 @@
+import pytest
+
 from fixtures import run_lox
 
 
@@ -205,3 +207,39 @@ RETURN return null
 SEMICOLON ; null
 EOF  null
 """.strip().split("\n")
+
+
+def test_tokenize_in_parallel(run_lox):
+    status, output, stderr = run_lox(command="tokenize", lox_source='"a\nb" @ 1', options=["--jobs=2"])
+
+    assert status == 65
+    assert output.split("\n") == ['STRING "a', 'b" a', 'b', 'NUMBER 1 1.0', 'EOF  null']
+    assert stderr == "[line 2] Error: Unexpected character: @"
+
+
+def test_tokenize_repeated_errors_are_merged_and_limited(run_lox):
+    status, output, stderr = run_lox(command="tokenize", lox_source="(@@@\n@\n#)")
+
+    assert output.split("\n") == ["LEFT_PAREN ( null", "RIGHT_PAREN ) null", "EOF  null"]
+    assert stderr.split("\n") == [
+        "[lines 1-2] Error: Unexpected character: @ (4 times)",
+        "[line 3] Error: Unexpected character: #",
+    ]
+    assert status == 65
+
+    status, _, stderr = run_lox(command="run", lox_source="$ # @ print 1;", options=["--max-errors=2"])
+
+    assert stderr.split("\n") == [
+        "[line 1] Error: Unexpected character: $",
+        "[line 1] Error: Unexpected character: #",
+        "Too many errors (more than 2), giving up.",
+    ]
+    assert status == 65
+
+
+def test_invalid_option_values(run_lox):
+    for option in ("--jobs", "--jobs=abc", "--jobs=0", "--max-errors=-1"):
+        with pytest.raises(RuntimeError) as error:  # usage, with exit code 1
+            run_lox(command="tokenize", lox_source="print 1;", options=[option])
+        assert str(error.value).startswith(f"Invalid value: {option} (expected --")
+        assert "Usage: " in str(error.value)
@@ -0,0 +1,64 @@
+from arena import Arena
+from environment import REGISTER
+from evaluating import Interpreter
+from parsing import Parser
+from positions import lines
+from resolving import Resolver
+from scanning import tokenize
+from syntax import resolutions
+
+SOURCE = """\
+var a = 1;
+fun add(x, y) { return x + y; }
+class Point < Base {
+  init(x) { this.x = -x; super.init(); }
+}
+while (a < 3 and !false) { a = a + 1; if (a == 2) continue; else break; }
+for (var i = 0; i < 2; i = i + 1) print add(i, (nil or "s"));
+{ var p = Point(1.5); p.x = p.x * 2; print p.x; }
+"""
+
+
+def _analyzed(source):
+    parser = Parser(tokenize(source)[0])
+    statements = parser.parse()
+    interpreter = Interpreter()
+    Resolver(interpreter).resolve_statements(statements)
+    return statements, parser.lines, interpreter.globals.slots
+
+
+def test_arena_decodes_the_same_statements(capsys):
+    statements, table, slots = _analyzed(SOURCE)
+    arena = Arena.encode(statements, table, slots)
+    assert len(arena.roots) == len(statements)
+    assert repr(list(arena.statements())) == repr(statements) == repr(arena)
+    assert arena.statement(2) == statements[2]
+    assert lines(arena.statements(), arena.table) == lines(statements, table)  # with positions of their own
+    assert arena.statement(1).lines is arena.table
+
+    arena.print_ast()
+    from_arena = capsys.readouterr().out
+    for stmt in statements:
+        stmt.print_ast()
+    assert from_arena == capsys.readouterr().out
+
+
+def test_arena_keeps_the_resolutions(capsys):
+    source = "fun counter() { var n = 0; fun inc() { n = n + 1; return n; } return inc; }\n" \
+             "var c = counter(); c(); { var d = c(); print d; }"
+    arena = Arena.from_bytes(Arena.encode(*_analyzed(source)).to_bytes())
+
+    interpreter = Interpreter()
+    interpreter.globals.define("other", 1)  # (the global variables get other slots)
+    decoded = list(arena.statements(interpreter.globals.slots))
+    for stmt in decoded:  # without resolver
+        interpreter.execute(stmt)
+    assert capsys.readouterr().out == "2\n"
+    assert sorted(depth for _, depth in resolutions(decoded)) == [REGISTER, REGISTER, 0, 0, 0]  # inc, d ; n
+
+
+def test_arena_of_deeply_nested_statement():
+    depth = 5000
+    statements, table, slots = _analyzed("{" * depth + "print -" + "(" * depth + "1" + ")" * depth + ";" + "}" * depth)
+    arena = Arena.encode(statements, table, slots)
+    assert repr(arena.statement(0)) == repr(statements[0])
@@ -0,0 +1,77 @@
+import os
+
+import caching
+from caching import ProgramCache
+from environment import GlobalSlots
+from evaluating import Interpreter
+from parsing import Parser
+from resolving import Resolver
+from scanning import tokenize
+from syntax import resolutions
+
+SOURCE = """\
+var a = "global";
+fun show(x) { var y = x; fun inner() { return y + a; } return inner; }
+{ var a = "local"; print show(a)(); }
+"""
+
+
+def _analyzed(source):
+    parser = Parser(tokenize(source)[0])
+    statements = parser.parse()
+    interpreter = Interpreter()
+    Resolver(interpreter).resolve_statements(statements)
+    return statements, parser.lines, interpreter.globals.slots
+
+
+def test_cached_program_runs_without_analysis(tmp_path, monkeypatch, capsys):
+    cache = ProgramCache(tmp_path)
+    interpreter = Interpreter()
+    interpreter.globals.define("other", 1)  # (the global variables get other slots)
+    assert cache.load(SOURCE, interpreter.globals.slots) is None
+    _analyzed(SOURCE * 100)  # (another program: its positions are not in the entry)
+    analyzed, table, slots = _analyzed(SOURCE)
+    cache.store(SOURCE, analyzed, table, slots)
+    assert [path.suffix for path in tmp_path.iterdir()] == [".loxc"]
+
+    monkeypatch.setattr(Parser, "parse", None)
+    statements, lines = cache.load(SOURCE, interpreter.globals.slots)
+    assert repr(statements) == repr(analyzed)
+    assert lines.lines == table.lines and statements[1].lines is lines
+    assert len(resolutions(statements)) == 4  # x, y and inner in show(), a in the block
+    for stmt in statements:
+        interpreter.execute(stmt)
+    assert capsys.readouterr().out == "localglobal\n"
+
+
+def test_cache_keys(tmp_path, monkeypatch):
+    cache = ProgramCache(tmp_path)
+    path = cache.path(SOURCE)
+    assert cache.path(SOURCE + " ") != path
+    lazy = ProgramCache(tmp_path, variant=["lazy"])
+    assert lazy.path(SOURCE) != path
+    assert ProgramCache(tmp_path, variant=["lazy", "fused"]).path(SOURCE) not in (path, lazy.path(SOURCE))
+    assert ProgramCache(tmp_path, variant=["flat-closures", "lazy"]).path(SOURCE) == \
+        ProgramCache(tmp_path, variant=["lazy", "flat-closures"]).path(SOURCE)
+    monkeypatch.setattr(caching, "fingerprint", lambda: b"another interpreter version")
+    assert cache.path(SOURCE) != path
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ProgramCache(tmp_path)
+    cache.store(SOURCE, *_analyzed(SOURCE))
+    cache.path(SOURCE).write_bytes(b"truncated")
+    assert cache.load(SOURCE, GlobalSlots()) is None
+    assert not cache.path(SOURCE).exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    sources = [f"print {number};" for number in range(4)]
+    cache = ProgramCache(tmp_path)
+    for age, source in enumerate(sources):
+        cache.store(source, *_analyzed(source))
+        os.utime(cache.path(source), (age, age))
+    cache.load(sources[0], GlobalSlots())  # used again: now the most recent one
+    cache.budget = sum(cache.path(source).stat().st_size for source in (sources[0], sources[3]))
+    cache.evict()
+    assert [cache.path(source).exists() for source in sources] == [True, False, False, True]
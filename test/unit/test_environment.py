@@ -1,7 +1,10 @@
 import pytest
-from environment import Environment
+from environment import Environment, Globals, GlobalSlots, UNDEFINED, relocate_globals
 from errors import LoxRuntimeError
-from scanning import Token
+from evaluating import Interpreter
+from parsing import Parser
+from resolving import Resolver
+from scanning import tokenize
 
 
 def test_Environmnent_define():
@@ -16,10 +19,10 @@ def test_Environmnent_define():
 def test_Environment_get():
     e = Environment()
     e.define("v1", 44.4)
-    assert e.get(Token("IDENTIFIER", "v1", None, 3)) == 44.4
+    assert e.get("v1", 3) == 44.4
     with pytest.raises(LoxRuntimeError) as exc:
-        e.get(Token("IDENTIFIER", "zzz", None, 4))
-    assert exc.value.args == (Token("IDENTIFIER", "zzz", None, 4), "Undefined variable 'zzz'.")
+        e.get("zzz", 4)
+    assert exc.value.args == (4, "Undefined variable 'zzz'.")
 
 
 def test_Environment_get_from_enclosing_or_shadowed():
@@ -28,43 +31,40 @@ def test_Environment_get_from_enclosing_or_shadowed():
     parent.define("v2", 100)
     blockscope = Environment(enclosing=parent)
     blockscope.define("v1", 11.1)
-    assert blockscope.get(Token("IDENTIFIER", "v1", None, 3)) == 11.1
-    assert blockscope.get(Token("IDENTIFIER", "v2", None, 3)) == 100
+    assert blockscope.get("v1", 3) == 11.1
+    assert blockscope.get("v2", 3) == 100
     with pytest.raises(LoxRuntimeError) as exc:
-        blockscope.get(Token("IDENTIFIER", "zzz", None, 4))
-    assert exc.value.args == (Token("IDENTIFIER", "zzz", None, 4), "Undefined variable 'zzz'.")
+        blockscope.get("zzz", 4)
+    assert exc.value.args == (4, "Undefined variable 'zzz'.")
 
 
 def test_Environment_assign():
     e = Environment()
     e.define("v", None)
-    var_token = Token("IDENTIFIER", "v", None, 1)
-    assert e.get(var_token) is None
-    e.assign(var_token, 99.9)
-    assert e.get(var_token) == 99.9
+    assert e.get("v", 1) is None
+    e.assign("v", 1, 99.9)
+    assert e.get("v", 1) == 99.9
 
     with pytest.raises(LoxRuntimeError) as exc:
-        e.assign(Token("IDENTIFIER", "zzz", None, 4), "hello")
-    assert exc.value.args == (Token("IDENTIFIER", "zzz", None, 4), "Undefined variable 'zzz'.")
+        e.assign("zzz", 4, "hello")
+    assert exc.value.args == (4, "Undefined variable 'zzz'.")
 
 
 def test_Environment_assign_to_enclosing_or_shadowed():
     parent = Environment()
     parent.define("v1", 44.4)
-    v1_token = Token("IDENTIFIER", "v1", None, 1)
     blockscope = Environment(enclosing=parent)
     blockscope.define("v2", 100)
-    v2_token = Token("IDENTIFIER", "v2", None, 1)
-    blockscope.assign(v1_token, 11.1)
-    blockscope.assign(v2_token, 200)
+    blockscope.assign("v1", 1, 11.1)
+    blockscope.assign("v2", 1, 200)
 
-    assert blockscope.get(v1_token) == 11.1
-    assert blockscope.get(v2_token) == 200
-    assert parent.get(v1_token) == 11.1
+    assert blockscope.get("v1", 1) == 11.1
+    assert blockscope.get("v2", 1) == 200
+    assert parent.get("v1", 1) == 11.1
 
     with pytest.raises(LoxRuntimeError) as exc:
-        parent.assign(v2_token, "hello")
-    assert exc.value.args == (v2_token, "Undefined variable 'v2'.")
+        parent.assign("v2", 2, "hello")
+    assert exc.value.args == (2, "Undefined variable 'v2'.")
 
 
 def test_Environment_ancestor():
@@ -98,10 +98,75 @@ def test_Environment_assign_at():
     e3 = Environment(enclosing=e2)
     e4 = Environment(enclosing=e3)
 
-    e4.assign_at(1, Token("IDENTIFIER", "depth", None, 1), "up 1")
-    e4.assign_at(2, Token("IDENTIFIER", "depth", None, 1), "up 2")
+    e4.assign_at(1, "depth", "up 1")
+    e4.assign_at(2, "depth", "up 2")
 
     assert e3.values["depth"] == "up 1"
     assert e2.values["depth"] == "up 2"
     assert "depth" not in e4.values
     assert "depth" not in e1.values
+
+
+def test_Globals():
+    g = Globals()
+    g.define("v1", 12.3)
+    slot = g.slots.slot("v1")
+    assert g.table[slot] == 12.3 and g.values["v1"] == 12.3
+    g.assign_slot(slot, "v1", 1, "by slot")
+    g.assign("v1", 1, "by name")
+    assert g.get("v1", 1) == "by name"
+
+    undefined = g.slots.slot("never defined")  # resolved, but never defined
+    assert undefined >= len(g.table) or g.table[undefined] is UNDEFINED
+    with pytest.raises(LoxRuntimeError) as exc:
+        g.assign_slot(undefined, "never defined", 5, 1)
+    assert exc.value.args == (5, "Undefined variable 'never defined'.")
+    with pytest.raises(LoxRuntimeError) as exc:
+        g.get("zzz", 4)
+    assert exc.value.args == (4, "Undefined variable 'zzz'.")
+
+
+def test_Globals_by_name():
+    g = Interpreter().globals
+    g.define("a", 1)
+    g.assign_at(0, "a", 2)
+    g.assign_at(1, "b", 3)
+    assert g.get_at(0, "a") == 2 and g.get("b", 1) == 3 and g.get_at(0, "zzz") is None
+    assert g.table[g.slots.slot("a")] == 2
+    assert g.get_at(0, "clock") is g.values["clock"]  # the native functions too
+    with pytest.raises(TypeError):
+        g.values["a"] = 4  # (read-only, rather than lost)
+    assert g.get("a", 1) == 2
+
+
+def test_GlobalSlots_extend():
+    table = GlobalSlots()
+    assert [table.slot(name) for name in ("clock", "a", "clock")] == [0, 1, 0]
+    assert GlobalSlots().extend(table.names) is None  # a fresh table takes the slots as they are
+    other = GlobalSlots()
+    other.slot("b")
+    assert other.extend(table.names) == [1, 2]
+
+
+def test_global_slots_of_each_interpreter():
+    resolved, other = Interpreter(), Interpreter()
+    statements = Parser(tokenize("var a = 1; print a;")[0]).parse()
+    Resolver(resolved).resolve_statements(statements)
+    assert statements[0].slot == resolved.globals.slots.slot("a")
+    assert "a" not in other.globals.slots.slots
+
+
+def test_relocate_globals(capsys):
+    resolved = Interpreter()
+    statements = Parser(tokenize("var a = 1; { var b = a; print b; }")[0]).parse()
+    Resolver(resolved).resolve_statements(statements)
+    a, read = statements[0], statements[1].statements[0].initializer
+    assert a.slot == read.slot == resolved.globals.slots.slot("a")
+
+    interpreter = Interpreter()
+    interpreter.globals.define("other", 2)  # where "a" gets another slot
+    relocate_globals(statements, interpreter.globals.slots.extend(resolved.globals.slots.names))
+    assert a.slot == read.slot == interpreter.globals.slots.slot("a") != resolved.globals.slots.slot("a")
+    for stmt in statements:
+        interpreter.execute(stmt)
+    assert capsys.readouterr().out == "1\n"
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+from errors import Diagnostics, Errors, TooManyErrors
+
+
+def test_errors_reported_right_away_without_diagnostics(capsys):
+    Errors.report(3, "Oops.", " at 'x'")
+    assert capsys.readouterr().err == "[line 3] Error at 'x': Oops.\n"
+
+
+def test_diagnostics_buffer_and_merge_errors():
+    output = io.StringIO()
+    with Diagnostics(file=output):
+        Errors.report(1, "Unexpected character: @")
+        Errors.report(1, "Unexpected character: @")
+        Errors.report(2, "Unexpected character: @")
+        Errors.report(2, "Unexpected character: #")
+        Errors.report(1, "Unexpected character: #")  # not merged: back to a previous line
+        assert output.getvalue() == ""
+    assert Errors.diagnostics is None
+    assert output.getvalue().split("\n") == [
+        "[lines 1-2] Error: Unexpected character: @ (3 times)",
+        "[line 2] Error: Unexpected character: #",
+        "[line 1] Error: Unexpected character: #",
+        "",
+    ]
+
+
+def test_diagnostics_limit():
+    output = io.StringIO()
+    with pytest.raises(TooManyErrors):
+        with Diagnostics(limit=2, file=output):
+            for line in range(1, 10):
+                Errors.report(line, f"Error {line}.")
+    assert output.getvalue().split("\n") == [
+        "[line 1] Error: Error 1.",
+        "[line 2] Error: Error 2.",
+        "Too many errors (more than 2), giving up.",
+        "",
+    ]
@@ -1,7 +1,7 @@
 import pytest
+from environment import Frame
 from errors import LoxRuntimeError
 from evaluating import Interpreter  # type: ignore
-from scanning import Token
 from syntax import Assign, Literal, Grouping, Logical, Unary, Binary, Var, Variable  # type: ignore
 from tokens import AND, DIVISE, EQUAL_EQUAL, GREATER, GREATER_EQUAL, LESS, LESS_EQUAL, MINUS, MULTIPLY, NOT, NOT_EQUAL, OR, PLUS
 
@@ -89,16 +89,25 @@ def test_evaluate_logical_operators(interpreter):
 
 def test_evaluate_variable_reading(interpreter):
     interpreter.environment.define("a", 12.3)  # the variable must be defined before we can read it value
-    assert interpreter.evaluate(Variable(Token("IDENTIFIER", "a", None, 1))) == 12.3
+    assert interpreter.evaluate(Variable("a")) == 12.3
 
 
 def test_evaluate_assignment(interpreter):
     interpreter.environment.define("v", None)  # "v" must be defined before we can assign it a value
-    assert interpreter.evaluate(Assign(Token("IDENTIFIER", "v", None, 1), Literal("test"))) == "test"
+    assert interpreter.evaluate(Assign("v", Literal("test"))) == "test"
     assert "v" in interpreter.environment.values
     assert interpreter.environment.values["v"] == "test"
 
 
+def test_resolution_kept_per_node(interpreter):
+    interpreter.environment.define("a", "global")
+    interpreter.environment = Frame(["local"], enclosing=interpreter.environment)
+    local, other = Variable("a"), Variable("a")  # equal nodes, in different scopes
+    interpreter.resolve(local, 0, 0)
+    assert local == other and (local.depth, other.depth) == (0, None)
+    assert (interpreter.evaluate(local), interpreter.evaluate(other)) == ("local", "global")
+
+
 def test_is_truthy(interpreter):
     assert interpreter.is_truthy(True) is True
     assert interpreter.is_truthy(False) is False
@@ -111,8 +120,8 @@ def test_is_truthy(interpreter):
 
 def test_runtime_errors(interpreter):
     with pytest.raises(LoxRuntimeError) as ex:
-        interpreter.evaluate(Unary(MINUS, Literal("fail")))
-    assert ex.value.args == (MINUS, "Operand must be a number.")
+        interpreter.evaluate(Unary(MINUS, Literal("fail"), position=7))
+    assert ex.value.args == (7, "Operand must be a number.")
 
     with pytest.raises(LoxRuntimeError) as ex:
         interpreter.evaluate(Binary(Literal(True), MULTIPLY, Literal(28.0)))
@@ -1,7 +1,9 @@
 import pytest
 
+from environment import CELL, REGISTER
+from parsing import Parser
 from resolving import Resolver
-from scanning import Token
+from scanning import tokenize
 from syntax import Block, If, Print, Expression, Binary, Literal, Var, Variable # type: ignore
 from evaluating import Interpreter # type: ignore
 from tokens import PLUS
@@ -33,14 +35,14 @@ def test_execute_expression_statement(interpreter, capsys):
 
 
 def test_execute_variable_declaration(interpreter, capsys):
-    a = Token("IDENTIFIER", "a", None, 1)
+    a = "a"
     interpreter.execute(Var(a, Literal(3.14)))
     interpreter.execute(Print(Variable(a)))
     assert capsys.readouterr()[0] == "3.14\n"
 
 
 def test_execute_statements_in_block(interpreter, capsys):
-    a = Token("IDENTIFIER", "a", None, 1)
+    a = "a"
     ast = Block([
         Var(a, Literal(3.14)),
         Print(Variable(a))
@@ -48,3 +50,52 @@ def test_execute_statements_in_block(interpreter, capsys):
     Resolver(interpreter).resolve(ast)
     interpreter.execute(ast)
     assert capsys.readouterr()[0] == "3.14\n"
+
+
+def test_local_variables_in_registers_or_slots(interpreter, capsys):
+    source = "{ var a = 1; fun f(x, y) { var z = x + a; fun g() { return y + z; } { var w = z; print w + g(); } } f(2, 3); }"
+    ast = Parser(tokenize(source)[0]).parse()
+    Resolver(interpreter).resolve_statements(ast)
+    block = ast[0]
+    a, f = block.statements[:2]
+    assert (block.slots, block.registers) == (1, 2)  # a, captured by f ; a, f
+    assert ((a.depth, a.slot), (f.depth, f.slot)) == ((0, 0), (REGISTER, 1))
+    assert (f.slots, f.registers, f.captured) == (2, 5, (1,))  # y, z ; x, y, z, g, w ; y
+    z, g, inner = f.body
+    assert (z.initializer.left.depth, z.initializer.left.slot) == (REGISTER, 0)  # x
+    assert (z.initializer.right.depth, z.initializer.right.slot) == (1, 0)  # a, beyond the Frame of f
+    y_plus_z = g.body[0].value
+    assert (g.slots, (y_plus_z.left.depth, y_plus_z.left.slot), (y_plus_z.right.depth, y_plus_z.right.slot)) == (None, (0, 0), (0, 1))
+    assert (inner.slots, inner.registers, inner.statements[0].slot) == (None, None, 4)  # w
+    interpreter.execute(block)
+    assert capsys.readouterr()[0] == "9\n"
+
+
+def test_flat_closures_in_cells(interpreter, capsys):
+    source = "fun f(x) { var y = 1; fun g() { fun h() { return x + y; } return h; } return g; } print f(2)()();"
+    ast = Parser(tokenize(source)[0]).parse()
+    Resolver(interpreter, flat=True).resolve_statements(ast)
+    f = ast[0]
+    y, g = f.body[:2]
+    h = g.body[0]
+    assert (f.slots, f.registers, f.captured) == (None, 3, (0,))  # x, y and g in registers, x and y in cells
+    assert ((y.depth, y.slot), (g.depth, g.slot)) == ((CELL, 1), (REGISTER, 2))
+    assert (g.free, h.free) == ((0, 1), (1, 2))  # from the registers of f, then from the cells of g (after h)
+    x_plus_y = h.body[0].value
+    assert ((x_plus_y.left.depth, x_plus_y.left.slot), (x_plus_y.right.depth, x_plus_y.right.slot)) == ((CELL, 0), (CELL, 1))
+    assert not (f.outer_frames or g.outer_frames or h.outer_frames)  # closing over no environment
+    interpreter.execute(f)
+    interpreter.execute(ast[1])
+    assert capsys.readouterr()[0] == "3\n"
+
+
+def test_blocks_declaring_nothing_run_in_place(interpreter, capsys):
+    source = "var i = 0; while (i < 3) { i = i + 1; if (i == 2) { continue; } print i; } { { var a = i; print a; } }"
+    ast = Parser(tokenize(source)[0]).parse()
+    Resolver(interpreter).resolve_statements(ast)
+    body, outer = ast[1].body, ast[2]
+    assert (body.slots, body.registers) == (None, None)
+    assert (outer.slots, outer.registers, outer.statements[0].registers) == (None, 1, None)  # a, held by the outer block
+    for stmt in ast:
+        interpreter.execute(stmt)
+    assert capsys.readouterr()[0] == "1\n3\n3\n"
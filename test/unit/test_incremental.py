@@ -0,0 +1,88 @@
+import random
+
+from incremental import COMPACTION_RATIO, Document
+from parsing import Parser
+from positions import lines
+from scanning import tokenize
+
+SOURCE = """\
+var a = 12.5;
+// a comment
+fun add(x, y) {
+  return x + y;
+}
+class Point {
+  init(x, y) { this.x = x; this.y = y; }
+}
+if (a > 1) print "a
+multi-line string"; else print add(a, 2);
+while (a < 20) { a = a + 1; }
+print a;
+"""
+
+
+def _full(source):
+    tokens, _ = tokenize(source)
+    parser = Parser(tokens)
+    return tokens, parser.parse(), parser.lines
+
+
+def _assert_same_as_full_analysis(document):
+    tokens, statements, table = _full(document.source)
+    assert [(repr(tok), tok.line) for tok in document.tokens] == [(repr(tok), tok.line) for tok in tokens]
+    assert repr(document.statements) == repr(statements)
+    assert lines(document.statements, document.lines) == lines(statements, table)
+    assert [document.source[pos:pos + 1] for pos in document.positions[:-1]] == [(tok.lexeme or "")[:1] for tok in tokens[:-1]]
+
+
+def test_edit_reuses_the_following_statements():
+    document = Document(SOURCE)
+    last_statements = document.statements[3:]
+    start = SOURCE.index("12.5")
+    statements = document.apply_edit(start, start + 4, "(1 +\n 2)")
+    _assert_same_as_full_analysis(document)
+    assert all(new is old for new, old in zip(statements[3:], last_statements))
+    assert document.lines.line(statements[-1].expr.position) == 13  # the reused statements after the edit have been shifted one line down
+
+
+def test_edits_that_merge_or_split_tokens():
+    document = Document(SOURCE)
+    for old, new in [("12.5", "12."), ("12.", "12.75"), ("else", "else;"), ("a <", "a<="), ("add(a", "adda(a"),
+                     ('"a\n', '"a'), ("// a comment\n", ""), ("print a;\n", "")]:
+        start = document.source.index(old)
+        document.apply_edit(start, start + len(old), new)
+        _assert_same_as_full_analysis(document)
+
+
+def test_edits_with_errors_fall_back_to_full_analysis(capsys):
+    document = Document(SOURCE)
+    start = SOURCE.index("return")
+    document.apply_edit(start, start, "var ")
+    assert document.had_errors
+    assert "Error at 'return': Expected variable name." in capsys.readouterr().err
+    document.apply_edit(start, start + 4, "")
+    assert not document.had_errors
+    _assert_same_as_full_analysis(document)
+
+
+def test_random_edits_same_as_full_analysis(capsys):
+    rng = random.Random(7)
+    document = Document(SOURCE)
+    for _ in range(500):
+        start = rng.randrange(len(document.source) + 1)
+        end = min(start + rng.randrange(4), len(document.source))
+        old, new = document.source[start:end], rng.choice(["", " ", "\n", "1", ".", "x", ";", "}", "{", '"', "/", "=", "else "])
+        document.apply_edit(start, end, new)
+        if document.had_errors:  # undo it, so that the next edit is done incrementally
+            document.apply_edit(start, start + len(new), old)
+        _assert_same_as_full_analysis(document)
+
+
+def test_line_table_keeps_the_positions_in_use():
+    document = Document(SOURCE)
+    start = SOURCE.index("12.5")
+    for number in range(200):  # the first statement is parsed again each time
+        document.apply_edit(start, start + len(document.source[start:].split(";")[0]), str(number))
+    _assert_same_as_full_analysis(document)
+    assert len(document.lines) <= COMPACTION_RATIO * (1 + sum(len(positions) for positions in document.ranges))
+    assert document.statements[1].lines is document.statements[2].methods[0].lines is document.lines
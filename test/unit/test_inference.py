@@ -0,0 +1,45 @@
+from evaluating import Interpreter
+from inference import infer_numbers
+from parsing import Parser
+from resolving import Resolver
+from scanning import tokenize
+from syntax import Binary, Unary, walk
+
+
+def _unchecked(source, flat=False):
+    """The operations of the source, as (repr, unchecked) in the order of walk()"""
+    statements = Parser(tokenize(source)[0]).parse()
+    Resolver(Interpreter(), flat=flat).resolve_statements(statements)
+    return [(repr(node), node.unchecked) for node in walk(statements) if isinstance(node, (Binary, Unary))]
+
+
+def test_numbers_proven():
+    source = "fun f(n) { var s = 0; for (var i = 0; i < n; i = i + 1) { s = s + -i * 2; } return s > (1 + 2); }"
+    assert _unchecked(source) == [("(< i n)", False),  # n is a parameter
+                                  ("(+ s (* (- i) 2.0))", True), ("(* (- i) 2.0)", True), ("(- i)", True),
+                                  ("(+ i 1.0)", True),
+                                  ("(> s (group (+ 1.0 2.0)))", True), ("(+ 1.0 2.0)", True)]
+
+
+def test_numbers_unproven():
+    source = """\
+var g = 1; { print g + 1; }
+{ var a = 1; var b = a; b = "s"; print b + a; var c; print -c; }
+{ var d = 1; fun h() { d = "s"; } print d * 2; }
+{ var e = 1; var p = e + e; p = p + "s"; print e - p; }"""
+    assert _unchecked(source) == [("(+ g 1.0)", False), ("(+ b a)", False), ("(- c)", False),
+                                  ("(* d 2.0)", False),  # captured
+                                  ("(+ e e)", True), ("(+ p s)", False), ("(- e p)", False)]
+    assert _unchecked(source, flat=True)[3] == ("(* d 2.0)", False)
+
+
+def test_read_in_its_own_initializer():
+    # a semantic error, but the REPL runs the line: the variable is nil when read
+    source = "{ var x = x + 1; print -x; }"
+    errors = []
+    parser = Parser(tokenize(source)[0])
+    statements = parser.parse()
+    Resolver(Interpreter(), on_error=lambda *err: errors.append(err), lines=parser.lines).resolve_statements(statements)
+    assert errors and [node.unchecked for node in walk(statements) if isinstance(node, (Binary, Unary))] == [False, False]
+    infer_numbers(statements[0])  # even if it were inferred
+    assert [node.unchecked for node in walk(statements) if isinstance(node, (Binary, Unary))] == [False, False]
@@ -0,0 +1,77 @@
+import io
+import sys
+
+import pytest
+
+from errors import Errors
+from evaluating import Interpreter
+from main import main
+from optimizing import Optimizer
+from parsing import Parser
+from resolving import Resolver
+from scanning import tokenize
+from syntax import Call, Function, walk
+
+
+def _optimized(source, whole_program=False):
+    interpreter = Interpreter()
+    statements = Parser(tokenize(source)[0]).parse()
+    Resolver(interpreter).resolve_statements(statements)
+    return [repr(stmt) for stmt in Optimizer(interpreter).optimize(statements, whole_program)]
+
+
+def test_constants_folded():
+    assert _optimized('print 1 + 2 * (3 - -4); print "post" + "rock"; print !nil == (1 <= 2);') == [
+        "print 15.0;", "print postrock;", "print true;"]
+    assert _optimized("print false or nil; print 1 and x; print x or 2;") == ["print nil;", "print x;", "print x or 2.0;"]
+    # left to raise their errors when run
+    assert _optimized('print -"a"; print 1 + "a"; print 1 / 0;') == ['print (- a);', 'print (+ 1.0 a);', 'print (/ 1.0 0.0);']
+
+
+def test_dead_code_pruned():
+    source = """\
+if (1 > 2) print "a"; else print "b";
+if (nil) print "c";
+while (false) print "d";
+fun f(x) { while (x) { if ("s") break; print x; } return x; print "e"; }"""
+    assert _optimized(source) == ["print b;", "fun f(x) { [while (x) {break;}, return x;] }"]
+
+
+def test_unused_declarations_dropped():
+    source = "var a = 1; var b; var c = clock(); fun f() { return a; } class A {} class B < A {} var g = 1; print g;"
+    # (b, f: never referenced ; c: calls a function ; B: may raise an error)
+    assert _optimized(source, whole_program=True) == ["var a = 1.0;", "var c = clock();", "class A { [] }",
+                                                      "class B < A { [] }", "var g = 1.0;", "print g;"]
+    assert len(_optimized(source)) == 8  # the next lines (of the REPL) may reference them
+
+
+def test_functions_inlined():
+    interpreter = Interpreter()
+    source = """\
+fun sq(x) { return x * x; }
+fun fact(n) { return n < 2 and 1 or n * fact(n - 1); }
+fun outer(y) { fun inner() { return y; } return inner() + sq(y); }
+class A { init(v) { this.v = v; } get() { return this.v; } }
+print sq(2) + sq(1, 2) + fact(3) + outer(1) + A(1).get();"""
+    statements = Parser(tokenize(source)[0]).parse()
+    Resolver(interpreter).resolve_statements(statements)
+    statements = Optimizer(interpreter).optimize(statements)
+    inline = {node.name: repr(node.inline) for node in walk(statements) if isinstance(node, Function) and node.inline}
+    assert inline == {"sq": "(* x x)", "fact": "(< n 2.0) and 1.0 or (* n fact((- n 1.0)))", "inner": "y", "get": "this.v"}
+    # not fact (recursive), nor the call with too many arguments, nor inner (not global)
+    inlined = [repr(node) for node in walk(statements) if isinstance(node, Call) and node.inlined]
+    assert inlined == ["sq(y)", "sq(2.0)"]
+
+
+def test_repl_lines_optimized_after_an_error(monkeypatch, capsys):
+    optimized = []
+    optimize = Optimizer.optimize
+    monkeypatch.setattr(Optimizer, "optimize", lambda self, statements, whole_program=False:
+                        optimized.append(repr(statements)) or optimize(self, statements, whole_program))
+    monkeypatch.setattr(Errors, "had_errors", False)
+    monkeypatch.setattr(sys, "argv", ["lox", "repl", "--optimize"])
+    monkeypatch.setattr(sys, "stdin", io.StringIO("print 1 +;\nprint 1 + 2;\n"))
+    with pytest.raises(SystemExit):
+        main()
+    assert optimized == ["[print (+ 1.0 2.0);]"]  # not the line with an error, but the next one
+    assert "3\n" in capsys.readouterr().out
@@ -1,8 +1,13 @@
 import pytest
 import re
-from parsing import Binary, Unary, Literal, Grouping, Parser, ParserError
-from scanning import Token
-from syntax import Assign, Call, Logical, Super, Variable
+from evaluating import Interpreter
+from lexemes import TokenKind
+from parsing import Binary, Unary, Literal, Grouping, Parser, ParserError, Precedence, parse_stream
+from positions import LineTable
+from errors import Errors
+from resolving import Resolver, parse_resolved
+from scanning import Token, tokenize
+from syntax import Assign, Call, Logical, Super, Variable, resolutions
 from tokens import AND, DIVISE, LESS_EQUAL, MINUS, NOT_EQUAL, OR, PLUS
 
 TOKEN_PATTERN = re.compile(r'(\w+) (".*"|.*) (null|.+)')
@@ -43,56 +48,56 @@ LAST = len(TOKENS) - 1
 def test_Parser_assignment():
     assert Parser(_text2tokens("""IDENTIFIER pi null
                                   EQUAL = null
-                                  NUMBER "3.14" 3.14""")).assignment() == Assign(Token("IDENTIFIER", "pi", None, 1), Literal(3.14))
+                                  NUMBER "3.14" 3.14""")).expression() == Assign("pi", Literal(3.14))
     
 
 def test_Parser_or():
     assert Parser(_text2tokens("""FALSE false null
                                   OR or null
-                                  STRING "hello" hello""")).logic_or() == Logical(Literal(False), OR, Literal("hello"))
+                                  STRING "hello" hello""")).operation(Precedence.OR) == Logical(Literal(False), OR, Literal("hello"))
 
 
 def test_Parser_and():
     assert Parser(_text2tokens("""TRUE true null
                                   AND and null
-                                  STRING "hello" hello""")).logic_and() == Logical(Literal(True), AND, Literal("hello"))
+                                  STRING "hello" hello""")).operation(Precedence.AND) == Logical(Literal(True), AND, Literal("hello"))
     
 
 def test_Parser_equality():
     assert Parser(_text2tokens("""STRING "yes" yes
                                   BANG_EQUAL != null
-                                  STRING "ok" ok""")).equality() == Binary(Literal("yes"), NOT_EQUAL, Literal("ok"))
+                                  STRING "ok" ok""")).operation(Precedence.EQUALITY) == Binary(Literal("yes"), NOT_EQUAL, Literal("ok"))
 
 
 def test_Parser_comparison():
     assert Parser(_text2tokens("""NUMBER "12" 12.0
                                   LESS_EQUAL <= null
-                                  NUMBER "33.3" 33.3""")).comparison() == Binary(Literal(12.0), LESS_EQUAL, Literal(33.3))
+                                  NUMBER "33.3" 33.3""")).operation(Precedence.COMPARISON) == Binary(Literal(12.0), LESS_EQUAL, Literal(33.3))
     
 
 def test_Parser_term():
     assert Parser(_text2tokens("""NUMBER "12" 12.0
                                   PLUS + null
-                                  NUMBER "2.5" 2.5""")).term() == Binary(Literal(12.0), PLUS, Literal(2.5))
+                                  NUMBER "2.5" 2.5""")).operation(Precedence.TERM) == Binary(Literal(12.0), PLUS, Literal(2.5))
     
 
 def test_Parser_factor():
     assert Parser(_text2tokens("""NUMBER "12" 12.0
                                   SLASH / null
-                                  NUMBER "2.5" 2.5""")).factor() == Binary(Literal(12.0), DIVISE, Literal(2.5))
+                                  NUMBER "2.5" 2.5""")).operation(Precedence.FACTOR) == Binary(Literal(12.0), DIVISE, Literal(2.5))
 
 
 def test_Parser_unary():
     assert Parser(_text2tokens("""MINUS - null
-                                  NUMBER "12" 12.0""")).unary() == Unary(MINUS, Literal(12.0))
-    assert Parser(_text2tokens("""STRING "test" test""")).unary() == Literal("test")
+                                  NUMBER "12" 12.0""")).operation(Precedence.UNARY) == Unary(MINUS, Literal(12.0))
+    assert Parser(_text2tokens("""STRING "test" test""")).operation(Precedence.UNARY) == Literal("test")
 
 
 def test_Parser_call_no_arguments():
     tokens = _text2tokens("""IDENTIFIER "clock" clock
                              LEFT_PAREN ( null
                              RIGHT_PAREN ) null""")
-    assert Parser(tokens).call() == Call(Variable(tokens[0]), tokens[2], arguments=tuple())
+    assert Parser(tokens).operation(Precedence.CALL) == Call(Variable(tokens[0].lexeme), arguments=tuple())
 
 
 def test_Parser_call_two_arguments():
@@ -102,7 +107,7 @@ def test_Parser_call_two_arguments():
                              COMMA , null
                              NUMBER 2 2.0
                              RIGHT_PAREN ) null""")
-    assert Parser(tokens).call() == Call(Variable(tokens[0]), tokens[5], arguments=(Literal(1.0), Literal(2.0)))
+    assert Parser(tokens).operation(Precedence.CALL) == Call(Variable(tokens[0].lexeme), arguments=(Literal(1.0), Literal(2.0)))
 
 
 def test_Parser_call_too_many_arguments(capsys):
@@ -114,10 +119,10 @@ def test_Parser_call_too_many_arguments(capsys):
     rawtokens.append("RIGHT_PAREN ) null")
     tokens = _text2tokens("\n".join(rawtokens))
 
-    c = Parser(tokens).call()
+    c = Parser(tokens).operation(Precedence.CALL)
 
     assert isinstance(c, Call)
-    assert c.callee == Variable(tokens[0])
+    assert c.callee == Variable(tokens[0].lexeme)
     assert c.arguments[0] == Literal(1.0)
     assert capsys.readouterr()[1] == "[line 1] Error at '(': Can't have more than 255 arguments.\n"
 
@@ -135,14 +140,13 @@ def test_Parser_primary():
                                       RIGHT_PAREN ) null""")
     assert Parser(grouping_tokens).primary() == Grouping(Literal(3.14))
 
-    assert Parser([Token("IDENTIFIER", "pi", None, 1)]).primary() == Variable(Token("IDENTIFIER", "pi", None, 1))
+    assert Parser([Token("IDENTIFIER", "pi", None, 1)]).primary() == Variable("pi")
     
     assert Parser(_text2tokens("""SUPER super null
                                   DOT . null
                                   IDENTIFIER eat null
                                   LEFT_PAREN ( null
-                                  RIGHT_PAREN ) null""")).primary() == Super(Token("SUPER", "super", None, 1),
-                                                                             Token("IDENTIFIER", "eat", None, 1))
+                                  RIGHT_PAREN ) null""")).primary() == Super("eat")
 
 
 def test_Parser_primary_with_unterminated_parentheses():
@@ -187,34 +191,84 @@ def test_Parser_advance():
 
 def test_Parser_match():
     p = Parser(TOKENS)
-    assert p.match("STAR") is False
-    assert p.match("NUMBER") is True
+    assert p.match(TokenKind.STAR) is False
+    assert p.match(TokenKind.NUMBER) is True
     # even though the last token is EOF, a match on it always returns False
     p.current = LAST
-    assert p.match("EOF") is False
-
-
-def test_Parser_finish_call_no_arguments():
+    assert p.match(TokenKind.EOF) is False
+
+
+def test_Parser_operators_precedence_and_associativity():
+    expr = Parser(tokenize("1 - 2 - 3 * -4 / 5 == 6 or a.b(1) and !c")[0]).expression()
+    assert repr(expr) == "(== (- (- 1.0 2.0) (/ (* 3.0 (- 4.0)) 5.0)) 6.0) or a.b(1.0) and (! c)"
+    assert isinstance(expr, Logical) and expr.operator == TokenKind.OR
+    assert isinstance(expr.right, Logical) and expr.right.operator == TokenKind.AND
+
+
+def test_Parser_deeply_nested_program():
+    depth = 5000
+    source = "{ if (true) " * depth + "print " + "-(" * depth + "a = b.c(1, 2)" + ")" * depth + ";" + " }" * depth
+    statements = Parser(tokenize(source)[0]).parse()
+    text = repr(statements[0])
+    assert text.startswith("{if (true) then {if (true) then ") and text.count("(- (group ") == depth
+    assert "(group a = b.c(1.0, 2.0))" in text
+    Resolver(Interpreter()).resolve_statements(statements)  # global variables: nothing to record
+
+
+def test_parse_stream_same_as_parse(monkeypatch):
+    monkeypatch.setattr("parsing.STREAM_LOOKAHEAD", 2)  # most declarations are parsed again with more tokens
+    for source in ["if (a) print 1; else print 2; print 3;", "fun f(x) { return x; } class A < B { m() { f(1); } }",
+                   "var = 1; print 2;", "print 1 +; print 2;", "{ print 1;", "print 1", ""]:
+        tokens = tokenize(source)[0]
+        errors, streamed_errors = [], []
+        parser = Parser(tokens, on_error=lambda *err: errors.append(err))
+        statements = parser.parse()
+        streamed_lines = LineTable()
+        streamed = list(parse_stream(iter(tokens), on_error=lambda *err: streamed_errors.append(err), lines=streamed_lines))
+        assert repr(streamed) == repr(statements)
+        assert streamed_errors == errors
+        assert streamed_lines.lines == parser.lines.lines  # without the positions of the declarations parsed again
+
+
+def test_parse_resolved_same_as_resolver(monkeypatch, capsys):
+    for source in ["var a = 1; fun f(x) { var y = x; fun g() { return y + a; } return g; } { var b = f(a)(); b = b; }",
+                   "class A { init(v) { this.v = v; } } class B < A { init() { super.init(1); } }",
+                   "for (var i = 0; i < 2; i = i + 1) { var j = i; while (j) { j = i; break; } }",
+                   "{ var a = 1; var a = a; } return 1; class C < C { init() { return 1; } } print this; continue;",
+                   "{ var a; a + a = (a = 1); }", "{ var a = ; var a; }"]:
+        tokens = tokenize(source)[0]
+        monkeypatch.setattr(Errors, "had_errors", False)
+        interpreter = Interpreter()
+        parser = Parser(tokens)
+        statements = parser.parse()
+        if not Errors.had_errors:
+            Resolver(interpreter, lines=parser.lines).resolve_statements(statements)
+        errors = capsys.readouterr().err
+
+        monkeypatch.setattr(Errors, "had_errors", False)
+        fused = Interpreter()
+        fused_statements = parse_resolved(tokens, fused)
+        assert repr(fused_statements) == repr(statements)
+        assert capsys.readouterr().err == errors
+        assert [(type(expr).__name__, depth) for expr, depth in resolutions(fused_statements)] == \
+               [(type(expr).__name__, depth) for expr, depth in resolutions(statements)]
+
+
+def test_Parser_call_position():
     tokens = _text2tokens("""IDENTIFIER "add" add
                              LEFT_PAREN ( null
                              RIGHT_PAREN ) null""")
     p = Parser(tokens)
-    p.current = 2
-    node = p.finish_call(Variable(tokens[0]))
-    assert isinstance(node, Call)
-    assert node.callee == Variable(tokens[0])
-    assert node.paren == tokens[2]
-    assert node.arguments == tuple()
+    node = p.operation(Precedence.CALL)
+    assert p.lines.line(node.position) == tokens[2].line
 
 
-def test_Parser_finish_call_with_unterminated_parentheses():
+def test_Parser_call_with_unterminated_parentheses():
     tokens = _text2tokens("""IDENTIFIER "add" add
                              LEFT_PAREN ( null
                              NUMBER 2 2.0""")
-    p = Parser(tokens)
-    p.current = 2
     with pytest.raises(ParserError) as ex:
-        p.finish_call(Variable(tokens[0]))
+        Parser(tokens).operation(Precedence.CALL)
     assert ex.value.args[0] == (1, "Expected ')' after arguments.", " at '('")
 
 
@@ -224,7 +278,7 @@ def test_Parser_synchronize_post_error_with_semicolon():
                                SEMICOLON ; null
                                NUMBER 8 8.0"""))
     p.synchronize_post_error()
-    assert p.match("NUMBER")
+    assert p.match(TokenKind.NUMBER)
 
 
 def test_Parser_synchronize_post_error_with_statement():
@@ -233,7 +287,7 @@ def test_Parser_synchronize_post_error_with_statement():
                                RETURN return null
                                NUMBER 8 8.0"""))
     p.synchronize_post_error()
-    assert p.match("RETURN")
+    assert p.match(TokenKind.RETURN)
 
 
 def test_Parser_synchronize_post_error_until_EOF():
@@ -242,3 +296,16 @@ def test_Parser_synchronize_post_error_until_EOF():
                                NUMBER 8 8.0"""))
     p.synchronize_post_error()
     assert p.peek().toktype == "EOF"
+
+
+def test_Parser_lazy_function_body():
+    tokens = tokenize("fun f(a) { if (a) { return 1; } return a; } print f;")[0]
+    lazy, eager = Parser(tokens, lazy=True).parse(), Parser(tokens).parse()
+    assert [tok.lexeme for tok in lazy[0].body.tokens] == ["{", "if", "(", "a", ")", "{", "return", "1", ";", "}",
+                                                          "return", "a", ";", "}", None]
+    assert repr(lazy[1]) == repr(eager[1])
+    assert repr(Parser(lazy[0].body.tokens, lazy=True).parse_lazy_body()) == repr(eager[0].body)
+
+    errors = []
+    Parser(tokenize("fun f() { {")[0], on_error=lambda *err: errors.append(err), lazy=True).parse()
+    assert errors == [(1, "Expected '}' after block.", " at '{'")]
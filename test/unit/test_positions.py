@@ -0,0 +1,64 @@
+from array import array
+
+import pytest
+
+from errors import LoxRuntimeError
+from evaluating import Interpreter
+from parsing import Parser
+from positions import LineTable, lines, relocate
+from resolving import Resolver
+from scanning import tokenize
+
+SOURCE = """\
+fun add(x,
+        y) {
+  return x +
+    y;
+}
+print super.add(1, 2);
+"""
+
+
+def test_LineTable():
+    table = LineTable()
+    assert [table.position(line) for line in (1, 1, 4)] == [1, 2, 3]
+    assert [table.line(position) for position in range(len(table))] == [0, 1, 1, 4]
+    table.shift(range(2, 4), 2)
+    assert table.lines == array("I", [0, 1, 3, 6])
+    table.truncate(2)
+    assert table.position(7) == 2
+
+
+def test_positions_shared_by_line():
+    parser = Parser(tokenize(SOURCE)[0])
+    statements = parser.parse()
+    function = statements[0]
+    assert function.param_positions[0] == function.position != function.param_positions[1]
+    # fun add (x, y), return x + y, print super.add(1, 2)
+    assert lines(statements, parser.lines) == [1, 1, 2, 3, 3, 3, 4, 6, 6, 6]
+    assert function.lines is parser.lines
+    assert len(Parser(tokenize(SOURCE)[0]).lines) == 1  # each program has a table of its own
+
+
+def test_relocate():
+    parser = Parser(tokenize(SOURCE)[0])
+    statements = parser.parse()
+    before = lines(statements, parser.lines)
+    moved = LineTable(array("I", [0, 0, 0]) + parser.lines.lines[1:])  # the positions moved two ids up
+    relocate(statements, 2)
+    assert lines(statements, moved) == before
+
+
+def test_errors_located_in_the_program_of_their_function():
+    interpreter = Interpreter()
+    programs = []
+    for source in ("\n\nfun f() {\n  return -nil;\n}", "f();"):  # as two lines of the REPL
+        parser = Parser(tokenize(source)[0])
+        programs.append((parser.parse(), parser.lines))
+        Resolver(interpreter, lines=parser.lines).resolve_statements(programs[-1][0])
+    (declaration,), _ = programs[0]
+    interpreter.execute(declaration)
+    (call,), lines_of_call = programs[1]
+    with pytest.raises(LoxRuntimeError) as error:
+        interpreter.execute(call)
+    assert error.value.locate(lines_of_call) == 4
@@ -1,5 +1,12 @@
+from dataclasses import FrozenInstanceError
+import io
+import pickle
 import string
-from scanning import tokenize, lookahead_capture  # type: ignore
+
+import pytest
+
+from lexemes import DIGITS, IDENTIFIER_CHARS, TokenKind  # type: ignore
+from scanning import Token, capture_end, iter_tokens, safe_boundaries, tokenize, tokenize_parallel, lookahead_capture  # type: ignore
 
 """
 $ PYTHONPATH=app pytest -vv -k unit
@@ -180,4 +187,63 @@ def test_lookahead_capture():
 
 
 def _format(tokens):
-    return [repr(tok) for tok in tokens]
\ No newline at end of file
+    return [repr(tok) for tok in tokens]
+
+def test_capture_end():
+    assert capture_end("var x1_2 = 3;", 4, valid_chars=IDENTIFIER_CHARS) == 8
+    assert capture_end("x = 4.56;", 4, valid_chars=DIGITS, valid_sep='.') == 8
+    assert capture_end("x = 45.;", 4, valid_chars=DIGITS, valid_sep='.') == 6
+    assert capture_end("x = 45.", 4, valid_chars=DIGITS, valid_sep='.') == 6
+    # works on raw buffers too, as long as valid_chars/valid_sep hold the same kind of items (ints for bytes)
+    assert capture_end(memoryview(b"12.5+"), 0, valid_chars=set(b"0123456789"), valid_sep=ord('.')) == 4
+
+
+def test_iter_tokens_across_chunk_boundaries():
+    source = 'var greeting = "hello\nworld"; // a "comment"\nprint greeting >= 12.5;'
+    errors = []
+    tokens = list(iter_tokens(io.StringIO(source), on_error=lambda *err: errors.append(err), chunk_size=3))
+
+    assert tokens == tokenize(source)[0]
+    assert errors == []
+
+
+def test_iter_tokens_binary_stream_and_errors():
+    source = '(é)\n"unterminated'
+    errors = []
+    tokens = list(iter_tokens(io.BytesIO(source.encode()), on_error=lambda *err: errors.append(err), chunk_size=1))
+
+    assert _format(tokens) == """
+LEFT_PAREN ( null
+RIGHT_PAREN ) null
+EOF  null
+""".strip().split("\n")
+    assert errors == [(1, "Unexpected character: é"), (2, "Unterminated string.")]
+
+
+def test_compact_tokens():
+    tokens, _ = tokenize("counter = counter + 1; for")
+
+    assert tokens[0].kind == TokenKind.IDENTIFIER and tokens[0].toktype == "IDENTIFIER"
+    assert tokens[0].lexeme is tokens[2].lexeme  # interned identifiers
+    assert tokens[6].kind == TokenKind.FOR and repr(tokens[6]) == "FOR for null"
+    assert Token("STAR", "*", None, 1) == Token(TokenKind.STAR, "*", None, 1)
+    assert not hasattr(tokens[0], "__dict__")
+
+
+def test_tokens_are_frozen():
+    token = Token("NUMBER", "1", 1.0, 1)
+    with pytest.raises(FrozenInstanceError):
+        token.line = 2
+    assert hash(token) == hash(Token(TokenKind.NUMBER, "1", 1.0, 1))
+    assert pickle.loads(pickle.dumps(token)) == token  # (kept in the lazy bodies of cached programs)
+
+
+def test_safe_boundaries_skip_newlines_inside_strings():
+    source = 'print "a\nb";\n// "\nprint 1;\n'
+    assert safe_boundaries(source, 4) == [13, 18, 27]
+    assert safe_boundaries('print "a\nb\nc', 2) == []  # unterminated string: no safe newline after it
+
+
+def test_tokenize_parallel_same_as_tokenize():
+    source = 'var s = "multi\nline";\n// "not a string\n#\nprint s + 1.5;\n' * 20 + '"unterminated\n'
+    assert tokenize_parallel(source, workers=3, min_chunk_size=50) == tokenize(source)
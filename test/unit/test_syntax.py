@@ -1,4 +1,3 @@
-from scanning import Token  # type: ignore
 from syntax import Assign, Binary, Block, Call, Class, Expression, Function, Get, Grouping, If, Literal, Logical, Print, Return, Set, Unary, Var, Variable, While # type: ignore
 from tokens import AND, GREATER, LESS, MINUS, MULTIPLY, NOT, OR, PLUS
 
@@ -32,25 +31,25 @@ def test_Logical_repr():
 
 
 def test_Variable_repr():
-    assert repr(Variable(Token("IDENTIFIER", "count", None, 1))) == "count"
+    assert repr(Variable("count")) == "count"
 
 
 def test_Assign_repr():
-    assert repr(Assign(Token("IDENTIFIER", "count", None, 1), Literal(5))) == "count = 5"
+    assert repr(Assign("count", Literal(5))) == "count = 5"
 
 
 def test_Call_repr():
-    assert repr(Call(Literal("add"), Token("LEFT_PAREN", "(", None, 1), [Literal(2), Literal(3)])) == "add(2, 3)"
+    assert repr(Call(Literal("add"), [Literal(2), Literal(3)])) == "add(2, 3)"
 
 
 def test_Get_repr():
-    assert repr(Get(Variable(Token("IDENTIFIER", "instance", None, 1)), 
-                    Token("IDENTIFIER", "property1", None, 1))) == "instance.property1"
+    assert repr(Get(Variable("instance"), 
+                    "property1")) == "instance.property1"
     
 
 def test_Set_repr():
-    assert repr(Set(Variable(Token("IDENTIFIER", "instance", None, 1)), 
-                    Token("IDENTIFIER", "property2", None, 1),
+    assert repr(Set(Variable("instance"), 
+                    "property2",
                     Binary(Literal(1.0), PLUS, Literal(5.0)))) == "instance.property2 = (+ 1.0 5.0)"
 
 
@@ -71,12 +70,12 @@ def test_Print_repr():
 
 
 def test_Var_repr():
-    assert repr(Var(Token("IDENTIFIER", "pi", None, 1), Literal(3.14))) == "var pi = 3.14;"
-    assert repr(Var(Token("IDENTIFIER", "area", None, 1), None)) == "var area;"
+    assert repr(Var("pi", Literal(3.14))) == "var pi = 3.14;"
+    assert repr(Var("area", None)) == "var area;"
 
 
 def test_While_repr():
-    a = Token("IDENTIFIER", "a", None, 1)
+    a = "a"
     assert repr(While(Binary(Variable(a), LESS, Literal(10.0)), 
                       Print(Assign(a, Binary(Variable(a), PLUS, Literal(1.0)))), 
                       increment=None)) == "while ((< a 10.0)) print a = (+ a 1.0);"
@@ -84,35 +83,35 @@ def test_While_repr():
 
 def test_Block_repr():
     assert repr(Block([])) == "{}"
-    assert repr(Block([Var(Token("IDENTIFIER", "word", None, 1), Literal("test")), 
-                       Print(Variable(Token("IDENTIFIER", "word", None, 1)))])) == "{var word = test;\nprint word;}"
+    assert repr(Block([Var("word", Literal("test")), 
+                       Print(Variable("word"))])) == "{var word = test;\nprint word;}"
     
 
 def test_Function_repr():
-    assert repr(Function(name=Token("IDENTIFIER", "add", None, 1),
-                         params=[Token("IDENTIFIER", "a", None, 1), Token("IDENTIFIER", "b", None, 1)],
-                         body=[Print(Binary(Variable(Token("IDENTIFIER", "a", None, 2)), 
+    assert repr(Function(name="add",
+                         params=["a", "b"],
+                         body=[Print(Binary(Variable("a"), 
                                             PLUS, 
-                                            Variable(Token("IDENTIFIER", "b", None, 2))))])) == "fun add(a, b) { [print (+ a b);] }"
+                                            Variable("b")))])) == "fun add(a, b) { [print (+ a b);] }"
     
 
 def test_Return_repr():
-    assert repr(Function(name=Token("IDENTIFIER", "random", None, 1),
+    assert repr(Function(name="random",
                          params=[],
-                         body=[Return(Token("RETURN", "return", None, 2), Literal(0.259))])) == "fun random() { [return 0.259;] }"
+                         body=[Return(Literal(0.259))])) == "fun random() { [return 0.259;] }"
 
 
 def test_Class_repr():
-    assert repr(Class(name=Token("IDENTIFIER", "Breakfast", None, 1),
+    assert repr(Class(name="Breakfast",
                       superclass=None,
-                      methods=[Function(name=Token("IDENTIFIER", "cook", None, 2),
+                      methods=[Function(name="cook",
                                         params=[],
                                         body=[Print(Literal("Eggs a-frying!"))])])) == \
                                             'class Breakfast { [fun cook() { [print eggs a-frying!;] }] }'
                                             
-    assert repr(Class(name=Token("IDENTIFIER", "Breakfast", None, 1),
-                      superclass=Variable(name=Token("IDENTIFIER", "Meal", None, 1)),
-                      methods=[Function(name=Token("IDENTIFIER", "cook", None, 2),
+    assert repr(Class(name="Breakfast",
+                      superclass=Variable(name="Meal"),
+                      methods=[Function(name="cook",
                                         params=[],
                                         body=[Print(Literal("Eggs a-frying!"))])])) == \
                                             'class Breakfast < Meal { [fun cook() { [print eggs a-frying!;] }] }'